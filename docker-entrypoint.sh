@@ -7,6 +7,15 @@ if [ "$1" == cron ]; then
   # Add cron job schedules
   python3 manage.py crontab remove
   python3 manage.py crontab add
+elif [ "$1" == matcher ]; then
+  # Order matcher service
+  set -- python3 manage.py run_order_matcher
+elif [ "$1" == bulk ]; then
+  # Bulk order worker service
+  set -- python3 manage.py run_bulk_order_worker
+elif [ "$1" == stream ]; then
+  # Stock trade streaming service, served by the ASGI application
+  set -- uvicorn stock_trading.asgi:application --host 0.0.0.0 --port 8081
 else
   # Collect static files
   echo "Collecting static files"
@@ -15,6 +24,10 @@ else
   # Apply database migrations
   echo "Applying database migrations"
   python3 manage.py migrate
+
+  # Create the tick partitions ahead
+  echo "Creating tick partitions"
+  python3 manage.py partition_ticks
 fi
 
 # Start application command (CMD)
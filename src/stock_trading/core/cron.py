@@ -4,7 +4,9 @@
 from django.core.management import call_command
 from core.management.commands import (
     process_order_transaction,
-    process_bulk_order_file
+    process_bulk_order_file,
+    rollup_candles,
+    partition_ticks
 )
 
 
@@ -14,3 +16,11 @@ def schedule_process_order_transaction():
 
 def schedule_process_bulk_order_file():
     call_command(process_bulk_order_file.Command())
+
+
+def schedule_rollup_candles():
+    call_command(rollup_candles.Command())
+
+
+def schedule_partition_ticks():
+    call_command(partition_ticks.Command())
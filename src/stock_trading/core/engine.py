@@ -0,0 +1,409 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import bisect
+from collections import deque
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from core.models import Transaction
+
+
+class BookOrder:
+    """
+    BookOrder is the in-memory entry of an order resting in the order book.
+    """
+    __slots__ = ('pk', 'user_id', 'type', 'price', 'created', 'remaining')
+
+    def __init__(
+            self,
+            pk,
+            user_id,
+            type,
+            price,
+            created,
+            remaining
+    ):
+        self.pk = pk
+        self.user_id = user_id
+        self.type = type
+        self.price = price
+        self.created = created
+        self.remaining = remaining
+
+    def __repr__(self):
+        return f"BookOrder({self.pk}, {self.type}, {self.remaining} @ {self.price})"
+
+    @classmethod
+    def from_transaction(
+            cls,
+            transaction: Transaction,
+            remaining=None
+    ):
+        """
+        Create book order from an order transaction.
+
+        :param transaction:
+        :param remaining:
+        :return BookOrder:
+        """
+        if remaining is None:
+            remaining = transaction.remainder_quantity()
+        return cls(
+            pk=transaction.pk,
+            user_id=transaction.user_id,
+            type=transaction.type,
+            price=transaction.price,
+            created=transaction.created,
+            remaining=remaining)
+
+
+class Fill:
+    """
+    Fill is a match between an aggressor order and a resting order.
+    """
+    __slots__ = (
+        'aggressor',
+        'resting',
+        'quantity',
+        'price',
+        'aggressor_cleared',
+        'resting_cleared')
+
+    def __init__(
+            self,
+            aggressor: BookOrder,
+            resting: BookOrder,
+            quantity,
+            price
+    ):
+        self.aggressor = aggressor
+        self.resting = resting
+        self.quantity = quantity
+        self.price = price
+        self.aggressor_cleared = aggressor.remaining == 0
+        self.resting_cleared = resting.remaining == 0
+
+    def __repr__(self):
+        return f"Fill({self.aggressor.pk}, {self.resting.pk}, {self.quantity} @ {self.price})"
+
+
+def match_orders(
+        aggressor: BookOrder,
+        resting: BookOrder
+):
+    """
+    Match the aggressor against a resting order.
+
+    The traded quantity is the smaller remainder, a resting order that is
+    cleared trades at its own price, and a resting order left with a
+    remainder trades at the aggressor price.
+
+    :param aggressor:
+    :param resting:
+    :return Fill:
+    """
+    if aggressor.remaining >= resting.remaining:
+        quantity = resting.remaining
+        price = resting.price
+    else:
+        quantity = aggressor.remaining
+        price = aggressor.price
+
+    aggressor.remaining -= quantity
+    resting.remaining -= quantity
+    return Fill(aggressor, resting, quantity, price)
+
+
+def clearing_price(
+        orders,
+        reference=None
+):
+    """
+    Get the uniform price of a call auction of the orders.
+
+    The demand and supply at every order price are computed from the
+    cumulative bid and ask quantities. The clearing price executes the most
+    volume, ties go to the least imbalance, then to the price closest to
+    the reference, then to the lowest price.
+
+    :param orders: book orders
+    :param reference: reference price, the last stock price
+    :return tuple: price and volume
+    """
+    frame = pd.DataFrame(
+        [(o.type, int(o.price * 100), o.remaining) for o in orders if o.remaining > 0],
+        columns=['type', 'cents', 'remaining'])
+    if frame.empty:
+        return None, 0
+
+    bids = frame[frame['type'] == Transaction.Type.BUY].groupby('cents')['remaining'].sum()
+    asks = frame[frame['type'] == Transaction.Type.SELL].groupby('cents')['remaining'].sum()
+    if bids.empty or asks.empty:
+        return None, 0
+
+    prices = np.unique(frame['cents'].to_numpy())
+    bid_total = np.concatenate(([0], bids.to_numpy().cumsum()))
+    ask_total = np.concatenate(([0], asks.to_numpy().cumsum()))
+    # bids priced at or above, asks priced at or below each price
+    demand = bid_total[-1] - bid_total[np.searchsorted(bids.index.to_numpy(), prices, 'left')]
+    supply = ask_total[np.searchsorted(asks.index.to_numpy(), prices, 'right')]
+
+    volume = np.minimum(demand, supply)
+    if volume.max() == 0:
+        return None, 0
+
+    distance = np.zeros(len(prices))
+    if reference is not None:
+        distance = np.abs(prices - int(reference * 100))
+    best = np.lexsort((prices, distance, np.abs(demand - supply), -volume))[0]
+    return Decimal(int(prices[best])).scaleb(-2), int(volume[best])
+
+
+def run_auction(
+        orders,
+        reference=None
+):
+    """
+    Match the orders of a call auction at the clearing price.
+
+    Bids and asks that cross the clearing price are allocated in
+    price-time priority, skipping the orders of the same user.
+
+    :param orders: book orders
+    :param reference: reference price, the last stock price
+    :return list: fills
+    """
+    price, volume = clearing_price(orders, reference)
+    if price is None:
+        return []
+
+    bids = sorted(
+        (o for o in orders if o.type == Transaction.Type.BUY
+         and o.price >= price and o.remaining > 0),
+        key=lambda o: (-o.price, o.created))
+    asks = sorted(
+        (o for o in orders if o.type == Transaction.Type.SELL
+         and o.price <= price and o.remaining > 0),
+        key=lambda o: (o.price, o.created))
+
+    fills = []
+    start = 0
+    for bid in bids:
+        for ask in asks[start:]:
+            if bid.remaining == 0:
+                break
+            if ask.remaining == 0 or ask.user_id == bid.user_id:
+                continue
+
+            quantity = min(bid.remaining, ask.remaining)
+            bid.remaining -= quantity
+            ask.remaining -= quantity
+            # the later order takes the aggressor side of the trade
+            if bid.created >= ask.created:
+                fills.append(Fill(bid, ask, quantity, price))
+            else:
+                fills.append(Fill(ask, bid, quantity, price))
+
+        while start < len(asks) and asks[start].remaining == 0:
+            start += 1
+        if start == len(asks):
+            break
+    return fills
+
+
+class OrderBook:
+    """
+    OrderBook keeps the pending orders of a stock in memory.
+
+    Each side is a map of price levels to FIFO queues of book orders,
+    with the level prices kept sorted for price-time priority matching.
+    """
+
+    def __init__(self, stock=None):
+        self.stock = stock
+        self.orders = {}
+        self.levels = {
+            Transaction.Type.BUY: {},
+            Transaction.Type.SELL: {}}
+        self.prices = {
+            Transaction.Type.BUY: [],
+            Transaction.Type.SELL: []}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, pk):
+        return pk in self.orders
+
+    def best_bid(self):
+        prices = self.prices[Transaction.Type.BUY]
+        return prices[-1] if prices else None
+
+    def best_ask(self):
+        prices = self.prices[Transaction.Type.SELL]
+        return prices[0] if prices else None
+
+    def add(self, order: BookOrder):
+        """
+        Rest the order at the back of its price level.
+
+        :param order:
+        :return:
+        """
+        levels = self.levels[order.type]
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = deque()
+            bisect.insort(self.prices[order.type], order.price)
+        level.append(order)
+        self.orders[order.pk] = order
+
+    def remove(self, pk):
+        """
+        Remove the order from the book.
+
+        :param pk:
+        :return BookOrder:
+        """
+        order = self.orders.pop(pk, None)
+        if order is None:
+            return None
+        level = self.levels[order.type].get(order.price)
+        if level is not None:
+            try:
+                level.remove(order)
+            except ValueError:
+                pass
+            if not level:
+                self._drop_level(order.type, order.price)
+        return order
+
+    def load(self, orders):
+        """
+        Rest the orders in the book, orders must be sorted by `created`.
+
+        :param orders:
+        :return:
+        """
+        for order in orders:
+            if order.remaining > 0:
+                self.add(order)
+
+    def run(self, aggressors=None):
+        """
+        Match the aggressors, every resting order by default, in `created` order.
+
+        This follows `TransactionService.process_order_transaction`, where
+        each pending order in turn is matched against the whole book.
+
+        :param aggressors:
+        :return list: fills
+        """
+        if aggressors is None:
+            aggressors = self.orders.values()
+
+        fills = []
+        for order in sorted(aggressors, key=lambda o: o.created):
+            if order.remaining > 0 and order.pk in self.orders:
+                fills.extend(self.match(order))
+        return fills
+
+    def crossing(self, orders):
+        """
+        Get the resting orders priced to cross any of the orders, the orders included.
+
+        The bids at or above the lowest ask of the orders and the asks at or
+        below their highest bid, in the order the book rests them.
+
+        :param orders:
+        :return list: book orders
+        """
+        max_bid = max(
+            (o.price for o in orders if o.type == Transaction.Type.BUY), default=None)
+        min_ask = min(
+            (o.price for o in orders if o.type == Transaction.Type.SELL), default=None)
+
+        crossing = {o.pk: o for o in orders}
+        if max_bid is not None:
+            prices = self.prices[Transaction.Type.SELL]
+            for price in prices[:bisect.bisect_right(prices, max_bid)]:
+                crossing.update((o.pk, o) for o in self.levels[Transaction.Type.SELL][price])
+        if min_ask is not None:
+            prices = self.prices[Transaction.Type.BUY]
+            for price in prices[bisect.bisect_left(prices, min_ask):]:
+                crossing.update((o.pk, o) for o in self.levels[Transaction.Type.BUY][price])
+        return list(crossing.values())
+
+    def submit(self, order: BookOrder):
+        """
+        Match the incoming order and rest its remainder in the book.
+
+        :param order:
+        :return list: fills
+        """
+        fills = self.match(order)
+        if order.remaining > 0 and order.pk not in self.orders:
+            self.add(order)
+        return fills
+
+    def match(self, aggressor: BookOrder):
+        """
+        Match the aggressor against the opposite side of the book.
+
+        Resting orders of other users are taken in price-time priority,
+        following `TransactionService.process_transaction`.
+
+        :param aggressor:
+        :return list: fills
+        """
+        if aggressor.type == Transaction.Type.SELL:
+            side = Transaction.Type.BUY
+            prices = self.prices[side]
+            prices = prices[bisect.bisect_left(prices, aggressor.price):][::-1]
+        else:
+            side = Transaction.Type.SELL
+            prices = self.prices[side]
+            prices = prices[:bisect.bisect_right(prices, aggressor.price)]
+
+        fills = []
+        for price in prices:
+            level = self.levels[side][price]
+            matched = False
+            for resting in level:
+                if resting.remaining == 0 or resting.user_id == aggressor.user_id:
+                    continue
+
+                fills.append(match_orders(aggressor, resting))
+                matched = True
+                if aggressor.remaining == 0:
+                    break
+
+            if matched:
+                self._compact(side, price)
+            if aggressor.remaining == 0:
+                break
+
+        if aggressor.remaining == 0:
+            self.remove(aggressor.pk)
+        return fills
+
+    def _compact(self, side, price):
+        level = self.levels[side][price]
+        remaining = deque()
+        for order in level:
+            if order.remaining > 0:
+                remaining.append(order)
+            else:
+                self.orders.pop(order.pk, None)
+        if remaining:
+            self.levels[side][price] = remaining
+        else:
+            self._drop_level(side, price)
+
+    def _drop_level(self, side, price):
+        del self.levels[side][price]
+        prices = self.prices[side]
+        del prices[bisect.bisect_left(prices, price)]
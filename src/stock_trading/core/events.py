@@ -0,0 +1,317 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import asyncio
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, InterfaceError, connections
+
+logger = logging.getLogger(__name__)
+
+# channel of the stock codes with new or changed orders
+ORDER_CHANNEL = 'core_orders'
+# channel of the pending bulk order job ids
+BULK_ORDER_CHANNEL = 'core_bulk_orders'
+# channel of the stock trade prints and price changes, JSON payloads
+TRADE_CHANNEL = 'core_trades'
+
+# server-sent events comment, keeps idle connections open
+KEEPALIVE = b': keepalive\n\n'
+# server-sent events reconnection delay, milliseconds
+RETRY = b'retry: 1000\n\n'
+
+# payloads kept by a local channel, the oldest are dropped when nothing
+# drains the channel, as in the processes without listeners
+LOCAL_CHANNEL_SIZE = 1000
+
+# local channels for database vendors without LISTEN/NOTIFY
+local_channels = defaultdict(partial(queue.Queue, LOCAL_CHANNEL_SIZE))
+
+
+def notify(
+        channel: str,
+        payload: str,
+        using=DEFAULT_DB_ALIAS
+):
+    """
+    Notify the channel listeners with the payload.
+
+    PostgreSQL delivers the notification to every listening process when the
+    current transaction commits, other vendors use a bounded in-process
+    queue, dropping its oldest payload when full.
+
+    :param channel:
+    :param payload:
+    :param using:
+    :return:
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [channel, payload])
+    else:
+        payloads = local_channels[channel]
+        while True:
+            try:
+                payloads.put_nowait(payload)
+                return
+            except queue.Full:
+                try:
+                    payloads.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class Listener:
+    """
+    Listener waits for the notifications of the channels.
+    """
+
+    def __init__(
+            self,
+            *channels,
+            using=DEFAULT_DB_ALIAS
+    ):
+        self.channels = channels
+        self.using = using
+        self.listening = None
+
+    def listen(self):
+        """
+        Listen to the channels on the current database connection.
+
+        :return:
+        """
+        connection = connections[self.using]
+        if connection.vendor != 'postgresql':
+            return None
+
+        connection.ensure_connection()
+        if self.listening is connection.connection:
+            return connection.connection
+
+        with connection.cursor() as cursor:
+            for channel in self.channels:
+                cursor.execute(f'LISTEN "{channel}"')
+        self.listening = connection.connection
+        return self.listening
+
+    def receive(self, timeout=None):
+        """
+        Wait for notifications, return the channel and payload of each in order.
+
+        :param timeout: seconds
+        :return list:
+        """
+        notifications = []
+        if connections[self.using].vendor != 'postgresql':
+            for channel in self.channels:
+                try:
+                    notifications.append(
+                        (channel, local_channels[channel].get(timeout=timeout)))
+                    while True:
+                        notifications.append(
+                            (channel, local_channels[channel].get_nowait()))
+                except queue.Empty:
+                    pass
+            return notifications
+
+        pg = self.listen()
+        with connections[self.using].wrap_database_errors:
+            if not pg.notifies:
+                select.select([pg], [], [], timeout)
+            pg.poll()
+        while pg.notifies:
+            n = pg.notifies.pop(0)
+            notifications.append((n.channel, n.payload))
+        return notifications
+
+    def wait(self, timeout=None):
+        """
+        Wait for notifications, return the payloads received by channel.
+
+        :param timeout: seconds
+        :return dict:
+        """
+        payloads = defaultdict(set)
+        for channel, payload in self.receive(timeout):
+            payloads[channel].add(payload)
+        return payloads
+
+
+def format_event(
+        event: str,
+        data: str
+):
+    """
+    Format a server-sent event.
+
+    :param event: event name
+    :param data: single line data
+    :return bytes:
+    """
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+class Subscription:
+    """
+    Subscription queues the broadcast messages for a consumer on its event loop.
+
+    A slow consumer drops its oldest messages instead of growing its queue.
+    """
+
+    def __init__(
+            self,
+            loop,
+            maxsize=100
+    ):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        self.loop.call_soon_threadsafe(self.put_nowait, message)
+
+    def put_nowait(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broadcaster:
+    """
+    Broadcaster fans out the notifications of a channel to the subscribers
+    of the process.
+
+    A single thread listens to the channel while the process has
+    subscribers, each notification is formatted once and queued to the
+    subscribers of its stock, idle subscribers only hold an empty queue.
+    """
+
+    def __init__(
+            self,
+            channel,
+            timeout=5,
+            maxsize=100,
+            keepalive=15,
+            duration=300
+    ):
+        self.channel = channel
+        self.timeout = timeout
+        self.maxsize = maxsize
+        # seconds without messages before a keepalive comment
+        self.keepalive = keepalive
+        # seconds before a stream ends, the client reconnects, so the stream
+        # of a client gone unnoticed by the server is released
+        self.duration = duration
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, key):
+        """
+        Subscribe the running event loop to the messages of the key.
+
+        :param key: stock code
+        :return Subscription:
+        """
+        subscription = Subscription(asyncio.get_running_loop(), self.maxsize)
+        with self.lock:
+            self.subscribers[key].add(subscription)
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name=f'broadcaster-{self.channel}', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, key, subscription):
+        with self.lock:
+            self.subscribers[key].discard(subscription)
+            if not self.subscribers[key]:
+                del self.subscribers[key]
+
+    def publish(self, payload: str):
+        """
+        Queue the notification payload to the subscribers of its stock.
+
+        :param payload: JSON with the `event` name and the `stock` code
+        :return int: subscribers
+        """
+        data = json.loads(payload)
+        message = format_event(data['event'], payload)
+        with self.lock:
+            subscriptions = list(self.subscribers.get(data['stock'], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put(message)
+            except RuntimeError:
+                # event loop closed, the stream is gone
+                self.unsubscribe(data['stock'], subscription)
+        return len(subscriptions)
+
+    async def stream(
+            self,
+            key,
+            *messages
+    ):
+        """
+        Stream the messages, then the broadcast messages of the key until the duration.
+
+        :param key: stock code
+        :param messages: initial messages
+        :return: async iterator of bytes
+        """
+        subscription = self.subscribe(key)
+        deadline = subscription.loop.time() + self.duration
+        try:
+            yield RETRY
+            for message in messages:
+                yield message
+            while True:
+                timeout = min(self.keepalive, deadline - subscription.loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    yield await subscription.get(timeout)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(key, subscription)
+
+    def run(self):
+        listener = Listener(self.channel)
+        try:
+            while True:
+                with self.lock:
+                    # the next subscriber starts a new thread
+                    if not self.subscribers:
+                        self.thread = None
+                        return
+                try:
+                    for channel, payload in listener.receive(self.timeout):
+                        try:
+                            self.publish(payload)
+                        except (ValueError, KeyError) as e:
+                            logger.error(f"ERROR broadcaster: invalid payload {e}")
+                except (OperationalError, InterfaceError) as e:
+                    logger.error(f"ERROR broadcaster: {e}")
+                    connections[listener.using].close()
+                    time.sleep(1)
+        finally:
+            with self.lock:
+                if self.thread is threading.current_thread():
+                    self.thread = None
+            connections.close_all()
+
+
+# trade prints and price changes of the process subscribers
+trade_broadcaster = Broadcaster(TRADE_CHANNEL)
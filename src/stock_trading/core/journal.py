@@ -0,0 +1,323 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import logging
+import os
+import struct
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from core.engine import BookOrder, OrderBook
+
+logger = logging.getLogger(__name__)
+
+# record frame: payload length, payload crc32
+FRAME = struct.Struct('>II')
+# payload header: event kind, sequence, stock id
+HEADER = struct.Struct('>BQ16s')
+# order id, user id, type, price cents, created microseconds, remaining
+NEW_ORDER = struct.Struct('>16sqBqqQ')
+# order id
+CANCEL_ORDER = struct.Struct('>16s')
+# aggressor id, resting id, quantity, price cents, aggressor remaining, resting remaining
+FILL_ORDER = struct.Struct('>16s16sQqQQ')
+# snapshot header: magic, sequence, number of orders
+SNAPSHOT = struct.Struct('>4sQQ')
+SNAPSHOT_MAGIC = b'STSN'
+
+SEGMENT_NAME = 'journal-{:020}.log'
+SNAPSHOT_NAME = 'snapshot-{:020}.bin'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+NewOrder = namedtuple('NewOrder', [
+    'sequence', 'stock_id', 'order'])
+CancelOrder = namedtuple('CancelOrder', [
+    'sequence', 'stock_id', 'pk'])
+FillOrder = namedtuple('FillOrder', [
+    'sequence', 'stock_id', 'aggressor', 'resting', 'quantity', 'price',
+    'aggressor_remaining', 'resting_remaining'])
+
+
+class Event:
+    NEW = 1
+    CANCEL = 2
+    FILL = 3
+
+
+def to_cents(price):
+    return int(price * 100)
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def to_micros(created):
+    return (created - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def encode(event):
+    """
+    Encode the event as a framed journal record.
+
+    :param event: NewOrder, CancelOrder or FillOrder
+    :return bytes:
+    """
+    if isinstance(event, NewOrder):
+        order = event.order
+        kind = Event.NEW
+        body = NEW_ORDER.pack(
+            order.pk.bytes, order.user_id, order.type, to_cents(order.price),
+            to_micros(order.created), order.remaining)
+    elif isinstance(event, CancelOrder):
+        kind = Event.CANCEL
+        body = CANCEL_ORDER.pack(event.pk.bytes)
+    else:
+        kind = Event.FILL
+        body = FILL_ORDER.pack(
+            event.aggressor.bytes, event.resting.bytes, event.quantity,
+            to_cents(event.price), event.aggressor_remaining, event.resting_remaining)
+
+    payload = HEADER.pack(kind, event.sequence, event.stock_id.bytes) + body
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode(payload):
+    """
+    Decode the payload of a journal record.
+
+    :param payload:
+    :return: NewOrder, CancelOrder or FillOrder
+    """
+    kind, sequence, stock_id = HEADER.unpack_from(payload)
+    stock_id = uuid.UUID(bytes=stock_id)
+    if kind == Event.NEW:
+        pk, user_id, type, cents, micros, remaining = NEW_ORDER.unpack_from(payload, HEADER.size)
+        return NewOrder(sequence, stock_id, BookOrder(
+            pk=uuid.UUID(bytes=pk),
+            user_id=user_id,
+            type=type,
+            price=from_cents(cents),
+            created=from_micros(micros),
+            remaining=remaining))
+    if kind == Event.CANCEL:
+        pk, = CANCEL_ORDER.unpack_from(payload, HEADER.size)
+        return CancelOrder(sequence, stock_id, uuid.UUID(bytes=pk))
+    aggressor, resting, quantity, cents, aggressor_remaining, resting_remaining = \
+        FILL_ORDER.unpack_from(payload, HEADER.size)
+    return FillOrder(
+        sequence, stock_id, uuid.UUID(bytes=aggressor), uuid.UUID(bytes=resting),
+        quantity, from_cents(cents), aggressor_remaining, resting_remaining)
+
+
+def read_records(data, offset=0):
+    """
+    Read the journal records of the data, up to the first torn or corrupted record.
+
+    :param data:
+    :param offset:
+    :return tuple: events and the length of the valid data
+    """
+    events = []
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        payload = data[offset + FRAME.size:offset + FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        events.append(decode(payload))
+        offset += FRAME.size + length
+    return events, offset
+
+
+def apply_event(books, event):
+    """
+    Apply the journal event to the order books.
+
+    Fills set the remainders they recorded instead of matching again,
+    so replaying the journal rebuilds the books it was written from.
+
+    :param books: dict of stock id to OrderBook
+    :param event:
+    :return:
+    """
+    book = books.get(event.stock_id)
+    if book is None:
+        book = books[event.stock_id] = OrderBook(event.stock_id)
+
+    if isinstance(event, NewOrder):
+        book.add(event.order)
+    elif isinstance(event, CancelOrder):
+        book.remove(event.pk)
+    else:
+        for pk, remaining in (
+                (event.aggressor, event.aggressor_remaining),
+                (event.resting, event.resting_remaining)):
+            order = book.orders.get(pk)
+            if order is None:
+                continue
+            order.remaining = remaining
+            if remaining == 0:
+                book.remove(pk)
+
+
+class Journal:
+    """
+    Journal is the append-only write-ahead log of the order book events.
+
+    Events are written to segment files named by their first sequence.
+    A snapshot of the books starts a new segment, replaying the latest
+    snapshot and the events after it rebuilds the books.
+    """
+
+    def __init__(
+            self,
+            directory,
+            fsync=True
+    ):
+        self.directory = directory
+        self.fsync = fsync
+        self.sequence = 0
+        self.snapshot_sequence = 0
+        self.file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def get_files(self, name):
+        prefix = name.split('{')[0]
+        return sorted(
+            (int(f[len(prefix):].split('.')[0]), os.path.join(self.directory, f))
+            for f in os.listdir(self.directory)
+            if f.startswith(prefix) and not f.endswith('.tmp'))
+
+    def next_sequence(self):
+        self.sequence += 1
+        return self.sequence
+
+    def append(self, events):
+        """
+        Write the events and flush them to disk, before they are applied.
+
+        :param events:
+        :return:
+        """
+        if not events:
+            return
+        if self.file is None:
+            path = os.path.join(self.directory, SEGMENT_NAME.format(events[0].sequence))
+            self.file = open(path, 'ab')
+        self.file.write(b''.join(encode(e) for e in events))
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def load_snapshot(self):
+        """
+        Load the latest valid snapshot.
+
+        :return tuple: sequence and dict of stock id to OrderBook
+        """
+        for sequence, path in reversed(self.get_files(SNAPSHOT_NAME)):
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, sequence, count = SNAPSHOT.unpack_from(data)
+            events, _ = read_records(data, SNAPSHOT.size)
+            if magic != SNAPSHOT_MAGIC or len(events) != count:
+                logger.error(f"ERROR load_snapshot: {path} is corrupted")
+                continue
+
+            books = {}
+            for event in events:
+                apply_event(books, event)
+            return sequence, books
+        return 0, {}
+
+    def recover(self):
+        """
+        Rebuild the order books from the latest snapshot and the events after it.
+
+        A torn record at the end of the last segment is truncated. The fills
+        of every kept segment are returned for the persister to catch up.
+
+        :return tuple: dict of stock id to OrderBook, and the fills
+        """
+        self.close()
+        self.snapshot_sequence, books = self.load_snapshot()
+        self.sequence = self.snapshot_sequence
+
+        fills = []
+        segments = self.get_files(SEGMENT_NAME)
+        for i, (start, path) in enumerate(segments):
+            with open(path, 'rb') as f:
+                data = f.read()
+            events, length = read_records(data)
+            if length < len(data):
+                logger.error(f"ERROR recover: {path} truncated at {length}")
+                if i == len(segments) - 1:
+                    with open(path, 'r+b') as f:
+                        f.truncate(length)
+
+            for event in events:
+                if isinstance(event, FillOrder):
+                    fills.append(event)
+                if event.sequence > self.snapshot_sequence:
+                    apply_event(books, event)
+                self.sequence = max(self.sequence, event.sequence)
+
+        logger.info(
+            f"recover: snapshot {self.snapshot_sequence}, sequence {self.sequence}, "
+            f"{sum(len(b) for b in books.values())} orders")
+        return books, fills
+
+    def snapshot(
+            self,
+            books,
+            persisted
+    ):
+        """
+        Write a snapshot of the books at the current sequence and start a new segment.
+
+        Segments are deleted once every event they hold is in the snapshot
+        and persisted.
+
+        :param books: dict of stock id to OrderBook
+        :param persisted: last persisted sequence
+        :return:
+        """
+        events = []
+        for stock_id, book in books.items():
+            for type in sorted(book.levels):
+                for price in book.prices[type]:
+                    events.extend(
+                        NewOrder(self.sequence, stock_id, order)
+                        for order in book.levels[type][price] if order.remaining > 0)
+
+        path = os.path.join(self.directory, SNAPSHOT_NAME.format(self.sequence))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(SNAPSHOT.pack(SNAPSHOT_MAGIC, self.sequence, len(events)))
+            f.write(b''.join(encode(e) for e in events))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self.snapshot_sequence = self.sequence
+        self.close()
+
+        for sequence, old in self.get_files(SNAPSHOT_NAME):
+            if sequence < self.snapshot_sequence:
+                os.remove(old)
+        limit = min(self.snapshot_sequence, persisted)
+        segments = self.get_files(SEGMENT_NAME)
+        for (start, old), (end, _) in zip(segments, segments[1:] + [(self.sequence + 1, None)]):
+            if end - 1 <= limit:
+                os.remove(old)
@@ -0,0 +1,53 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import hashlib
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def get_lock_key(namespace: str, value):
+    """
+    Get the signed 64-bit advisory lock key of the namespaced value.
+
+    :param namespace:
+    :param value:
+    :return int:
+    """
+    digest = hashlib.md5(f"{namespace}:{value}".encode("UTF-8")).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+@contextmanager
+def advisory_lock(
+        namespace: str,
+        value,
+        using=DEFAULT_DB_ALIAS
+):
+    """
+    Try to acquire a PostgreSQL session advisory lock, without waiting.
+
+    Yields whether the lock was acquired. Other database vendors have no
+    advisory locks and always acquire.
+
+    :param namespace:
+    :param value:
+    :param using:
+    :return bool:
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+
+    key = get_lock_key(namespace, value)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
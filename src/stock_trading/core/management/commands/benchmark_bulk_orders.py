@@ -0,0 +1,232 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Stock, Transaction
+from core.services import TransactionService
+
+User = get_user_model()
+
+BENCHMARK_PREFIX = 'zbulk'
+
+# lines generated and written at a time
+GENERATE_CHUNK = 100000
+
+
+def generate_file(
+        path,
+        lines,
+        stocks,
+        seed
+):
+    """
+    Write a reproducible bulk order file, a block of lines at a time.
+
+    :param path:
+    :param lines:
+    :param stocks: stock codes
+    :param seed:
+    :return int: file size in bytes
+    """
+    rng = np.random.default_rng(seed)
+    types = np.array([name for _, name in Transaction.Type.CHOICES])
+    stocks = np.array(stocks)
+    with open(path, 'w') as f:
+        f.write("TYPE,STOCK,QUANTITY,PRICE\n")
+        for start in range(0, lines, GENERATE_CHUNK):
+            size = min(GENERATE_CHUNK, lines - start)
+            f.writelines(
+                f"{t},{s},{q},{c // 100}.{c % 100:02}\n" for t, s, q, c in zip(
+                    types[rng.integers(0, len(types), size)],
+                    stocks[rng.integers(0, len(stocks), size)],
+                    rng.integers(1, 11, size) * 10,
+                    rng.integers(9000, 11000, size)))
+    return os.path.getsize(path)
+
+
+def convert_file(
+        path,
+        format
+):
+    """
+    Convert the bulk order CSV file to a Parquet or Arrow IPC file with
+    typed columns, next to the CSV file.
+
+    :param path:
+    :param format: TransactionService.Format
+    :return str: converted file path
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pc
+    import pyarrow.parquet as pq
+
+    table = pc.read_csv(path, convert_options=pc.ConvertOptions(column_types={
+        "QUANTITY": pa.int64(), "PRICE": pa.decimal128(12, 2)}))
+    converted = f"{os.path.splitext(path)[0]}.{format}"
+    if format == TransactionService.Format.PARQUET:
+        pq.write_table(table, converted)
+    else:
+        with pa.ipc.new_file(converted, table.schema) as writer:
+            writer.write_table(table, max_chunksize=GENERATE_CHUNK)
+    return converted
+
+
+class Command(BaseCommand):
+    help = "Benchmark the bulk order file processing by file size, format, chunk size and ingest, " \
+           "the lines/sec and optionally the peak memory. Run against a scratch database, " \
+           "benchmark rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lines",
+            nargs="+",
+            type=int,
+            default=[10000, 100000],
+            help="Number of lines of the generated files.",
+        )
+        parser.add_argument(
+            "--chunksize",
+            nargs="+",
+            type=int,
+            default=[10000, 0],
+            help="Lines read and committed at a time, 0 to read the whole file.",
+        )
+        parser.add_argument(
+            "--ingest",
+            nargs="+",
+            choices=[c[0] for c in TransactionService.Ingest.CHOICES],
+            default=[c[0] for c in TransactionService.Ingest.CHOICES],
+            help="Bulk order ingests to benchmark.",
+        )
+        parser.add_argument(
+            "--format",
+            nargs="+",
+            choices=[c[0] for c in TransactionService.Format.CHOICES],
+            default=[TransactionService.Format.CSV],
+            help="Bulk order file formats to benchmark, Parquet and Arrow IPC require pyarrow.",
+        )
+        parser.add_argument(
+            "--memory",
+            action="store_true",
+            help="Trace the peak memory, in a second run of each file.",
+        )
+        parser.add_argument(
+            "--stocks",
+            type=int,
+            default=4,
+            help="Number of stocks to generate.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed of the file.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the JSON results to the file instead of the standard output.",
+        )
+
+    def run_file(self, path, codes, chunksize, ingest, memory=False):
+        """
+        Process the file with the chunk size and ingest, tracing the memory
+        allocations when memory is set.
+
+        :param path:
+        :param codes: stock codes
+        :param chunksize:
+        :param ingest:
+        :param memory:
+        :return dict:
+        """
+        with transaction.atomic():
+            Stock.objects.bulk_create([
+                Stock(code=code, name=f"{BENCHMARK_PREFIX} {code}")
+                for code in codes])
+            user = User.objects.create(username=BENCHMARK_PREFIX)
+
+            orders = 0
+            with open(path, 'rb') as file:
+                if memory:
+                    tracemalloc.start()
+                start = time.perf_counter()
+                for _, pks, _ in TransactionService.stream_bulk_orders(
+                        user, os.path.basename(path), file, chunksize or None, ingest):
+                    orders += len(pks)
+                seconds = time.perf_counter() - start
+                if memory:
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+            transaction.set_rollback(True)
+
+        if memory:
+            return {'peak_mb': round(peak / 2 ** 20, 2)}
+        return {
+            'orders': orders,
+            'seconds': round(seconds, 6),
+            'lines_per_sec': round(orders / seconds, 2),
+        }
+
+    def handle(self, *args, **options):
+        codes = [f"B{i:03}" for i in range(options['stocks'])]
+        results = {
+            'vendor': connection.vendor,
+            'parameters': {
+                key: options[key] for key in (
+                    'lines', 'format', 'chunksize', 'ingest', 'memory', 'stocks', 'seed')},
+            'runs': [],
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            for lines in options['lines']:
+                csv = os.path.join(directory, f"{BENCHMARK_PREFIX}-{lines}.csv")
+                generate_file(csv, lines, codes, options['seed'])
+                for format in options['format']:
+                    path = csv if format == TransactionService.Format.CSV else convert_file(csv, format)
+                    size = os.path.getsize(path)
+                    for chunksize in options['chunksize']:
+                        for ingest in options['ingest']:
+                            self.stderr.write(
+                                f"Benchmarking {lines} lines {format}, chunk size {chunksize}, {ingest} ingest...")
+                            result = {
+                                'lines': lines,
+                                'format': format,
+                                'bytes': size,
+                                'chunksize': chunksize,
+                                'ingest': ingest,
+                            }
+                            # keep the standard output for the results
+                            with redirect_stdout(sys.stderr):
+                                result.update(self.run_file(path, codes, chunksize, ingest))
+                                if options['memory']:
+                                    result.update(self.run_file(path, codes, chunksize, ingest, True))
+                            results['runs'].append(result)
+                    if path != csv:
+                        os.remove(path)
+                os.remove(csv)
+
+        # peak resident memory of the whole run, kilobytes on Linux
+        results['max_rss_mb'] = round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 2)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,293 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from decimal import Decimal
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Stock, Transaction
+from core.services import TransactionService, BookLevelService
+
+User = get_user_model()
+
+BENCHMARK_PREFIX = 'zmatch'
+
+
+class QueryCounter:
+    """
+    QueryCounter counts the queries executed on a connection, as an execute wrapper.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def generate_flow(
+        orders,
+        stocks,
+        users,
+        buy_ratio,
+        price,
+        price_sd,
+        seed
+):
+    """
+    Generate a reproducible synthetic order flow.
+
+    Prices are normally distributed around the mid price, rounded to cents.
+
+    :param orders:
+    :param stocks:
+    :param users:
+    :param buy_ratio:
+    :param price: mid price
+    :param price_sd: standard deviation of the prices
+    :param seed:
+    :return dict: arrays of the order fields
+    """
+    rng = np.random.default_rng(seed)
+    return {
+        'stock': rng.integers(0, stocks, orders),
+        'user': rng.integers(0, users, orders),
+        'type': np.where(
+            rng.random(orders) < buy_ratio,
+            Transaction.Type.BUY,
+            Transaction.Type.SELL),
+        'quantity': rng.integers(1, 11, orders) * 10,
+        'cents': np.maximum(
+            np.rint(rng.normal(price, price_sd, orders) * 100), 1).astype(int),
+    }
+
+
+def generate_depth(
+        depth,
+        stocks,
+        users,
+        price,
+        price_sd,
+        seed
+):
+    """
+    Generate the resting orders of each stock, bids below and asks above the mid price.
+
+    :param depth: resting orders per side
+    :param stocks:
+    :param users:
+    :param price: mid price
+    :param price_sd: standard deviation of the prices
+    :param seed:
+    :return list: (stock, user, type, quantity, cents)
+    """
+    rng = np.random.default_rng(seed + 1)
+    mid = int(round(price * 100))
+    orders = []
+    for stock in range(stocks):
+        for type, sign in ((Transaction.Type.BUY, -1), (Transaction.Type.SELL, 1)):
+            offsets = np.abs(rng.normal(0, price_sd, depth)) * 100 + 1
+            cents = np.maximum(mid + sign * np.ceil(offsets).astype(int), 1)
+            for c, u, q in zip(
+                    cents,
+                    rng.integers(0, users, depth),
+                    rng.integers(1, 11, depth) * 10):
+                orders.append((stock, int(u), type, int(q), int(c)))
+    return orders
+
+
+class Command(BaseCommand):
+    help = "Benchmark the matching engines with a synthetic order flow. " \
+           "Run against a scratch database, benchmark rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--engine",
+            nargs="+",
+            choices=[c[0] for c in TransactionService.Engine.CHOICES],
+            default=[c[0] for c in TransactionService.Engine.CHOICES],
+            help="Matching engines to benchmark.",
+        )
+        parser.add_argument(
+            "--orders",
+            type=int,
+            default=2000,
+            help="Number of orders in the flow.",
+        )
+        parser.add_argument(
+            "--stocks",
+            type=int,
+            default=4,
+            help="Number of stocks to generate.",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=50,
+            help="Number of users to generate.",
+        )
+        parser.add_argument(
+            "--depth",
+            type=int,
+            default=200,
+            help="Resting orders per side of each stock before the flow.",
+        )
+        parser.add_argument(
+            "--buy_ratio",
+            type=float,
+            default=0.5,
+            help="Ratio of buy orders in the flow.",
+        )
+        parser.add_argument(
+            "--price",
+            type=float,
+            default=100.0,
+            help="Mid price of the flow.",
+        )
+        parser.add_argument(
+            "--price_sd",
+            type=float,
+            default=1.0,
+            help="Standard deviation of the flow prices.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed of the flow.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Match every pending order after each order, not only the unmatched orders.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the JSON results to the file instead of the standard output.",
+        )
+
+    def setup_book(self, options):
+        """
+        Create the benchmark stocks, users and resting orders.
+
+        :param options:
+        :return tuple: stocks and users
+        """
+        stocks = Stock.objects.bulk_create([
+            Stock(
+                code=f"M{i:03}",
+                name=f"{BENCHMARK_PREFIX} {i}",
+                price=Decimal(str(options['price'])))
+            for i in range(options['stocks'])])
+        users = User.objects.bulk_create([
+            User(username=f"{BENCHMARK_PREFIX}{i}")
+            for i in range(options['users'])])
+
+        depth = generate_depth(
+            options['depth'], options['stocks'], options['users'],
+            options['price'], options['price_sd'], options['seed'])
+        orders = []
+        levels = {}
+        for stock, user, type, quantity, cents in depth:
+            price = Decimal(cents).scaleb(-2)
+            orders.append(Transaction(
+                stock=stocks[stock],
+                user=users[user],
+                type=type,
+                quantity=quantity,
+                price=price,
+                amount=quantity * price))
+            level = levels.setdefault((stocks[stock].pk, type, price), [0, 0])
+            level[0] += quantity
+            level[1] += 1
+        Transaction.objects.bulk_create(orders, batch_size=1000)
+        BookLevelService.update_book_levels(levels)
+        return stocks, users
+
+    def run_engine(self, engine, flow, options):
+        """
+        Replay the flow one order at a time, matching the stock after each order.
+
+        :param engine:
+        :param flow:
+        :param options:
+        :return dict:
+        """
+        latencies = []
+        queries = QueryCounter()
+        fills = 0
+        with transaction.atomic():
+            stocks, users = self.setup_book(options)
+            # the first pass matches the resting orders
+            for stock in stocks:
+                TransactionService.process_stock_order_transaction(stock.code, engine)
+
+            for i in range(options['orders']):
+                stock = stocks[flow['stock'][i]]
+                quantity = int(flow['quantity'][i])
+                TransactionService.create_transaction(
+                    user=users[flow['user'][i]],
+                    stock=stock,
+                    quantity=quantity,
+                    price=Decimal(int(flow['cents'][i])).scaleb(-2),
+                    type=int(flow['type'][i]))
+
+                with connection.execute_wrapper(queries):
+                    start = time.perf_counter()
+                    fills += TransactionService.process_stock_order_transaction(
+                        stock.code, engine, options['full'])
+                    latencies.append(time.perf_counter() - start)
+
+            transaction.set_rollback(True)
+
+        seconds = sum(latencies)
+        latencies = np.array(latencies) * 1000
+        return {
+            'orders': options['orders'],
+            'fills': fills,
+            'seconds': round(seconds, 6),
+            'orders_per_sec': round(options['orders'] / seconds, 2),
+            'fills_per_sec': round(fills / seconds, 2),
+            'queries_per_order': round(queries.count / options['orders'], 2),
+            'latency_ms': {
+                'p50': round(float(np.percentile(latencies, 50)), 3),
+                'p99': round(float(np.percentile(latencies, 99)), 3),
+                'max': round(float(latencies.max()), 3),
+            },
+        }
+
+    def handle(self, *args, **options):
+        flow = generate_flow(
+            options['orders'], options['stocks'], options['users'],
+            options['buy_ratio'], options['price'], options['price_sd'],
+            options['seed'])
+
+        results = {
+            'vendor': connection.vendor,
+            'parameters': {
+                key: options[key] for key in (
+                    'orders', 'stocks', 'users', 'depth', 'buy_ratio',
+                    'price', 'price_sd', 'seed', 'full')},
+            'engines': {},
+        }
+        for engine in options['engine']:
+            self.stderr.write(f"Benchmarking {engine} engine...")
+            # keep the standard output for the results
+            with redirect_stdout(sys.stderr):
+                results['engines'][engine] = self.run_engine(engine, flow, options)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
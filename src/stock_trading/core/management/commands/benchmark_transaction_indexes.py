@@ -0,0 +1,171 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Stock, Transaction, Order, Trade
+from core.services import TransactionService
+
+User = get_user_model()
+
+BENCHMARK_PREFIX = 'zbench'
+
+INSERT_TRANSACTIONS_SQL = """
+INSERT INTO core_transactions (
+    id, created, modified, is_order, type, status,
+    stock_id, user_id, quantity, price, amount, filled_quantity, matched)
+SELECT
+    gen_random_uuid(), t.created, t.created, t.is_order, t.type,
+    CASE WHEN t.is_order AND t.pending THEN 0 ELSE 1 END,
+    t.stock_id, t.user_id, t.quantity, t.price, t.quantity * t.price,
+    CASE WHEN t.is_order AND t.pending THEN 0 ELSE t.quantity END,
+    NOT (t.is_order AND t.pending)
+FROM (
+    SELECT
+        now() - g * interval '1 second' AS created,
+        random() < 0.5 AS is_order,
+        random() < %(pending)s AS pending,
+        (random() < 0.5)::int AS type,
+        (%(stocks)s::uuid[])[1 + g %% cardinality(%(stocks)s::uuid[])] AS stock_id,
+        (%(users)s::int[])[1 + (g / 7) %% cardinality(%(users)s::int[])] AS user_id,
+        1 + (random() * 100)::int AS quantity,
+        round((50 + random() * 100)::numeric, 2) AS price
+    FROM generate_series(1, %(rows)s) AS g
+) AS t
+"""
+
+
+def get_plan_nodes(plan):
+    """
+    Flatten the plan nodes of the JSON explain output.
+
+    :param plan:
+    :return list:
+    """
+    node = plan['Node Type']
+    if plan.get('Index Name'):
+        node = f"{node} using {plan['Index Name']}"
+    nodes = [node]
+    for p in plan.get('Plans', []):
+        nodes.extend(get_plan_nodes(p))
+    return nodes
+
+
+def explain(queryset):
+    """
+    Explain and analyze the queryset.
+
+    :param queryset:
+    :return dict:
+    """
+    output = json.loads(queryset.explain(format='json', analyze=True))[0]
+    return {
+        'nodes': get_plan_nodes(output['Plan']),
+        'execution_time': output['Execution Time'],
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark the query plans of the transaction indexes. " \
+           "Run against a scratch database, benchmark rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=2000000,
+            help="Number of transactions to generate.",
+        )
+        parser.add_argument(
+            "--stocks",
+            type=int,
+            default=100,
+            help="Number of stocks to generate.",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=1000,
+            help="Number of users to generate.",
+        )
+        parser.add_argument(
+            "--pending",
+            type=float,
+            default=0.05,
+            help="Ratio of orders that are still pending.",
+        )
+
+    def get_querysets(self, stock, user):
+        aggressor = Transaction(
+            stock=stock,
+            user=user,
+            type=Transaction.Type.SELL,
+            price=Decimal('140.00'))
+        querysets = {
+            'match_bids': TransactionService.get_counter_orders(aggressor),
+        }
+        aggressor.type = Transaction.Type.BUY
+        aggressor.price = Decimal('60.00')
+        querysets.update({
+            'match_asks': TransactionService.get_counter_orders(aggressor),
+            'pending_orders': Transaction.objects.filter(
+                is_order=True,
+                status=Transaction.Status.PENDING,
+                stock__code=stock.code).order_by('created'),
+            'order_list': Order.objects.all()[:50],
+            'order_list_user': Order.objects.filter(user=user)[:50],
+            'trade_list_user': Trade.objects.filter(user=user)[:50],
+        })
+        return querysets
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Benchmark requires PostgreSQL.")
+
+        indexes = [i.name for i in Transaction._meta.indexes]
+        results = {}
+        with transaction.atomic():
+            stocks = Stock.objects.bulk_create([
+                Stock(code=f"Z{i:03}", name=f"{BENCHMARK_PREFIX} {i}")
+                for i in range(options['stocks'])])
+            users = User.objects.bulk_create([
+                User(username=f"{BENCHMARK_PREFIX}{i}")
+                for i in range(options['users'])])
+
+            self.stdout.write(f"Generating {options['rows']} transactions...")
+            with connection.cursor() as cursor:
+                cursor.execute(INSERT_TRANSACTIONS_SQL, {
+                    'rows': options['rows'],
+                    'pending': options['pending'],
+                    'stocks': [s.pk for s in stocks],
+                    'users': [u.pk for u in users],
+                })
+                cursor.execute("ANALYZE core_transactions")
+
+            querysets = self.get_querysets(stocks[0], users[0])
+
+            # plans without the partial indexes
+            sid = transaction.savepoint()
+            with connection.cursor() as cursor:
+                for name in indexes:
+                    cursor.execute(f'DROP INDEX "{name}"')
+            for name, queryset in querysets.items():
+                results[name] = {'before': explain(queryset)}
+            transaction.savepoint_rollback(sid)
+
+            for name, queryset in querysets.items():
+                results[name]['after'] = explain(queryset)
+
+            transaction.set_rollback(True)
+
+        for name, result in results.items():
+            self.stdout.write(name)
+            for key in ('before', 'after'):
+                self.stdout.write(
+                    f"  {key:<6} {result[key]['execution_time']:>10.3f} ms  "
+                    f"{' > '.join(result[key]['nodes'])}")
@@ -0,0 +1,46 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from core.services import TickService
+
+
+class Command(BaseCommand):
+    help = "Create the day partitions of the ticks ahead and detach the old ones. " \
+           "Ticks are partitioned on PostgreSQL only."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=7,
+            help="Days of partitions to create ahead, from today.",
+        )
+        parser.add_argument(
+            "--retention",
+            type=int,
+            help="Detach the partitions older than the days.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the detached partitions.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(f"Ticks are not partitioned on {connection.vendor}.")
+            return
+
+        today = timezone.now().date()
+        for name in TickService.create_partitions(today, options['days']):
+            self.stdout.write(f"Created {name}")
+        if options['retention'] is not None:
+            before = today - timedelta(days=options['retention'])
+            for name in TickService.detach_partitions(before, options['drop']):
+                self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} {name}")
@@ -1,38 +1,34 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-17
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.core.files.storage import default_storage
-from django.contrib.auth import get_user_model
 
-from core.services import TransactionService
-
-User = get_user_model()
-
-
-def process_folder_files(dir):
-    dirs, files = default_storage.listdir(dir)
-    for d in dirs:
-        process_folder_files(d)
-
-    for f in files:
-        if 'CSV' not in f.upper():
-            continue
-        file_path = f"{dir}/{f}"
-        print(f"{file_path}")
-        file = default_storage.open(file_path)
-
-        user = User.objects.get(pk=dir)
-        TransactionService.bulk_orders(
-            user=user,
-            filename=f,
-            file=file
-        )
-        default_storage.delete(file_path)
+from core.services import BulkOrderJobService, BULK_ORDERS_CHUNK
 
 
 class Command(BaseCommand):
-    help = "Process bulk order file."
+    help = "Process the pending bulk order jobs and the stored bulk order files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.BULK_ORDER_WORKERS,
+            help="Number of processes to run the bulk order jobs concurrently.",
+        )
+        parser.add_argument(
+            "--chunksize",
+            type=int,
+            default=BULK_ORDERS_CHUNK,
+            help="Lines of the bulk order files read and committed at a time.",
+        )
 
     def handle(self, *args, **options):
-        process_folder_files('.')
+        jobs = BulkOrderJobService.create_stored_jobs()
+        if jobs:
+            self.stdout.write(f"process_bulk_order_file: {len(jobs)} stored files")
+        count = BulkOrderJobService.process_jobs(
+            chunksize=options['chunksize'],
+            workers=options['workers'])
+        self.stdout.write(f"process_bulk_order_file: {count} jobs")
@@ -14,7 +14,27 @@ class Command(BaseCommand):
             "--stock_code",
             help="Stock code to process.",
         )
+        parser.add_argument(
+            "--engine",
+            choices=[c[0] for c in TransactionService.Engine.CHOICES],
+            default=TransactionService.Engine.QUERY,
+            help="Matching engine to process with.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes to match stocks concurrently.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Match every pending order, not only the unmatched orders and the resting orders they can cross.",
+        )
 
     def handle(self, *args, **options):
         TransactionService.process_order_transaction(
-            options.get('stock_code', None))
+            options.get('stock_code', None),
+            engine=options.get('engine'),
+            workers=options.get('workers'),
+            full=options.get('full'))
@@ -0,0 +1,33 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.services import CandleService, EPOCH
+
+
+class Command(BaseCommand):
+    help = "Roll up the coarser candles from the finer candles."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutes",
+            type=int,
+            default=10,
+            help="Roll up the candles updated within the last minutes.",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Rebuild the minute candles from the trades and roll up every candle.",
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(minutes=options['minutes'])
+        if options['backfill']:
+            CandleService.backfill_candles()
+            since = EPOCH
+        CandleService.rollup_candles(since)
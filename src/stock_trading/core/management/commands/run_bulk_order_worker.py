@@ -0,0 +1,53 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, InterfaceError, connection
+
+from core.events import BULK_ORDER_CHANNEL, Listener
+from core.services import BulkOrderJobService, BULK_ORDERS_CHUNK
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run the bulk order worker, processing the bulk order jobs as they are uploaded."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sweep",
+            type=int,
+            default=60,
+            help="Seconds without notifications before claiming the pending jobs.",
+        )
+        parser.add_argument(
+            "--chunksize",
+            type=int,
+            default=BULK_ORDERS_CHUNK,
+            help="Lines of the bulk order files read and committed at a time.",
+        )
+
+    def handle(self, *args, **options):
+        listener = Listener(BULK_ORDER_CHANNEL)
+
+        reconnect = True
+        while True:
+            try:
+                if reconnect:
+                    # catch up the jobs uploaded while the worker was not listening
+                    listener.listen()
+                    BulkOrderJobService.process_jobs(options['chunksize'])
+                    reconnect = False
+
+                listener.wait(options['sweep'])
+                count = BulkOrderJobService.process_jobs(options['chunksize'])
+                if count:
+                    logger.info(f"run_bulk_order_worker: {count} jobs")
+            except (OperationalError, InterfaceError) as e:
+                logger.error(f"ERROR run_bulk_order_worker: {e}")
+                connection.close()
+                time.sleep(1)
+                reconnect = True
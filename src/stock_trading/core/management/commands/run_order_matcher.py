@@ -0,0 +1,103 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, InterfaceError, connection
+
+from core.events import ORDER_CHANNEL, Listener
+from core.journal import Journal
+from core.matcher import JournalPersister, ResidentMatcher
+from core.services import TransactionService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run the order matcher, matching stocks as their orders are placed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--engine",
+            choices=[c[0] for c in TransactionService.Engine.CHOICES],
+            default=TransactionService.Engine.BOOK,
+            help="Matching engine to process with.",
+        )
+        parser.add_argument(
+            "--sweep",
+            type=int,
+            default=300,
+            help="Seconds without notifications before matching every stock.",
+        )
+        parser.add_argument(
+            "--resident",
+            action="store_true",
+            help="Keep the order books in memory, journaled, and persist the fills in the background.",
+        )
+        parser.add_argument(
+            "--journal",
+            default=settings.MATCHING_JOURNAL_ROOT,
+            help="Directory of the resident matcher journal and snapshots.",
+        )
+        parser.add_argument(
+            "--snapshot_interval",
+            type=int,
+            default=10000,
+            help="Journal events between the resident matcher snapshots.",
+        )
+
+    def sweep(self):
+        if self.matcher is not None:
+            self.matcher.sweep()
+        else:
+            TransactionService.process_order_transaction(None, engine=self.engine)
+
+    def match(self, stock_code):
+        if self.matcher is not None:
+            self.matcher.sync(stock_code)
+        else:
+            TransactionService.process_stock_order_transaction(stock_code, self.engine)
+
+    def handle(self, *args, **options):
+        self.engine = options['engine']
+        self.matcher = None
+        if options['resident']:
+            self.matcher = ResidentMatcher(
+                Journal(options['journal']),
+                JournalPersister(),
+                snapshot_interval=options['snapshot_interval'])
+            self.matcher.start()
+            self.matcher.persister.start()
+        listener = Listener(ORDER_CHANNEL)
+
+        reconnect = True
+        try:
+            while True:
+                try:
+                    if reconnect:
+                        # catch up the orders placed while the matcher was not listening
+                        listener.listen()
+                        self.sweep()
+                        reconnect = False
+
+                    payloads = listener.wait(options['sweep'])
+                    stock_codes = payloads.get(ORDER_CHANNEL)
+                    if not stock_codes:
+                        self.sweep()
+                    else:
+                        for code in sorted(stock_codes):
+                            logger.info(f"run_order_matcher: {code}")
+                            self.match(code)
+                except (OperationalError, InterfaceError) as e:
+                    logger.error(f"ERROR run_order_matcher: {e}")
+                    connection.close()
+                    if self.matcher is not None:
+                        self.matcher.reset()
+                    time.sleep(1)
+                    reconnect = True
+        finally:
+            if self.matcher is not None:
+                self.matcher.stop()
@@ -0,0 +1,382 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+from django.db.transaction import atomic
+
+from core.engine import BookOrder, Fill, OrderBook
+from core.journal import NewOrder, CancelOrder, FillOrder
+from core.locks import advisory_lock
+from core.models import Stock, Transaction, MatchingWatermark
+from core.services import TransactionService, MATCHING_LOCK
+
+logger = logging.getLogger(__name__)
+
+
+class JournalPersister(threading.Thread):
+    """
+    JournalPersister persists the journaled fills to the database in batches,
+    in the background of the resident matcher.
+    """
+
+    def __init__(
+            self,
+            batch_size=1000,
+            interval=0.05
+    ):
+        super().__init__(name='journal-persister', daemon=True)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue()
+        self.persisted = 0
+        self.stopping = threading.Event()
+        # stock id to the order ids and quantities of the dropped fills
+        self.restored = {}
+
+    def put(self, fills):
+        for fill in fills:
+            self.queue.put(fill)
+
+    def get_batch(self, timeout=None):
+        """
+        Get the next batch of fills, waiting for the first one up to the timeout.
+
+        :param timeout:
+        :return list:
+        """
+        try:
+            batch = [self.queue.get(timeout=timeout)] if timeout else [self.queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        try:
+            while not (self.stopping.is_set() and self.queue.empty()):
+                batch = self.get_batch(self.interval)
+                while batch:
+                    try:
+                        self.persist_batch(batch)
+                        batch = []
+                    except Exception as e:
+                        # the journal keeps the fills, retry the batch
+                        logger.exception(f"ERROR journal persister: {e}")
+                        connections.close_all()
+                        time.sleep(1)
+        finally:
+            connections.close_all()
+
+    def persist_batch(self, batch):
+        self.persisted = max(self.persisted, self.persist(batch, self.restored))
+        for _ in batch:
+            self.queue.task_done()
+
+    def flush(self):
+        """
+        Persist the queued fills in the calling thread.
+
+        :return:
+        """
+        batch = self.get_batch()
+        while batch:
+            self.persist_batch(batch)
+            batch = self.get_batch()
+
+    def wait(self):
+        """
+        Wait until the queued fills are persisted.
+
+        :return:
+        """
+        if self.is_alive():
+            self.queue.join()
+        else:
+            self.flush()
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
+
+    @staticmethod
+    def persist(
+            fills,
+            restored=None
+    ):
+        """
+        Persist the journaled fills, the fills of each stock in one database transaction.
+
+        The last persisted sequence of the stock is saved with its fills,
+        fills already persisted before a restart are skipped. Fills of orders
+        deleted from the database are dropped, the quantity of a dropped
+        fill is restored to its counterparty and added to the remainders
+        of its later fills.
+
+        :param fills: FillOrder events
+        :param restored: stock id to order id to the restored quantity
+        :return int: last sequence
+        """
+        if not fills:
+            return 0
+        if restored is None:
+            restored = {}
+
+        by_stock = defaultdict(list)
+        for fill in fills:
+            by_stock[fill.stock_id].append(fill)
+        stocks = Stock.objects.in_bulk(list(by_stock))
+        orders = {
+            t['pk']: t for t in Transaction.objects.filter(
+                pk__in={pk for f in fills for pk in (f.aggressor, f.resting)}
+            ).values('pk', 'user_id', 'type', 'price')}
+
+        for stock_id, events in by_stock.items():
+            with atomic():
+                watermark, _ = MatchingWatermark.objects.select_for_update(
+                ).get_or_create(stock_id=stock_id)
+                events = [e for e in events if e.sequence > watermark.journal_sequence]
+                if not events:
+                    continue
+
+                # one book order per order, its remainder is the one of its last fill
+                book_orders = {}
+                for pk in {pk for e in events for pk in (e.aggressor, e.resting)} & orders.keys():
+                    book_orders[pk] = BookOrder(
+                        pk=pk,
+                        user_id=orders[pk]['user_id'],
+                        type=orders[pk]['type'],
+                        price=orders[pk]['price'],
+                        created=None,
+                        remaining=0)
+
+                quantities = restored.setdefault(stock_id, {})
+                matched = []
+                for event in events:
+                    if event.aggressor not in book_orders or event.resting not in book_orders:
+                        logger.error(f"ERROR journal persister: dropped fill {event}")
+                        for pk in {event.aggressor, event.resting} & book_orders.keys():
+                            quantities[pk] = quantities.get(pk, 0) + event.quantity
+                        continue
+                    aggressor = book_orders[event.aggressor]
+                    resting = book_orders[event.resting]
+                    aggressor.remaining = event.aggressor_remaining + quantities.get(aggressor.pk, 0)
+                    resting.remaining = event.resting_remaining + quantities.get(resting.pk, 0)
+                    matched.append(Fill(aggressor, resting, event.quantity, event.price))
+
+                TransactionService.persist_fills(stocks[stock_id], matched)
+                watermark.journal_sequence = events[-1].sequence
+                watermark.save(update_fields=['journal_sequence', 'modified'])
+                if not quantities:
+                    del restored[stock_id]
+
+        return fills[-1].sequence
+
+
+class ResidentMatcher:
+    """
+    ResidentMatcher keeps the order books in memory.
+
+    Order events are journaled and flushed to disk before their fills are
+    persisted, the persister writes the fills to the database in the
+    background. At start, the books are rebuilt from the latest journal
+    snapshot and the events after it, so recovery is bounded by the
+    snapshot interval.
+    """
+
+    def __init__(
+            self,
+            journal,
+            persister,
+            snapshot_interval=10000
+    ):
+        self.journal = journal
+        self.persister = persister
+        self.snapshot_interval = snapshot_interval
+        self.books = {}
+        # stock id, type, price and quantity of the orders seen in the database
+        self.known = {}
+        self.locks = {}
+
+    def start(self):
+        """
+        Recover the books and catch up the fills the persister has not persisted.
+
+        :return:
+        """
+        self.books, fills = self.journal.recover()
+        JournalPersister.persist(fills)
+        self.persister.persisted = self.journal.sequence
+
+    def stop(self):
+        self.persister.stop()
+        self.persister.flush()
+        self.journal.close()
+        for stack in self.locks.values():
+            stack.close()
+        self.locks = {}
+
+    def reset(self):
+        """
+        Forget the matching locks of a lost database connection.
+
+        :return:
+        """
+        self.locks = {}
+
+    def lock(self, stock_code):
+        """
+        Hold the matching lock of the stock while the matcher runs.
+
+        :param stock_code:
+        :return bool:
+        """
+        if stock_code in self.locks:
+            return True
+        stack = ExitStack()
+        if stack.enter_context(advisory_lock(MATCHING_LOCK, stock_code)):
+            self.locks[stock_code] = stack
+            return True
+        stack.close()
+        return False
+
+    def sweep(self):
+        """
+        Synchronize every stock with pending orders or resting orders in memory.
+
+        :return int: fills
+        """
+        codes = set(Transaction.objects.filter(
+            is_order=True,
+            status=Transaction.Status.PENDING
+        ).values_list('stock__code', flat=True).distinct())
+        codes.update(Stock.objects.filter(
+            pk__in=[pk for pk, book in self.books.items() if len(book)]
+        ).values_list('code', flat=True))
+        return sum(self.sync(code) for code in sorted(codes))
+
+    def sync(self, stock_code):
+        """
+        Synchronize the stock book with its pending orders and match the new orders.
+
+        New orders are added to the book and matched, deleted orders are
+        cancelled, and orders changed by their owner are cancelled and
+        added again. Orders recovered from the journal keep at most the
+        remainder of the database, filled orders are cancelled. The counterparties of the fills the persister dropped
+        are read again from the database once the queued fills are persisted.
+
+        :param stock_code:
+        :return int: fills
+        """
+        if not self.lock(stock_code):
+            logger.info(f"SKIP resident matcher: {stock_code} is locked")
+            return 0
+
+        stock = Stock.objects.get(code=stock_code)
+        book = self.books.get(stock.pk)
+        if book is None:
+            book = self.books[stock.pk] = OrderBook(stock.pk)
+
+        events = []
+        if self.persister.restored.get(stock.pk):
+            # the later fills of the counterparties are persisted with their restored quantity
+            self.persister.wait()
+            for pk in self.persister.restored.pop(stock.pk, {}):
+                if pk in book:
+                    events.append(self.cancel(book, stock.pk, pk))
+                self.known.pop(pk, None)
+
+        rows = list(TransactionService.get_pending_orders(stock).order_by('created').values_list(
+            'pk', 'user_id', 'type', 'price', 'created', 'quantity', 'filled_quantity'))
+        pending = {row[0] for row in rows}
+
+        # deleted orders leave the book before the new orders are matched
+        events.extend(
+            self.cancel(book, stock.pk, pk)
+            for pk in [pk for pk in book.orders if pk not in pending])
+        for pk in [pk for pk, seen in self.known.items()
+                   if seen[0] == stock.pk and pk not in pending and pk not in book]:
+            del self.known[pk]
+
+        orders = []
+        for pk, user_id, type, price, created, quantity, filled_quantity in rows:
+            seen = self.known.get(pk)
+            current = (stock.pk, type, price, quantity)
+            if pk in book:
+                if seen is None:
+                    # recovered from the journal, filled by another engine
+                    # while the matcher was stopped
+                    self.known[pk] = current
+                    order = book.orders[pk]
+                    order.remaining = min(order.remaining, quantity - filled_quantity)
+                    if order.remaining <= 0:
+                        events.append(self.cancel(book, stock.pk, pk))
+                    continue
+                if seen == current:
+                    continue
+                # changed by the owner, the filled quantity is kept
+                remaining = quantity - (seen[3] - book.orders[pk].remaining)
+                events.append(self.cancel(book, stock.pk, pk))
+            elif seen is not None:
+                # cleared in memory, waiting to be persisted
+                continue
+            else:
+                remaining = quantity - filled_quantity
+
+            self.known[pk] = current
+            if remaining > 0:
+                order = BookOrder(pk, user_id, type, price, created, remaining)
+                events.append(NewOrder(self.journal.next_sequence(), stock.pk, BookOrder(
+                    pk, user_id, type, price, created, remaining)))
+                book.add(order)
+                orders.append(order)
+
+        if orders:
+            events.extend(self.match(book, stock.pk, orders))
+
+        fills = [e for e in events if isinstance(e, FillOrder)]
+        self.journal.append(events)
+        self.persister.put(fills)
+
+        if self.journal.sequence - self.journal.snapshot_sequence >= self.snapshot_interval:
+            self.journal.snapshot(self.books, self.persister.persisted)
+        return len(fills)
+
+    def cancel(self, book, stock_id, pk):
+        book.remove(pk)
+        return CancelOrder(self.journal.next_sequence(), stock_id, pk)
+
+    def match(self, book, stock_id, orders):
+        """
+        Match the new orders and the resting orders they can cross in `created`
+        order, as the order book engine does with every order of the book.
+
+        The resting orders that cannot cross a new order are already matched.
+
+        :param book:
+        :param stock_id:
+        :param orders: new book orders
+        :return list: fill events
+        """
+        aggressors = book.crossing(orders)
+        remaining = {order.pk: order.remaining for order in aggressors}
+        events = []
+        for fill in book.run(aggressors):
+            remaining[fill.aggressor.pk] -= fill.quantity
+            remaining[fill.resting.pk] -= fill.quantity
+            events.append(FillOrder(
+                self.journal.next_sequence(), stock_id, fill.aggressor.pk, fill.resting.pk,
+                fill.quantity, fill.price,
+                remaining[fill.aggressor.pk], remaining[fill.resting.pk]))
+        return events
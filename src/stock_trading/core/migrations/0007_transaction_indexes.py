@@ -0,0 +1,37 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_transaction_trades'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', True), ('status', 0), ('type', 0)), fields=['stock', '-price', 'created'], name='core_order_bid_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', True), ('status', 0), ('type', 1)), fields=['stock', 'price', 'created'], name='core_order_ask_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', True), ('status', 0)), fields=['stock', 'created'], name='core_order_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', True), ('status', 0)), fields=['-created'], name='core_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', True), ('status', 0)), fields=['user', '-created'], name='core_order_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', False), ('status', 1)), fields=['user', '-created'], name='core_trade_user_idx'),
+        ),
+    ]
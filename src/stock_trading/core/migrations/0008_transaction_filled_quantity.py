@@ -0,0 +1,42 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:16
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def forwards_filled_quantity(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    Through = Transaction.trades.through
+
+    cleared = Through.objects.filter(
+        from_transaction=OuterRef('pk')
+    ).values('from_transaction').annotate(
+        total=Sum('to_transaction__quantity')
+    ).values('total')
+
+    # orders are filled by the sum of their trades
+    Transaction.objects.filter(is_order=True).update(
+        filled_quantity=Coalesce(Subquery(cleared), 0))
+    # trades are filled by definition
+    Transaction.objects.filter(is_order=False).update(
+        filled_quantity=F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='filled_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            forwards_filled_quantity,
+            migrations.RunPython.noop,
+        ),
+    ]
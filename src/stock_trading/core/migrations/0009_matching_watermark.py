@@ -0,0 +1,38 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_transaction_filled_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchingWatermark',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('last_processed', models.DateTimeField(blank=True, null=True)),
+                ('best_bid', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('best_ask', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+            ],
+            options={
+                'db_table': 'core_matching_watermarks',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', True), ('status', 0)), fields=['stock', 'modified'], name='core_order_modified_idx'),
+        ),
+        migrations.AddField(
+            model_name='matchingwatermark',
+            name='stock',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, to='core.stock'),
+        ),
+    ]
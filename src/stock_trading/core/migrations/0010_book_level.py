@@ -0,0 +1,60 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:34
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+import django.db.models.deletion
+import uuid
+
+
+def forwards_book_levels(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    BookLevel = apps.get_model('core', 'BookLevel')
+
+    # pending orders aggregated by price level
+    levels = Transaction.objects.filter(
+        is_order=True, status=0
+    ).values('stock', 'type', 'price').annotate(
+        total=Sum(F('quantity') - F('filled_quantity')),
+        count=Count('pk')
+    ).filter(total__gt=0).order_by()
+
+    BookLevel.objects.bulk_create([
+        BookLevel(
+            stock_id=level['stock'],
+            type=level['type'],
+            price=level['price'],
+            quantity=level['total'],
+            orders=level['count'])
+        for level in levels.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_matching_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookLevel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('type', models.PositiveSmallIntegerField(choices=[(0, 'Buy'), (1, 'Sell')])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('quantity', models.IntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='book_levels', to='core.stock')),
+            ],
+            options={
+                'db_table': 'core_book_levels',
+                'ordering': ['stock__code', 'type', 'price'],
+                'unique_together': {('stock', 'type', 'price')},
+            },
+        ),
+        migrations.RunPython(
+            forwards_book_levels,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_book_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchingwatermark',
+            name='journal_sequence',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
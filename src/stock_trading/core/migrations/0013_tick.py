@@ -0,0 +1,60 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_ticks(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(apps.get_model('core', 'Tick'))
+        return
+
+    # the primary key of a partitioned table holds the partition key,
+    # ticks outside the day partitions fall into the default partition
+    schema_editor.execute(
+        'CREATE TABLE "core_ticks" ('
+        '"id" bigint GENERATED BY DEFAULT AS IDENTITY, '
+        '"time" timestamp with time zone NOT NULL, '
+        '"price" numeric(12, 2) NOT NULL, '
+        '"quantity" integer NOT NULL CHECK ("quantity" >= 0), '
+        '"stock_id" uuid NOT NULL REFERENCES "core_stocks" ("id") DEFERRABLE INITIALLY DEFERRED, '
+        'PRIMARY KEY ("id", "time")'
+        ') PARTITION BY RANGE ("time")')
+    schema_editor.execute(
+        'CREATE TABLE "core_ticks_default" PARTITION OF "core_ticks" DEFAULT')
+    schema_editor.execute(
+        'CREATE INDEX "core_tick_stock_time_idx" ON "core_ticks" ("stock_id", "time")')
+
+
+def drop_ticks(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('core', 'Tick'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_candle'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Tick',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('time', models.DateTimeField()),
+                        ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                        ('quantity', models.PositiveIntegerField()),
+                        ('stock', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='ticks', to='core.stock')),
+                    ],
+                    options={
+                        'db_table': 'core_ticks',
+                        'ordering': ['time', 'id'],
+                        'indexes': [models.Index(fields=['stock', 'time'], name='core_tick_stock_time_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_ticks, drop_ticks),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:10
+
+import core.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0013_tick'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkOrderJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('file', models.FileField(blank=True, max_length=255, upload_to=core.models.get_bulk_order_job_path)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Completed'), (3, 'Failed')], default=0)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('rows_rejected', models.PositiveIntegerField(default=0)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='bulk_order_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'core_bulk_order_jobs',
+                'ordering': ['-created'],
+                'indexes': [models.Index(condition=models.Q(('status', 0)), fields=['created'], name='core_bulk_job_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_bulk_order_job_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkorderjob',
+            name='rows_duplicated',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
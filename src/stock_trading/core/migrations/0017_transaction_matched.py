@@ -0,0 +1,26 @@
+# Generated by Django 4.2.2 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_bulk_order_job_rows_duplicated'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='core_order_modified_idx',
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='matched',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_order', True), ('matched', False), ('status', 0)), fields=['stock', 'created'], name='core_order_unmatched_idx'),
+        ),
+    ]
@@ -5,8 +5,16 @@ import uuid
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from decimal import Decimal
 
+# storage directory of the bulk order job files
+BULK_ORDER_JOBS_DIR = 'bulk_jobs'
+
+
+def get_bulk_order_job_path(instance, filename):
+    return f"{BULK_ORDER_JOBS_DIR}/{instance.pk}/{filename}"
+
 
 class BaseAbstract(models.Model):
     class Meta:
@@ -39,6 +47,10 @@ class Stock(BaseAbstract):
         max_digits=12,
         decimal_places=2,
         default=Decimal(0.00))
+    # changes of the code and name, checked by the stock references
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False)
 
     def __str__(self):
         return self.code
@@ -66,6 +78,42 @@ class Transaction(BaseAbstract):
     class Meta:
         db_table = 'core_transactions'
         ordering = ['-created']
+        # partial indexes, status 0: PENDING, 1: CLEARED, type 0: BUY, 1: SELL
+        indexes = [
+            # matching, pending bids by price-time priority
+            models.Index(
+                fields=['stock', '-price', 'created'],
+                condition=models.Q(is_order=True, status=0, type=0),
+                name='core_order_bid_book_idx'),
+            # matching, pending asks by price-time priority
+            models.Index(
+                fields=['stock', 'price', 'created'],
+                condition=models.Q(is_order=True, status=0, type=1),
+                name='core_order_ask_book_idx'),
+            # pending orders
+            models.Index(
+                fields=['stock', 'created'],
+                condition=models.Q(is_order=True, status=0),
+                name='core_order_stock_idx'),
+            models.Index(
+                fields=['-created'],
+                condition=models.Q(is_order=True, status=0),
+                name='core_order_created_idx'),
+            models.Index(
+                fields=['user', '-created'],
+                condition=models.Q(is_order=True, status=0),
+                name='core_order_user_idx'),
+            # orders not matched since placed or changed
+            models.Index(
+                fields=['stock', 'created'],
+                condition=models.Q(is_order=True, status=0, matched=False),
+                name='core_order_unmatched_idx'),
+            # trades
+            models.Index(
+                fields=['user', '-created'],
+                condition=models.Q(is_order=False, status=1),
+                name='core_trade_user_idx'),
+        ]
 
     # Fields
     is_order = models.BooleanField(default=True)
@@ -91,6 +139,11 @@ class Transaction(BaseAbstract):
         max_digits=12,
         decimal_places=2,
         default=Decimal(0.00))
+    filled_quantity = models.PositiveIntegerField(
+        default=0)
+    # order matched as an aggressor since placed or changed
+    matched = models.BooleanField(
+        default=False)
 
     trades = models.ManyToManyField(
         'self',
@@ -106,9 +159,7 @@ class Transaction(BaseAbstract):
             self.amount)
 
     def cleared_quantity(self):
-        return self.trades.all().aggregate(
-            models.Sum('quantity', default=0)
-        ).get('quantity__sum')
+        return self.filled_quantity
 
     def remainder_quantity(self):
         return self.quantity - self.cleared_quantity()
@@ -182,3 +233,217 @@ class Portfolio(BaseAbstract):
 
     def get_market_value(self):
         return self.total_share * self.stock.price
+
+
+class MatchingWatermark(BaseAbstract):
+    class Meta:
+        db_table = 'core_matching_watermarks'
+
+    # fields
+    stock = models.OneToOneField(
+        'Stock',
+        on_delete=models.DO_NOTHING)
+    last_processed = models.DateTimeField(
+        null=True,
+        blank=True)
+    best_bid = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True)
+    best_ask = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True)
+    journal_sequence = models.BigIntegerField(
+        default=0)
+
+    def __str__(self):
+        return f"{self.stock}: {self.last_processed} | {self.best_bid} | {self.best_ask}"
+
+
+class BookLevel(BaseAbstract):
+    class Meta:
+        db_table = 'core_book_levels'
+        unique_together = (('stock', 'type', 'price'),)
+        ordering = ['stock__code', 'type', 'price']
+
+    # fields
+    stock = models.ForeignKey(
+        'Stock',
+        on_delete=models.DO_NOTHING,
+        related_name='book_levels')
+    type = models.PositiveSmallIntegerField(
+        choices=Transaction.Type.CHOICES)
+    price = models.DecimalField(
+        max_digits=12,
+        decimal_places=2)
+    quantity = models.IntegerField(
+        default=0)
+    orders = models.IntegerField(
+        default=0)
+
+    def __str__(self):
+        return f"{self.stock} {self.get_type_display()} {self.price}: {self.quantity} | {self.orders}"
+
+
+class Candle(BaseAbstract):
+    # Candle Interval
+    class Interval:
+        MINUTE = '1m'
+        FIVE_MINUTES = '5m'
+        HOUR = '1h'
+        DAY = '1d'
+
+        CHOICES = (
+            (MINUTE, "1 Minute"),
+            (FIVE_MINUTES, "5 Minutes"),
+            (HOUR, "1 Hour"),
+            (DAY, "1 Day"))
+
+    class Meta:
+        db_table = 'core_candles'
+        unique_together = (('stock', 'interval', 'start'),)
+        ordering = ['stock__code', 'interval', 'start']
+
+    # fields
+    stock = models.ForeignKey(
+        'Stock',
+        on_delete=models.DO_NOTHING,
+        related_name='candles')
+    interval = models.CharField(
+        max_length=2,
+        choices=Interval.CHOICES)
+    start = models.DateTimeField()
+    open = models.DecimalField(
+        max_digits=12,
+        decimal_places=2)
+    high = models.DecimalField(
+        max_digits=12,
+        decimal_places=2)
+    low = models.DecimalField(
+        max_digits=12,
+        decimal_places=2)
+    close = models.DecimalField(
+        max_digits=12,
+        decimal_places=2)
+    volume = models.PositiveBigIntegerField(
+        default=0)
+    trades = models.PositiveIntegerField(
+        default=0)
+
+    def __str__(self):
+        return f"{self.stock} {self.interval} {self.start}: {self.open} | {self.high} | {self.low} | {self.close} | {self.volume}"
+
+
+class Tick(models.Model):
+    """
+    Tick is an append-only trade price of a stock, without `created`
+    and `modified`. On PostgreSQL the table is range partitioned by day
+    on `time` and its primary key is (`id`, `time`).
+    """
+    class Meta:
+        db_table = 'core_ticks'
+        ordering = ['time', 'id']
+        indexes = [
+            models.Index(
+                fields=['stock', 'time'],
+                name='core_tick_stock_time_idx'),
+        ]
+
+    # fields, the id keeps the order of the ticks of the same time
+    id = models.BigAutoField(
+        primary_key=True)
+    stock = models.ForeignKey(
+        'Stock',
+        on_delete=models.DO_NOTHING,
+        related_name='ticks')
+    time = models.DateTimeField()
+    price = models.DecimalField(
+        max_digits=12,
+        decimal_places=2)
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.stock} {self.time}: {self.quantity} @ {self.price}"
+
+
+class BulkOrderJob(BaseAbstract):
+    # Job Status
+    class Status:
+        PENDING = 0
+        RUNNING = 1
+        COMPLETED = 2
+        FAILED = 3
+
+        CHOICES = (
+            (PENDING, "Pending"),
+            (RUNNING, "Running"),
+            (COMPLETED, "Completed"),
+            (FAILED, "Failed"))
+
+    class Meta:
+        db_table = 'core_bulk_order_jobs'
+        # a file is processed once per user, by its content hash
+        unique_together = (('user', 'checksum'),)
+        ordering = ['-created']
+        # partial index, status 0: PENDING
+        indexes = [
+            models.Index(
+                fields=['created'],
+                condition=models.Q(status=0),
+                name='core_bulk_job_pending_idx'),
+        ]
+
+    # fields
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        related_name='bulk_order_jobs')
+    filename = models.CharField(
+        max_length=255)
+    file = models.FileField(
+        upload_to=get_bulk_order_job_path,
+        max_length=255,
+        blank=True)
+    checksum = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True)
+    status = models.PositiveSmallIntegerField(
+        default=Status.PENDING,
+        choices=Status.CHOICES)
+    rows_processed = models.PositiveIntegerField(
+        default=0)
+    rows_rejected = models.PositiveIntegerField(
+        default=0)
+    # lines of orders already inserted by a previous ingest of the file
+    rows_duplicated = models.PositiveIntegerField(
+        default=0)
+    started = models.DateTimeField(
+        null=True,
+        blank=True)
+    finished = models.DateTimeField(
+        null=True,
+        blank=True)
+    error = models.TextField(
+        blank=True,
+        default='')
+
+    def __str__(self):
+        return f"{self.user} {self.filename}: {self.get_status_display()} | {self.rows_processed} | {self.rows_rejected}"
+
+    def get_orders_created(self):
+        return self.rows_processed - self.rows_rejected - self.rows_duplicated
+
+    def get_throughput(self):
+        """
+        Get the rows processed per second since the job started.
+
+        :return float: None when the job has not started
+        """
+        if self.started is None:
+            return None
+        seconds = ((self.finished or timezone.now()) - self.started).total_seconds()
+        return round(self.rows_processed / seconds, 2) if seconds > 0 else None
@@ -0,0 +1,36 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    EventStreamRenderer accepts the server-sent events clients,
+    the stream itself is written by the view, error details are rendered as JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    NDJSONRenderer accepts the newline delimited JSON clients, the lines
+    are streamed by the view, error details are rendered as JSON.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode() + b'\n'
@@ -1,28 +1,82 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-15
 
+import uuid
+
 from rest_framework import serializers
 
 from core.models import *
-from core.services import TransactionService
+from core.services import TransactionService, BookLevelService, StockService
 
 
 class StockSerializer(serializers.ModelSerializer):
     class Meta:
         model = Stock
-        fields = '__all__'
+        exclude = ('version',)
+
+
+class BookLevelSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BookLevel
+        fields = ('price', 'quantity', 'orders')
+
+
+class StockBookSerializer(serializers.ModelSerializer):
+    bids = serializers.SerializerMethodField()
+    asks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Stock
+        fields = ('id', 'code', 'price', 'bids', 'asks')
+
+    def get_levels(self, obj, type):
+        levels = BookLevelService.get_book_levels(
+            obj, type, self.context.get('depth'))
+        return BookLevelSerializer(levels, many=True).data
+
+    def get_bids(self, obj):
+        return self.get_levels(obj, Transaction.Type.BUY)
+
+    def get_asks(self, obj):
+        return self.get_levels(obj, Transaction.Type.SELL)
+
+
+class CandleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Candle
+        fields = ('start', 'open', 'high', 'low', 'close', 'volume', 'trades')
+
+
+class StockReferenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Stock
+        fields = ('id', 'code', 'name')
 
 
 class StockRelatedField(serializers.RelatedField):
+    default_error_messages = {
+        'does_not_exist': 'Invalid pk "{pk_value}" - object does not exist.',
+        'incorrect_type': 'Incorrect type. Expected pk value, received {data_type}.',
+    }
+
     def get_queryset(self):
         return Stock.objects.all()
 
+    def use_pk_only_optimization(self):
+        # rendered from the stock references, without loading the stock of each row
+        return True
+
     def to_representation(self, value):
         # TODO: fix render to browser
-        return StockSerializer(value).data
+        return StockReferenceSerializer(StockService.get_stock(pk=value.pk)).data
 
     def to_internal_value(self, data):
-        stock = Stock.objects.get(pk=data)
+        try:
+            stock = StockService.get_stock(pk=uuid.UUID(str(data)))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if stock is None:
+            self.fail('does_not_exist', pk_value=data)
         return stock
 
 
@@ -31,11 +85,13 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = '__all__'
+        # matched is the state of the order matcher
+        exclude = ('matched',)
         read_only_fields = [
             'user',
             'status',
             'amount',
+            'filled_quantity',
         ]
 
     def create(self, validated_data):
@@ -50,10 +106,39 @@ class OrderSerializer(serializers.ModelSerializer):
 
 class OrderBulkSerializer(serializers.Serializer):
     file = serializers.FileField()
+    to_job = serializers.BooleanField(default=False)
+    # alias of `to_job`, stored files are processed as jobs
     to_stored = serializers.BooleanField(default=False)
 
     class Meta:
-        fields = ('file', 'to_stored')
+        fields = ('file', 'to_job', 'to_stored')
+
+
+class OrderBulkSummarySerializer(serializers.Serializer):
+    filename = serializers.CharField()
+    rows_processed = serializers.IntegerField()
+    rows_rejected = serializers.IntegerField()
+    # lines of orders already inserted by a previous upload of the file
+    rows_duplicated = serializers.IntegerField()
+    orders_created = serializers.IntegerField()
+    # synchronous uploads are not processed as a job
+    job = serializers.UUIDField(default=None)
+
+    class Meta:
+        fields = ('filename', 'rows_processed', 'rows_rejected', 'rows_duplicated', 'orders_created', 'job')
+
+
+class BulkOrderJobSerializer(serializers.ModelSerializer):
+    orders_created = serializers.IntegerField(
+        source='get_orders_created',
+        read_only=True)
+    throughput = serializers.FloatField(
+        source='get_throughput',
+        read_only=True)
+
+    class Meta:
+        model = BulkOrderJob
+        exclude = ('file',)
 
 
 class TradeSerializer(serializers.ModelSerializer):
@@ -61,11 +146,13 @@ class TradeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Trade
-        fields = '__all__'
+        # matched is the state of the order matcher
+        exclude = ('matched',)
         read_only_fields = [
             'user',
             'status',
             'amount',
+            'filled_quantity',
         ]
 
 
@@ -1,23 +1,104 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-16
 
+import io
 import logging
+import multiprocessing
+import os
+import numpy as np
 import pandas as pd
 import uuid
 import hashlib
-from decimal import Decimal
+import json
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
+from itertools import repeat
+from time import monotonic
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.storage import default_storage
-from django.db.models import Q, Sum
+from django.db import IntegrityError, connection, connections
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.transaction import atomic, on_commit
+from django.utils import timezone
+from psycopg2.extras import execute_values
 
+from core.engine import BookOrder, OrderBook, match_orders, run_auction
+from core.events import ORDER_CHANNEL, TRADE_CHANNEL, BULK_ORDER_CHANNEL, notify
+from core.locks import advisory_lock
 from core.models import (
     Stock,
     Portfolio,
-    Transaction
+    Transaction,
+    Trade,
+    MatchingWatermark,
+    BookLevel,
+    Candle,
+    Tick,
+    BulkOrderJob,
+    BULK_ORDER_JOBS_DIR
 )
 
 logger = logging.getLogger(__name__)
 
+User = get_user_model()
+
+CENTS = Decimal('0.01')
+
+# advisory lock namespace of the stock matching
+MATCHING_LOCK = 'matching'
+
+# counter orders locked per query while matching an order
+COUNTER_ORDERS_BATCH = 20
+
+# trade prints per notification, within the PostgreSQL payload limit
+STREAM_PRINTS = 200
+
+# candle intervals, aligned to the epoch in UTC
+CANDLE_INTERVALS = {
+    Candle.Interval.MINUTE: timedelta(minutes=1),
+    Candle.Interval.FIVE_MINUTES: timedelta(minutes=5),
+    Candle.Interval.HOUR: timedelta(hours=1),
+    Candle.Interval.DAY: timedelta(days=1),
+}
+# coarser candles rolled up from the finer candles, finest first
+CANDLE_ROLLUPS = (
+    (Candle.Interval.MINUTE, Candle.Interval.FIVE_MINUTES),
+    (Candle.Interval.FIVE_MINUTES, Candle.Interval.HOUR),
+    (Candle.Interval.HOUR, Candle.Interval.DAY),
+)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# day partitions of the ticks, on PostgreSQL
+TICK_PARTITION = 'core_ticks_p{:%Y%m%d}'
+
+# book levels upserted per query, within the SQLite variables limit
+BOOK_LEVELS_BATCH = 1000
+
+# lines of the bulk order file read and committed at a time
+BULK_ORDERS_CHUNK = 10000
+# orders inserted per query of the bulk order file
+BULK_ORDERS_BATCH = 1000
+# bulk order bounds of the quantity and amount fields, amount in cents
+BULK_ORDER_MAX_QUANTITY = 2147483647
+BULK_ORDER_MAX_CENTS = 10 ** 12
+
+# columns of the bulk order files
+BULK_ORDER_COLUMNS = ["TYPE", "STOCK", "QUANTITY", "PRICE"]
+
+# advisory lock namespace of the stored bulk order files
+BULK_ORDER_FILE_LOCK = 'bulk_order_file'
+# running bulk order jobs without progress within the timeout are claimed again
+BULK_ORDER_JOB_TIMEOUT = timedelta(minutes=10)
+
+# version of the stock metadata shared by the processes, bumped on stock save and delete
+STOCK_VERSION_KEY = 'core:stock:version'
+
 
 def get_type_by_name(name: str):
     types = dict([i[::-1] for i in Transaction.Type.CHOICES])
@@ -29,11 +110,126 @@ def generate_uuid(val: str):
     return uuid.UUID(hex=hex_string)
 
 
+def get_checksum(file):
+    """
+    Get the SHA-256 content hash of the file, read in chunks. The file is
+    rewound to the start.
+
+    :param file:
+    :return str:
+    """
+    sha = hashlib.sha256()
+    for chunk in file.chunks():
+        sha.update(chunk)
+    file.seek(0)
+    return sha.hexdigest()
+
+
+class BulkOrderSummary:
+    """
+    BulkOrderSummary accumulates the summary of the rows of a bulk order
+    file, chunk by chunk. The rows neither created nor already inserted
+    are rejected.
+    """
+
+    def __init__(
+            self,
+            filename
+    ):
+        self.filename = filename
+        self.rows_processed = 0
+        self.rows_duplicated = 0
+        self.orders_created = 0
+
+    @property
+    def rows_rejected(self):
+        return self.rows_processed - self.rows_duplicated - self.orders_created
+
+    def add(
+            self,
+            rows,
+            pks,
+            existing
+    ):
+        """
+        Add the chunk to the summary.
+
+        :param rows: lines of the chunk
+        :param pks: inserted order ids
+        :param existing: order ids of the lines already inserted
+        :return dict: rows processed, rejected and duplicated, and the orders created of the chunk
+        """
+        chunk = {
+            'rows_processed': rows,
+            'rows_rejected': rows - len(existing) - len(pks),
+            'rows_duplicated': len(existing),
+            'orders_created': len(pks),
+        }
+        self.rows_processed += rows
+        self.rows_duplicated += len(existing)
+        self.orders_created += len(pks)
+        return chunk
+
+    def as_dict(self):
+        return {
+            'filename': self.filename,
+            'rows_processed': self.rows_processed,
+            'rows_rejected': self.rows_rejected,
+            'rows_duplicated': self.rows_duplicated,
+            'orders_created': self.orders_created,
+        }
+
+
 class TransactionService:
     """
     TransactionService process the business logic regarding the transaction.
     """
 
+    # Matching Engine
+    class Engine:
+        QUERY = 'query'
+        BOOK = 'book'
+        AUCTION = 'auction'
+
+        CHOICES = (
+            (QUERY, "Query"),
+            (BOOK, "Order Book"),
+            (AUCTION, "Call Auction"))
+
+    # Bulk Order Ingest
+    class Ingest:
+        ORM = 'orm'
+        COPY = 'copy'
+
+        CHOICES = (
+            (ORM, "Bulk Create"),
+            (COPY, "Copy"))
+
+    # Bulk Order File Format
+    class Format:
+        CSV = 'csv'
+        PARQUET = 'parquet'
+        ARROW = 'arrow'
+
+        CHOICES = (
+            (CSV, "CSV"),
+            (PARQUET, "Parquet"),
+            (ARROW, "Arrow IPC"))
+
+        # file extensions and leading bytes of the formats
+        EXTENSIONS = {
+            '.csv': CSV,
+            '.parquet': PARQUET,
+            '.pq': PARQUET,
+            '.arrow': ARROW,
+            '.feather': ARROW,
+            '.ipc': ARROW}
+        SIGNATURES = (
+            (b'PAR1', PARQUET),
+            (b'ARROW1', ARROW),
+            # continuation marker of the Arrow IPC stream
+            (b'\xff\xff\xff\xff', ARROW))
+
     @staticmethod
     def create_transaction(
             user,
@@ -63,8 +259,6 @@ class TransactionService:
             type=type,
             status=status
         )
-
-        transaction.save()
         return transaction
 
     @staticmethod
@@ -73,13 +267,14 @@ class TransactionService:
             commit=True
     ):
         """
-        Compute and save transaction.
+        Compute and save transaction. A saved order is matched again.
 
         :param transaction:
         :param commit:
         :return:
         """
         transaction.amount = transaction.quantity * transaction.price
+        transaction.matched = False
         if commit:
             transaction.save()
         return transaction
@@ -87,34 +282,114 @@ class TransactionService:
     @staticmethod
     def match_order_transactions(
             order_1: Transaction,
-            order_2: Transaction,
-            clear_both=False
+            order_2: Transaction
     ):
         """
         Match order transaction for both buy and sell.
 
         :param order_1:
         :param order_2:
-        :param clear_both:
-        :return:
+        :return Fill:
+        """
+        fill = match_orders(
+            BookOrder.from_transaction(order_1),
+            BookOrder.from_transaction(order_2))
+        TransactionService.persist_fills(order_1.stock, [fill])
+        return fill
+
+    @staticmethod
+    def persist_fills(
+            stock: Stock,
+            fills,
+            update_price=True,
+            locked=False
+    ):
+        """
+        Persist the fills of a matching pass in a single database transaction.
+
+        Each fill creates a cleared trade for both orders, links the trades
+        to their orders, adds the filled quantity to the orders, clears the
+        filled orders and, unless the matching pass sets it at its end,
+        sets the stock price to the last fill price.
+
+        Unless the caller holds the matching lock of the stock, the stock
+        row is locked to serialize the stock price and portfolio updates.
+
+        :param stock:
+        :param fills:
+        :param update_price:
+        :param locked: whether the matching lock of the stock is held
+        :return list: trades
         """
-        # trade transaction for order_1
-        trade = TransactionService.clone_transaction(order_1)
-        trade.is_order = False
-        trade.quantity = order_2.remainder_quantity()
-        trade.price = order_2.price
-        TransactionService.clear_transaction(trade)
-        order_1.trades.add(trade)
-        if clear_both:
-            TransactionService.clear_transaction(order_1)
-
-        # trade transaction for order_2
-        trade = TransactionService.clone_transaction(order_2)
-        trade.is_order = False
-        trade.quantity = order_2.remainder_quantity()
-        TransactionService.clear_transaction(trade)
-        order_2.trades.add(trade)
-        TransactionService.clear_transaction(order_2)
+        if not fills:
+            return []
+
+        now = timezone.now()
+        trades = []
+        links = []
+        orders = {}
+        for fill in fills:
+            if fill.resting_cleared:
+                pair = (fill.aggressor, fill.resting)
+            else:
+                # resting order still have remainder
+                pair = (fill.resting, fill.aggressor)
+
+            for order in pair:
+                trade = Transaction(
+                    is_order=False,
+                    type=order.type,
+                    status=Transaction.Status.CLEARED,
+                    stock_id=stock.pk,
+                    user_id=order.user_id,
+                    quantity=fill.quantity,
+                    filled_quantity=fill.quantity,
+                    price=fill.price,
+                    amount=fill.quantity * fill.price)
+                trades.append(trade)
+                links.append((order.pk, trade.pk))
+
+                filled = orders.setdefault(order.pk, [order, 0])
+                filled[1] += fill.quantity
+
+        updates = [
+            Transaction(
+                pk=pk,
+                filled_quantity=F('filled_quantity') + quantity,
+                status=Transaction.Status.PENDING if order.remaining
+                else Transaction.Status.CLEARED,
+                modified=now)
+            for pk, (order, quantity) in orders.items()]
+
+        # filled quantity and cleared orders leave the book levels
+        levels = {}
+        for order, quantity in orders.values():
+            level = levels.setdefault((stock.pk, order.type, order.price), [0, 0])
+            level[0] -= quantity
+            level[1] -= 0 if order.remaining else 1
+
+        Through = Transaction.trades.through
+        with atomic():
+            # the matching lock already serializes the passes of the stock,
+            # the journal persister and single matches do not hold it
+            if not locked:
+                Stock.objects.select_for_update().only('pk').get(pk=stock.pk)
+            Transaction.objects.bulk_create(trades)
+            Through.objects.bulk_create(
+                [Through(from_transaction_id=o, to_transaction_id=t) for o, t in links] +
+                [Through(from_transaction_id=t, to_transaction_id=o) for o, t in links])
+            Transaction.objects.bulk_update(
+                updates, ['filled_quantity', 'status', 'modified'])
+            if update_price:
+                StockService.update_prices({stock.pk: fills[-1].price}, now)
+            PortfolioService.update_portfolios(trades)
+            BookLevelService.update_book_levels(levels)
+            CandleService.update_candles(stock, fills, now)
+            TickService.append_ticks(stock, fills, now)
+            StockService.notify_trades(stock, fills, now)
+
+        logger.info(f"persist_fills: {stock} {len(fills)} fills")
+        return trades
 
     @staticmethod
     def clone_transaction(
@@ -147,89 +422,474 @@ class TransactionService:
         :param commit:
         :return:
         """
+        # the book level of the order before clearing, moved by the save signals
+        transaction._book_level = BookLevelService.get_order_level(transaction)
         transaction.status = Transaction.Status.CLEARED
         if commit:
             transaction.save()
 
-            # update stock
-            try:
-                stock = Stock.objects.get(pk=transaction.stock.pk)
-                stock.price = transaction.price
-                stock.save(update_fields=['price', 'modified'])
-            except Stock.DoesNotExist as e:
-                logger.info(f"ERROR clear_transaction: {e}")
-                print(f"ERROR clear_transaction: {e}")
+            StockService.update_prices({transaction.stock_id: transaction.price})
 
             logger.info(f"clear_transaction: {transaction}")
             print(f"clear_transaction: {transaction}")
         return transaction
 
     @staticmethod
-    def store_bulk_order_file(
+    def bulk_orders(
             user,
             filename,
             file,
+            chunksize=BULK_ORDERS_CHUNK,
+            ingest=Ingest.COPY,
+            checksum=None
     ):
         """
-        Stored the bulk order file.
+        Process bulk orders.
 
         :param user:
         :param filename:
         :param file:
-        :return:
+        :param chunksize: lines read and committed at a time, None to read the whole file
+        :param ingest:
+        :param checksum: content hash of the file, to ingest the file once
+        :return dict: summary of the rows processed, rejected and duplicated, and the orders created
         """
-        # folder = generate_uuid(f"{user.pk}_{user.username}")
-        file_path = f"{user.pk}/{filename}"
-        return default_storage.save(file_path, file)
+        summary = BulkOrderSummary(filename)
+        for rows, pks, existing in TransactionService.stream_bulk_orders(
+                user, filename, file, chunksize, ingest, checksum):
+            summary.add(rows, pks, existing)
+        return summary.as_dict()
 
     @staticmethod
-    def bulk_orders(
+    def stream_bulk_orders(
             user,
             filename,
             file,
+            chunksize=BULK_ORDERS_CHUNK,
+            ingest=Ingest.COPY,
+            checksum=None
     ):
         """
-        Process bulk orders.
+        Process the bulk order file in chunks of lines, each chunk committed
+        on its own, so the memory is bounded by the chunk size.
+
+        The chunks committed before a line fails to be read are kept.
 
         :param user:
         :param filename:
         :param file:
-        :return:
+        :param chunksize: lines read and committed at a time, None to read the whole file
+        :param ingest:
+        :param checksum: content hash of the file, to ingest the file once
+        :return: generator of the lines, the inserted order ids and the order ids
+            of the lines already inserted of each chunk
         """
         logger.info(f"START bulk_orders: {user.username} - {filename}")
 
-        df = pd.read_csv(
+        count = 0
+        try:
+            format = TransactionService.get_bulk_format(filename, file)
+            for df in TransactionService.read_bulk_orders(file, chunksize, format=format):
+                pks, existing = TransactionService.create_bulk_orders(user, df, ingest, checksum)
+                count += len(pks)
+                yield len(df), pks, existing
+        except (ValueError, pd.errors.ParserError) as ex:
+            logger.error(f"ERROR: Failed to read the bulk order file {filename}. {ex}")
+
+        logger.info(f"END bulk_orders: {user.username} - {filename}, {count} orders")
+
+    @staticmethod
+    def get_bulk_format(
+            filename,
+            file
+    ):
+        """
+        Get the format of the bulk order file by its extension, or its
+        leading bytes. Files of other extensions are read as CSV.
+
+        :param filename:
+        :param file: binary file, rewound to the start
+        :return str: TransactionService.Format
+        """
+        formats = TransactionService.Format
+        extension = os.path.splitext(filename)[1].lower()
+        if extension in formats.EXTENSIONS:
+            return formats.EXTENSIONS[extension]
+
+        head = file.read(8)
+        file.seek(0)
+        for signature, format in formats.SIGNATURES:
+            if head.startswith(signature):
+                return format
+        return formats.CSV
+
+    @staticmethod
+    def read_bulk_orders(
+            file,
+            chunksize=BULK_ORDERS_CHUNK,
+            skip=0,
+            format=Format.CSV
+    ):
+        """
+        Read the bulk order file in chunks of lines.
+
+        :param file:
+        :param chunksize: lines read at a time, None to read the whole file
+        :param skip: lines skipped after the header
+        :param format: TransactionService.Format
+        :return: generator of DataFrame of the TYPE, STOCK, QUANTITY and PRICE lines,
+            indexed by the line after the header
+        """
+        if format != TransactionService.Format.CSV:
+            yield from TransactionService.read_bulk_batches(file, chunksize, skip, format)
+            return
+
+        reader = pd.read_csv(
             file,
-            usecols=["TYPE", "STOCK", "QUANTITY", "PRICE"],
+            usecols=BULK_ORDER_COLUMNS,
+            dtype={"TYPE": str, "STOCK": str},
+            skiprows=range(1, skip + 1) if skip else None,
+            chunksize=chunksize,
         )
+        for df in [reader] if not chunksize else reader:
+            # skipped lines are counted in the index
+            df.index += skip
+            yield df
+
+    @staticmethod
+    def read_bulk_batches(
+            file,
+            chunksize=BULK_ORDERS_CHUNK,
+            skip=0,
+            format=Format.PARQUET
+    ):
+        """
+        Read the Parquet or Arrow IPC bulk order file in chunks of rows.
+
+        The record batches of the file are sliced and regrouped by the
+        chunk size without copying, the typed columns are converted to
+        the DataFrame without text parsing.
 
-        created_orders = set()
+        :param file:
+        :param chunksize: rows read at a time, None to read the whole file
+        :param skip: rows skipped from the start
+        :param format: TransactionService.Format
+        :return: generator of DataFrame of the TYPE, STOCK, QUANTITY and PRICE rows,
+            indexed by the row
+        """
         try:
-            for l in df.itertuples():
-                try:
-                    stock = Stock.objects.get(code=l.STOCK)
-                    order = TransactionService.create_transaction(
-                        user=user,
-                        stock=stock,
-                        type=get_type_by_name(l.TYPE),
-                        quantity=l.QUANTITY,
-                        price=l.PRICE
-                    )
-                    created_orders.add(order.pk)
-                except Stock.DoesNotExist as e:
-                    logger.error(f"ERROR: Stock code {l.STOCK} not found, skipping. {e}")
-        except Exception as ex:
-            logger.error(f"ERROR: Failed to read line in CSV file. {ex}")
-        return Transaction.objects.filter(pk__in=created_orders)
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError(f"Reading {format} bulk order files requires pyarrow.")
+
+        if format == TransactionService.Format.PARQUET:
+            reader = pq.ParquetFile(file)
+            schema = reader.schema_arrow
+        elif file.read(6) == b'ARROW1':
+            file.seek(0)
+            reader = pa.ipc.open_file(file)
+            schema = reader.schema
+        else:
+            file.seek(0)
+            reader = pa.ipc.open_stream(file)
+            schema = reader.schema
+        missing = [c for c in BULK_ORDER_COLUMNS if c not in schema.names]
+        if missing:
+            raise ValueError(f"Bulk order columns not found: {', '.join(missing)}")
+
+        if format == TransactionService.Format.PARQUET:
+            batches = reader.iter_batches(
+                batch_size=chunksize or BULK_ORDERS_CHUNK, columns=BULK_ORDER_COLUMNS)
+        elif isinstance(reader, pa.ipc.RecordBatchFileReader):
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            batches = reader
+
+        def to_frame(slices, start):
+            table = pa.Table.from_batches(slices).select(BULK_ORDER_COLUMNS)
+            # decimal columns are read as floats instead of Decimal objects, rounded to cents
+            for i, field in enumerate(table.schema):
+                if pa.types.is_decimal(field.type):
+                    table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+            df = table.to_pandas()
+            # dictionary encoded columns are read as categories
+            for column in ("TYPE", "STOCK"):
+                if isinstance(df[column].dtype, pd.CategoricalDtype):
+                    df[column] = df[column].astype(object)
+            df.index = pd.RangeIndex(start, start + len(df))
+            return df
+
+        slices, size, start = [], 0, skip
+        for batch in batches:
+            if skip:
+                skipped = min(skip, batch.num_rows)
+                batch = batch.slice(skipped)
+                skip -= skipped
+            while batch.num_rows:
+                rows = min(chunksize - size, batch.num_rows) if chunksize else batch.num_rows
+                slices.append(batch.slice(0, rows))
+                batch = batch.slice(rows)
+                size += rows
+                if size == chunksize:
+                    yield to_frame(slices, start)
+                    slices, size, start = [], 0, start + size
+        if slices:
+            yield to_frame(slices, start)
+
+    @staticmethod
+    def create_bulk_orders(
+            user,
+            df,
+            ingest=Ingest.COPY,
+            checksum=None
+    ):
+        """
+        Validate the bulk order lines and insert the orders in one database transaction.
+
+        Invalid lines and unknown stocks are skipped. The orders are copied
+        on PostgreSQL, inserted with `bulk_create` otherwise.
+
+        With the checksum of the file, the order ids are generated from the
+        user, the checksum and the line, and the orders of lines already
+        inserted are skipped, so the same file is ingested once.
+
+        :param user:
+        :param df: DataFrame of the TYPE, STOCK, QUANTITY and PRICE lines
+        :param ingest:
+        :param checksum: content hash of the file
+        :return tuple: inserted order ids, and the order ids of the lines already inserted
+        """
+        types = dict([i[::-1] for i in Transaction.Type.CHOICES])
+        stocks = {
+            code: stock.pk
+            for code, stock in StockService.get_stocks(df["STOCK"].dropna().unique()).items()}
+
+        df["type"] = df["TYPE"].map(types)
+        df["stock_id"] = df["STOCK"].map(stocks)
+        df["quantity"] = pd.to_numeric(df["QUANTITY"], errors="coerce")
+        df["cents"] = pd.to_numeric(df["PRICE"], errors="coerce").mul(100).round()
+        df["amount"] = df["quantity"] * df["cents"]
+
+        valid = df["type"].notna() & df["stock_id"].notna() \
+            & df["quantity"].between(1, BULK_ORDER_MAX_QUANTITY) & (df["quantity"] % 1 == 0) \
+            & (df["cents"] > 0) & (df["amount"] < BULK_ORDER_MAX_CENTS)
+        for l in df[~valid].itertuples():
+            if pd.isna(l.stock_id):
+                logger.error(f"ERROR: Stock code {l.STOCK} not found, skipping.")
+            else:
+                logger.error(f"ERROR: Invalid order on line {l.Index + 2}, skipping.")
+
+        df = df[valid].astype({"type": "int64", "quantity": "int64", "cents": "int64", "amount": "int64"})
+        if checksum is not None:
+            df["id"] = [generate_uuid(f"{user.pk}:{checksum}:{line}") for line in df.index.tolist()]
+
+        # bulk inserts skip the save signals, the book levels and the
+        # matcher notification are updated once for the inserted lines
+        with atomic():
+            if ingest == TransactionService.Ingest.COPY and connection.vendor == 'postgresql':
+                pks = TransactionService.copy_orders(user, df)
+            else:
+                pks = TransactionService.insert_orders(user, df)
+            existing = []
+            inserted = df
+            if checksum is not None and len(pks) < len(df):
+                logger.info(f"bulk_orders: {len(df) - len(pks)} orders already inserted, skipping.")
+                found = df["id"].isin(pks)
+                existing = df.loc[~found, "id"].tolist()
+                inserted = df[found]
+            BookLevelService.update_book_levels(TransactionService.get_bulk_levels(inserted))
+            TransactionService.notify_orders(inserted["STOCK"].unique())
+        return pks, existing
+
+    @staticmethod
+    def insert_orders(
+            user,
+            df
+    ):
+        """
+        Insert the bulk orders with `bulk_create`. Orders of the given ids
+        already inserted are skipped.
+
+        On PostgreSQL the orders of the given ids are inserted with
+        `ON CONFLICT DO NOTHING RETURNING id`, so the orders inserted by a
+        concurrent ingest of the same lines are not returned.
+
+        :param user:
+        :param df: DataFrame of the stock_id, type, quantity, cents, amount and optionally id of the orders
+        :return list: inserted order ids
+        """
+        deterministic = "id" in df
+        returning = deterministic and connection.vendor == 'postgresql'
+        if deterministic and not returning:
+            existing = set()
+            pks = df["id"].tolist()
+            for i in range(0, len(pks), BULK_ORDERS_BATCH):
+                existing.update(Transaction.objects.filter(
+                    pk__in=pks[i:i + BULK_ORDERS_BATCH]).values_list('pk', flat=True))
+            df = df[~df["id"].isin(existing)]
+
+        orders = [
+            Transaction(
+                user=user,
+                stock_id=stock_id,
+                type=type,
+                quantity=quantity,
+                price=Decimal(cents).scaleb(-2),
+                amount=Decimal(amount).scaleb(-2))
+            for stock_id, type, quantity, cents, amount in zip(
+                df["stock_id"], df["type"].tolist(), df["quantity"].tolist(),
+                df["cents"].tolist(), df["amount"].tolist())]
+        if deterministic:
+            for order, pk in zip(orders, df["id"].tolist()):
+                order.pk = pk
+        if returning:
+            return TransactionService.insert_returning(orders)
+        # concurrent ingests of the same lines are ignored
+        Transaction.objects.bulk_create(orders, batch_size=BULK_ORDERS_BATCH, ignore_conflicts=deterministic)
+        return [o.pk for o in orders]
+
+    @staticmethod
+    def insert_returning(
+            orders
+    ):
+        """
+        Insert the orders of the given ids with `ON CONFLICT DO NOTHING
+        RETURNING id`, the fields are prepared as `bulk_create` does.
+
+        :param orders: unsaved transactions with their ids set
+        :return list: inserted order ids
+        """
+        if not orders:
+            return []
+
+        fields = Transaction._meta.concrete_fields
+        rows = [
+            tuple(f.get_db_prep_save(f.pre_save(o, True), connection) for f in fields)
+            for o in orders]
+        table = Transaction._meta.db_table
+        columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+        with connection.cursor() as cursor:
+            inserted = execute_values(
+                cursor,
+                f"INSERT INTO {table} ({columns}) VALUES %s ON CONFLICT (id) DO NOTHING RETURNING id",
+                rows, page_size=BULK_ORDERS_BATCH, fetch=True)
+        return [row[0] for row in inserted]
+
+    @staticmethod
+    def get_bulk_levels(
+            df
+    ):
+        """
+        Aggregate the book level deltas of the bulk orders.
+
+        :param df: DataFrame of the stock_id, type, quantity and cents of the orders
+        :return dict: (stock_id, type, price) to (quantity, orders)
+        """
+        grouped = df.groupby(["stock_id", "type", "cents"])["quantity"].agg(["sum", "count"])
+        return {
+            (stock_id, int(type), Decimal(int(cents)).scaleb(-2)): (int(quantity), int(orders))
+            for (stock_id, type, cents), quantity, orders in zip(
+                grouped.index, grouped["sum"], grouped["count"])}
+
+    @staticmethod
+    def copy_orders(
+            user,
+            df
+    ):
+        """
+        Copy the bulk orders into the transactions table with `COPY FROM STDIN`,
+        the ids, unless given, and timestamps are generated here. The orders
+        are created a microsecond apart, in the order of the lines.
+
+        Orders of the given ids are copied into a temporary table and inserted
+        with `ON CONFLICT DO NOTHING`, the orders already inserted are skipped.
+
+        :param user:
+        :param df: DataFrame of the stock_id, type, quantity, cents, amount and optionally id of the orders
+        :return list: inserted order ids
+        """
+        count = len(df)
+        if not count:
+            return []
+
+        if "id" in df:
+            ids = df["id"].tolist()
+        else:
+            ids = os.urandom(16 * count).hex()
+            ids = [uuid.UUID(hex=ids[i:i + 32], version=4) for i in range(0, 32 * count, 32)]
+        created = pd.Series(pd.Timestamp(timezone.now()) + pd.to_timedelta(np.arange(count), unit="us"))
+
+        def decimal(cents):
+            return (cents // 100).astype(str) + "." + (cents % 100).astype(str).str.zfill(2)
+
+        rows = pd.DataFrame({
+            "id": ids,
+            "created": created,
+            "modified": created,
+            "is_order": "t",
+            "type": df["type"].to_numpy(),
+            "status": Transaction.Status.PENDING,
+            "stock_id": df["stock_id"].to_numpy(),
+            "user_id": user.pk,
+            "quantity": df["quantity"].to_numpy(),
+            "price": decimal(df["cents"]).to_numpy(),
+            "amount": decimal(df["amount"]).to_numpy(),
+            "filled_quantity": 0,
+            "matched": "f",
+        })
+        buffer = io.StringIO()
+        rows.to_csv(buffer, sep="\t", header=False, index=False, date_format="%Y-%m-%d %H:%M:%S.%f%z")
+        buffer.seek(0)
+
+        table = Transaction._meta.db_table
+        columns = ', '.join(rows.columns)
+        with connection.cursor() as cursor:
+            if "id" not in df:
+                cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT text)", buffer)
+                return ids
+
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {table}_copy (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY {table}_copy ({columns}) FROM STDIN WITH (FORMAT text)", buffer)
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_copy "
+                f"ON CONFLICT (id) DO NOTHING RETURNING id")
+            inserted = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"DROP TABLE {table}_copy")
+        return inserted
+
+    @staticmethod
+    def notify_orders(
+            stock_codes
+    ):
+        """
+        Notify the order matcher of the stocks with new or changed orders,
+        once the current database transaction commits.
+
+        :param stock_codes:
+        :return:
+        """
+        for code in set(stock_codes):
+            on_commit(partial(notify, ORDER_CHANNEL, code))
 
     @staticmethod
     def process_order_transaction(
-            stock_code
+            stock_code,
+            engine=Engine.QUERY,
+            workers=1,
+            full=False
     ):
         """
         Process order transactions for clearing.
 
+        Stocks are matched independently, with `workers` greater than one
+        they are matched concurrently in a process pool.
+
         :param stock_code:
+        :param engine:
+        :param workers:
+        :param full:
         :return:
         """
         logger.info(f"START process_order_transaction: {stock_code}")
@@ -237,98 +897,1350 @@ class TransactionService:
 
         transactions = Transaction.objects.filter(
             is_order=True,
-            status=Transaction.Status.PENDING).order_by('created')
+            status=Transaction.Status.PENDING)
         if stock_code:
             transactions = transactions.filter(stock__code=stock_code)
+        stock_codes = list(Stock.objects.filter(
+            pk__in=transactions.values('stock')
+        ).order_by('code').values_list('code', flat=True))
 
-        for t in transactions:
-            TransactionService.process_transaction(t.pk)
+        if workers > 1 and len(stock_codes) > 1:
+            # forked workers open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('fork')) as executor:
+                list(executor.map(
+                    TransactionService.process_stock_order_transaction,
+                    stock_codes,
+                    repeat(engine),
+                    repeat(full)))
+        else:
+            for code in stock_codes:
+                TransactionService.process_stock_order_transaction(code, engine, full)
 
         logger.info(f"FINISH process_order_transaction")
         print(f"FINISH process_order_transaction")
 
     @staticmethod
-    def process_transaction(
-            transaction_id
+    def process_stock_order_transaction(
+            stock_code,
+            engine=Engine.QUERY,
+            full=False
     ):
         """
-        Process order transaction.
+        Process order transactions of the stock while holding its matching lock.
 
-        :param transaction_id:
-        :return:
+        The stock is skipped when another process is already matching it.
+        Unless `full`, only the unmatched orders and the resting orders they
+        can cross are matched, in `created` order. The other resting orders
+        were matched before, so the trades and their prices are the ones of
+        a full pass. Orders are unmatched until a pass locking them commits,
+        so an order committed late is matched by the next pass.
+
+        :param stock_code:
+        :param engine:
+        :param full:
+        :return int: fills
         """
-        try:
-            transaction = Transaction.objects.get(pk=transaction_id)
-            if transaction.status == Transaction.Status.CLEARED:
-                return
-        except Transaction.DoesNotExist as e:
-            return
-        logger.info(f"process_transaction {transaction.get_type_display()}: {transaction}")
-        print(f"process_transaction {transaction.get_type_display()}: {transaction}")
+        with advisory_lock(MATCHING_LOCK, stock_code) as acquired:
+            if not acquired:
+                logger.info(f"SKIP process_stock_order_transaction: {stock_code} is locked")
+                return 0
 
-        if transaction.type is Transaction.Type.SELL:
-            orders = Transaction.objects.filter(
-                ~Q(user__pk=transaction.user.pk),
-                stock__pk=transaction.stock.pk,
-                price__gte=transaction.price,
-                status=Transaction.Status.PENDING,
-                type=Transaction.Type.BUY).order_by('-price', 'created')
-        else:
-            orders = Transaction.objects.filter(
-                ~Q(user__pk=transaction.user.pk),
-                stock__pk=transaction.stock.pk,
-                price__lte=transaction.price,
-                status=Transaction.Status.PENDING,
-                type=Transaction.Type.SELL).order_by('price', 'created')
-
-        for order in orders:
-            quantity = transaction.remainder_quantity() - order.remainder_quantity()
-            if quantity > 0:
-                # transaction still have remainder
-                TransactionService.match_order_transactions(transaction, order)
-            elif quantity < 0:
-                # order still have remainder
-                TransactionService.match_order_transactions(order, transaction)
-                break
+            stock = Stock.objects.get(code=stock_code)
+            watermark, _ = MatchingWatermark.objects.get_or_create(stock=stock)
+            processed = timezone.now()
+
+            if not full and not TransactionService.can_match_unmatched(watermark):
+                fills = []
+            elif engine == TransactionService.Engine.BOOK:
+                fills = TransactionService.process_order_book(stock, not full)
+            elif engine == TransactionService.Engine.AUCTION:
+                fills = TransactionService.process_order_auction(stock)
             else:
-                # cleared both orders
-                TransactionService.match_order_transactions(transaction, order, True)
-                break
+                fills = TransactionService.process_order_query(stock, not full)
 
+            watermark.last_processed = processed
+            watermark.best_bid, watermark.best_ask = TransactionService.get_best_prices(stock)
+            watermark.save()
+            return len(fills)
 
-class PortfolioService:
-    """
-    PortfolioService process the business logic regarding the portfolio.
-    """
     @staticmethod
-    def update_portfolio(
-            transaction
+    def get_pending_orders(
+            stock: Stock,
+            unmatched=False
     ):
         """
-        Update portfolio.
+        Get the pending orders of the stock, or only the orders not matched
+        since placed or changed.
 
-        :param transaction:
-        :return:
+        :param stock:
+        :param unmatched:
+        :return QuerySet:
         """
-        if transaction.status is not Transaction.Status.CLEARED \
-                or transaction.is_order:
-            return None
+        transactions = Transaction.objects.filter(
+            is_order=True,
+            status=Transaction.Status.PENDING,
+            stock=stock)
+        if unmatched:
+            transactions = transactions.filter(matched=False)
+        return transactions
 
-        portfolio, created = Portfolio.objects.get_or_create(
-            user=transaction.user,
-            stock=transaction.stock,
-            defaults={'user': transaction.user, 'stock': transaction.stock})
+    @staticmethod
+    def get_best_prices(
+            stock: Stock
+    ):
+        """
+        Get the best bid and ask prices of the stock pending orders.
 
-        if created:
-            average_price = transaction.price
-        else:
-            average_price = portfolio.total_share * portfolio.average_price
-            average_price += transaction.quantity * transaction.price
-            average_price *= Decimal(0.5)
-            average_price /= (portfolio.total_share + transaction.quantity) * Decimal(0.5)
+        :param stock:
+        :return tuple: best bid, best ask
+        """
+        transactions = TransactionService.get_pending_orders(stock)
+        best_bid = transactions.filter(
+            type=Transaction.Type.BUY
+        ).order_by('-price').values_list('price', flat=True).first()
+        best_ask = transactions.filter(
+            type=Transaction.Type.SELL
+        ).order_by('price').values_list('price', flat=True).first()
+        return best_bid, best_ask
 
-        portfolio.total_share += transaction.quantity
-        portfolio.total_value += transaction.amount
-        portfolio.average_price = average_price
-        portfolio.save()
-        return portfolio
+    @staticmethod
+    def get_crossing_prices(
+            transactions
+    ):
+        """
+        Get the highest bid and lowest ask prices of the order transactions.
+
+        :param transactions:
+        :return tuple: highest bid, lowest ask
+        """
+        prices = transactions.aggregate(
+            max_bid=Max('price', filter=Q(type=Transaction.Type.BUY)),
+            min_ask=Min('price', filter=Q(type=Transaction.Type.SELL)))
+        return prices['max_bid'], prices['min_ask']
+
+    @staticmethod
+    def get_crossable(
+            max_bid,
+            min_ask
+    ):
+        """
+        Get the filter of the orders priced to cross the highest bid or the lowest ask.
+
+        :param max_bid:
+        :param min_ask:
+        :return Q:
+        """
+        crossable = Q(pk__in=[])
+        if max_bid is not None:
+            crossable |= Q(type=Transaction.Type.SELL, price__lte=max_bid)
+        if min_ask is not None:
+            crossable |= Q(type=Transaction.Type.BUY, price__gte=min_ask)
+        return crossable
+
+    @staticmethod
+    def can_match_unmatched(
+            watermark: MatchingWatermark
+    ):
+        """
+        Check whether the unmatched orders can cross the best prices of the
+        watermark or each other. Unmatched orders that can not cross are
+        marked matched, so they are not matched again until changed.
+
+        :param watermark:
+        :return bool:
+        """
+        with atomic():
+            transactions = list(TransactionService.get_pending_orders(
+                watermark.stock, unmatched=True
+            ).select_for_update(skip_locked=True).only('id', 'type', 'price', 'matched'))
+            max_bid = max(
+                (t.price for t in transactions if t.type == Transaction.Type.BUY),
+                default=None)
+            min_ask = min(
+                (t.price for t in transactions if t.type == Transaction.Type.SELL),
+                default=None)
+
+            if max_bid is not None and min_ask is not None and max_bid >= min_ask:
+                return True
+            if max_bid is not None and watermark.best_ask is not None \
+                    and max_bid >= watermark.best_ask:
+                return True
+            if min_ask is not None and watermark.best_bid is not None \
+                    and min_ask <= watermark.best_bid:
+                return True
+            TransactionService.set_matched(transactions)
+        return False
+
+    @staticmethod
+    def process_order_query(
+            stock: Stock,
+            incremental=False
+    ):
+        """
+        Process order transactions of the stock, one aggressor at a time.
+
+        When `incremental`, the unmatched orders and the resting orders they
+        can cross are the aggressors. The stock price is set once, to the
+        last fill price of the pass.
+
+        Run while holding the matching lock of the stock.
+
+        :param stock:
+        :param incremental:
+        :return list: fills
+        """
+        transactions = TransactionService.get_pending_orders(stock)
+        if incremental:
+            placed = Q(matched=False)
+            transactions = transactions.filter(placed | TransactionService.get_crossable(
+                *TransactionService.get_crossing_prices(transactions.filter(placed))))
+        transactions = transactions.order_by('created').values_list('pk', flat=True)
+
+        fills = []
+        for pk in transactions:
+            fills.extend(TransactionService.process_transaction(pk, update_price=False, locked=True) or [])
+        if fills:
+            StockService.update_prices({stock.pk: fills[-1].price})
+        return fills
+
+    @staticmethod
+    def process_order_book(
+            stock: Stock,
+            incremental=False
+    ):
+        """
+        Process order transactions of the stock with the in-memory order book.
+
+        When `incremental`, only the unmatched orders and the resting orders
+        they can cross are loaded and matched.
+
+        Run while holding the matching lock of the stock.
+
+        :param stock:
+        :param incremental:
+        :return list: fills
+        """
+        logger.info(f"START process_order_book: {stock}")
+
+        # the loaded orders stay locked until the fills are persisted,
+        # orders locked by another matcher are left out of the book
+        with atomic():
+            transactions = TransactionService.get_pending_orders(
+                stock).select_for_update(skip_locked=True)
+            if incremental:
+                placed = list(transactions.filter(matched=False))
+                if not placed:
+                    return []
+                max_bid = max(
+                    (t.price for t in placed if t.type == Transaction.Type.BUY),
+                    default=None)
+                min_ask = min(
+                    (t.price for t in placed if t.type == Transaction.Type.SELL),
+                    default=None)
+                transactions = placed + list(transactions.filter(
+                    TransactionService.get_crossable(max_bid, min_ask), matched=True))
+                transactions.sort(key=lambda t: t.created)
+            else:
+                transactions = list(transactions.order_by('created'))
+
+            book = OrderBook(stock)
+            book.load(BookOrder.from_transaction(t) for t in transactions)
+            fills = book.run()
+            TransactionService.persist_fills(stock, fills, locked=True)
+            TransactionService.set_matched(transactions)
+
+        logger.info(f"FINISH process_order_book: {stock} {len(fills)} fills")
+        return fills
+
+    @staticmethod
+    def process_order_auction(
+            stock: Stock
+    ):
+        """
+        Process order transactions of the stock in a call auction.
+
+        Every crossing pending order trades at the single clearing price
+        that executes the most volume.
+
+        Run while holding the matching lock of the stock.
+
+        :param stock:
+        :return list: fills
+        """
+        logger.info(f"START process_order_auction: {stock}")
+
+        with atomic():
+            transactions = TransactionService.get_pending_orders(
+                stock).select_for_update(skip_locked=True)
+            transactions = list(transactions)
+            orders = [BookOrder.from_transaction(t) for t in transactions]
+            fills = run_auction(orders, reference=stock.price)
+            TransactionService.persist_fills(stock, fills, locked=True)
+            TransactionService.set_matched(transactions)
+
+        logger.info(f"FINISH process_order_auction: {stock} {len(fills)} fills")
+        return fills
+
+    @staticmethod
+    def set_matched(
+            transactions
+    ):
+        """
+        Mark the unmatched orders of a matching pass matched, with the
+        fills of the pass. The orders must be locked by the pass, so an
+        order changed concurrently is matched again.
+
+        :param transactions:
+        :return:
+        """
+        pks = [t.pk for t in transactions if not t.matched]
+        if pks:
+            Transaction.objects.filter(pk__in=pks).update(matched=True)
+
+    @staticmethod
+    def get_counter_orders(
+            transaction: Transaction
+    ):
+        """
+        Get the pending orders that can match the order transaction,
+        sorted by price-time priority.
+
+        :param transaction:
+        :return QuerySet:
+        """
+        if transaction.type == Transaction.Type.SELL:
+            return Transaction.objects.filter(
+                ~Q(user__pk=transaction.user_id),
+                stock__pk=transaction.stock_id,
+                price__gte=transaction.price,
+                is_order=True,
+                status=Transaction.Status.PENDING,
+                type=Transaction.Type.BUY).order_by('-price', 'created')
+        return Transaction.objects.filter(
+            ~Q(user__pk=transaction.user_id),
+            stock__pk=transaction.stock_id,
+            price__lte=transaction.price,
+            is_order=True,
+            status=Transaction.Status.PENDING,
+            type=Transaction.Type.SELL).order_by('price', 'created')
+
+    @staticmethod
+    def process_transaction(
+            transaction_id,
+            update_price=True,
+            locked=False
+    ):
+        """
+        Process order transaction.
+
+        :param transaction_id:
+        :param update_price:
+        :param locked: whether the matching lock of the stock is held
+        :return:
+        """
+        with atomic():
+            try:
+                # an order locked by another matcher is already being processed
+                transaction = Transaction.objects.select_for_update(
+                    skip_locked=True, of=('self',)
+                ).select_related('stock').get(pk=transaction_id)
+                if transaction.status == Transaction.Status.CLEARED:
+                    return
+            except Transaction.DoesNotExist as e:
+                return
+            logger.info(f"process_transaction {transaction.get_type_display()}: {transaction}")
+
+            aggressor = BookOrder.from_transaction(transaction)
+            counter_orders = TransactionService.get_counter_orders(
+                transaction).select_for_update(skip_locked=True)
+
+            fills = []
+            matched = []
+            while aggressor.remaining > 0:
+                orders = list(counter_orders.exclude(
+                    pk__in=matched)[:COUNTER_ORDERS_BATCH])
+                for order in orders:
+                    fills.append(match_orders(aggressor, BookOrder.from_transaction(order)))
+                    if aggressor.remaining == 0:
+                        break
+                if len(orders) < COUNTER_ORDERS_BATCH:
+                    break
+                matched.extend(o.pk for o in orders)
+            TransactionService.persist_fills(transaction.stock, fills, update_price, locked)
+            TransactionService.set_matched([transaction])
+        return fills
+
+
+class BulkOrderJobService:
+    """
+    BulkOrderJobService process the bulk order files in the background of the requests.
+    """
+
+    @staticmethod
+    def create_job(
+            user,
+            filename,
+            file
+    ):
+        """
+        Store the bulk order file as a pending job, and notify the bulk order
+        workers once the current database transaction commits.
+
+        A file is stored once per user by its content hash, the job of the
+        same file is returned instead, a failed job is pending again.
+
+        :param user:
+        :param filename:
+        :param file:
+        :return BulkOrderJob:
+        """
+        checksum = get_checksum(file)
+        job = BulkOrderJob.objects.filter(user=user, checksum=checksum).first()
+        if job is None:
+            job = BulkOrderJob(user=user, filename=filename, checksum=checksum)
+            job.file.save(filename, file, save=False)
+            try:
+                with atomic():
+                    job.save()
+            except IntegrityError:
+                # stored concurrently
+                job.file.delete(save=False)
+                return BulkOrderJob.objects.get(user=user, checksum=checksum)
+        elif job.status == BulkOrderJob.Status.FAILED:
+            job.status = BulkOrderJob.Status.PENDING
+            job.error = ''
+            job.finished = None
+            job.save(update_fields=['status', 'error', 'finished', 'modified'])
+        else:
+            logger.info(f"create_job: {filename} already stored as {job.filename}, skipping.")
+            return job
+
+        on_commit(partial(notify, BULK_ORDER_CHANNEL, str(job.pk)))
+        return job
+
+    @staticmethod
+    def create_stored_jobs():
+        """
+        Create the jobs of the bulk order files stored in the user folders.
+
+        Each file is claimed with an advisory lock and deleted once its job
+        is created, so overlapping runs create one job per file.
+
+        :return list: created jobs
+        """
+        dirs, _ = default_storage.listdir('.')
+        # job files are processed by their job
+        dirs = [d for d in dirs if d != BULK_ORDER_JOBS_DIR and d.isdigit()]
+        users = User.objects.in_bulk([int(d) for d in dirs])
+
+        jobs = []
+        for d in dirs:
+            user = users.get(int(d))
+            if user is None:
+                logger.error(f"ERROR create_stored_jobs: user {d} not found, skipping.")
+                continue
+            _, files = default_storage.listdir(d)
+            for f in files:
+                if 'CSV' not in f.upper() \
+                        and os.path.splitext(f)[1].lower() not in TransactionService.Format.EXTENSIONS:
+                    continue
+                path = f"{d}/{f}"
+                with advisory_lock(BULK_ORDER_FILE_LOCK, path) as locked:
+                    if not locked or not default_storage.exists(path):
+                        continue
+                    with atomic(), default_storage.open(path) as file:
+                        jobs.append(BulkOrderJobService.create_job(user, f, file))
+                    default_storage.delete(path)
+        return jobs
+
+    @staticmethod
+    def claim_job():
+        """
+        Claim the oldest pending job, or a running job without progress
+        within the job timeout. The job row is locked while claimed, so
+        concurrent workers skip it and claim the next job.
+
+        :return BulkOrderJob: None when no job is pending
+        """
+        now = timezone.now()
+        with atomic():
+            job = BulkOrderJob.objects.select_for_update(skip_locked=True).filter(
+                Q(status=BulkOrderJob.Status.PENDING)
+                | Q(status=BulkOrderJob.Status.RUNNING, modified__lt=now - BULK_ORDER_JOB_TIMEOUT)
+            ).order_by('created').first()
+            if job is None:
+                return None
+            if job.status == BulkOrderJob.Status.RUNNING:
+                logger.error(f"ERROR claim_job: {job.filename} timed out, resuming.")
+            job.status = BulkOrderJob.Status.RUNNING
+            job.started = job.started or now
+            job.save(update_fields=['status', 'started', 'modified'])
+        return job
+
+    @staticmethod
+    def run_job(
+            job,
+            chunksize=BULK_ORDERS_CHUNK
+    ):
+        """
+        Process the job file chunk by chunk, the progress of the job is
+        committed with the orders of each chunk, and a resumed job skips
+        the lines already processed. The file of a completed job is deleted.
+
+        :param job:
+        :param chunksize:
+        :return BulkOrderJob:
+        """
+        logger.info(f"START run_job: {job.user.username} - {job.filename}")
+        try:
+            with job.file.open('rb') as file:
+                format = TransactionService.get_bulk_format(job.filename, file)
+                summary = BulkOrderSummary(job.filename)
+                for df in TransactionService.read_bulk_orders(
+                        file, chunksize, skip=job.rows_processed, format=format):
+                    with atomic():
+                        pks, existing = TransactionService.create_bulk_orders(
+                            job.user, df, checksum=job.checksum)
+                        chunk = summary.add(len(df), pks, existing)
+                        BulkOrderJob.objects.filter(pk=job.pk).update(
+                            rows_processed=F('rows_processed') + chunk['rows_processed'],
+                            rows_rejected=F('rows_rejected') + chunk['rows_rejected'],
+                            rows_duplicated=F('rows_duplicated') + chunk['rows_duplicated'],
+                            modified=timezone.now())
+        except Exception as ex:
+            logger.error(f"ERROR run_job: {job.filename} - {ex}")
+            job.refresh_from_db()
+            job.status = BulkOrderJob.Status.FAILED
+            job.error = str(ex)
+        else:
+            job.refresh_from_db()
+            job.status = BulkOrderJob.Status.COMPLETED
+            job.file.delete(save=False)
+
+        job.finished = timezone.now()
+        job.save()
+        logger.info(
+            f"END run_job: {job.user.username} - {job.filename}, "
+            f"{job.get_status_display()} {job.rows_processed} rows")
+        return job
+
+    @staticmethod
+    def process_jobs(
+            chunksize=BULK_ORDERS_CHUNK,
+            workers=1
+    ):
+        """
+        Run the pending jobs until none is left.
+
+        With `workers` greater than one the jobs are run concurrently in a
+        process pool, each worker claiming the next pending job.
+
+        :param chunksize:
+        :param workers:
+        :return int: jobs processed
+        """
+        if workers > 1:
+            # forked workers open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('fork')) as executor:
+                return sum(executor.map(
+                    BulkOrderJobService.process_jobs, repeat(chunksize, workers)))
+
+        count = 0
+        job = BulkOrderJobService.claim_job()
+        while job is not None:
+            BulkOrderJobService.run_job(job, chunksize)
+            count += 1
+            job = BulkOrderJobService.claim_job()
+        return count
+
+
+class PortfolioService:
+    """
+    PortfolioService process the business logic regarding the portfolio.
+    """
+    @staticmethod
+    def update_portfolio(
+            transaction
+    ):
+        """
+        Update portfolio.
+
+        :param transaction:
+        :return:
+        """
+        if transaction.status is not Transaction.Status.CLEARED \
+                or transaction.is_order:
+            return None
+
+        portfolio, created = Portfolio.objects.get_or_create(
+            user=transaction.user,
+            stock=transaction.stock,
+            defaults={'user': transaction.user, 'stock': transaction.stock})
+
+        if created:
+            average_price = transaction.price
+        else:
+            average_price = portfolio.total_share * portfolio.average_price
+            average_price += transaction.quantity * transaction.price
+            average_price *= Decimal(0.5)
+            average_price /= (portfolio.total_share + transaction.quantity) * Decimal(0.5)
+
+        portfolio.total_share += transaction.quantity
+        portfolio.total_value += transaction.amount
+        portfolio.average_price = average_price
+        portfolio.save()
+        return portfolio
+
+    @staticmethod
+    def update_portfolios(
+            trades
+    ):
+        """
+        Update portfolios of the trades in bulk.
+
+        Portfolios are updated in trade order as `update_portfolio` does,
+        rounding the average price as it is stored on every save.
+
+        :param trades:
+        :return list: portfolios
+        """
+        trades = [
+            t for t in trades
+            if t.status == Transaction.Status.CLEARED and not t.is_order]
+        if not trades:
+            return []
+
+        portfolios = {
+            (p.user_id, p.stock_id): p
+            for p in Portfolio.objects.filter(
+                user_id__in={t.user_id for t in trades},
+                stock_id__in={t.stock_id for t in trades})}
+        created = set()
+
+        for transaction in trades:
+            key = (transaction.user_id, transaction.stock_id)
+            portfolio = portfolios.get(key)
+            if portfolio is None:
+                portfolio = portfolios[key] = Portfolio(
+                    user_id=transaction.user_id,
+                    stock_id=transaction.stock_id)
+                created.add(key)
+                average_price = transaction.price
+            else:
+                average_price = portfolio.total_share * portfolio.average_price
+                average_price += transaction.quantity * transaction.price
+                average_price *= Decimal(0.5)
+                average_price /= (portfolio.total_share + transaction.quantity) * Decimal(0.5)
+
+            portfolio.total_share += transaction.quantity
+            portfolio.total_value += transaction.amount
+            portfolio.average_price = average_price.quantize(
+                CENTS, rounding=ROUND_HALF_UP)
+
+        now = timezone.now()
+        for key, portfolio in portfolios.items():
+            portfolio.modified = now
+        Portfolio.objects.bulk_create(
+            [p for k, p in portfolios.items() if k in created])
+        Portfolio.objects.bulk_update(
+            [p for k, p in portfolios.items() if k not in created],
+            ['total_share', 'total_value', 'average_price', 'modified'])
+        return list(portfolios.values())
+
+
+class BookLevelService:
+    """
+    BookLevelService keeps the aggregated price levels of the stock order books.
+    """
+    @staticmethod
+    def get_order_level(
+            transaction
+    ):
+        """
+        Get the book level and remainder of a pending order transaction.
+
+        :param transaction:
+        :return tuple: (stock_id, type, price) and remainder, None if not in the book
+        """
+        if transaction is None or not transaction.is_order \
+                or transaction.status != Transaction.Status.PENDING:
+            return None
+        remaining = transaction.remainder_quantity()
+        if remaining <= 0:
+            return None
+        level = (transaction.stock_id, transaction.type, Decimal(str(transaction.price)))
+        return level, remaining
+
+    @staticmethod
+    def update_order_level(
+            previous,
+            current
+    ):
+        """
+        Move the order in the book levels, from the previous to the current order level.
+
+        :param previous: `get_order_level` before the change
+        :param current: `get_order_level` after the change
+        :return:
+        """
+        deltas = {}
+        if previous is not None:
+            level, remaining = previous
+            deltas[level] = (-remaining, -1)
+        if current is not None:
+            level, remaining = current
+            quantity, orders = deltas.get(level, (0, 0))
+            deltas[level] = (quantity + remaining, orders + 1)
+        BookLevelService.update_book_levels(deltas)
+
+    @staticmethod
+    def update_book_levels(
+            deltas
+    ):
+        """
+        Add the quantity and order count deltas to the book levels in batched
+        upserts, and remove the emptied levels.
+
+        :param deltas: dict of (stock_id, type, price) to (quantity, orders)
+        :return:
+        """
+        deltas = {k: v for k, v in deltas.items() if any(v)}
+        if not deltas:
+            return
+
+        fields = ['id', 'created', 'modified', 'stock', 'type', 'price', 'quantity', 'orders']
+        fields = {f: BookLevel._meta.get_field(f) for f in fields}
+        # the values shared by the levels are prepared once
+        now = fields['created'].get_db_prep_save(timezone.now(), connection)
+        stocks = {
+            stock_id: fields['stock'].get_db_prep_save(stock_id, connection)
+            for stock_id, _, _ in deltas}
+        params = []
+        # sorted to lock the levels of concurrent updates in the same order
+        for (stock_id, type, price), (quantity, orders) in sorted(deltas.items()):
+            params.append([
+                fields['id'].get_db_prep_save(uuid.uuid4(), connection), now, now,
+                stocks[stock_id], type, fields['price'].get_db_prep_save(price, connection),
+                quantity, orders])
+
+        table = BookLevel._meta.db_table
+        columns = ', '.join(f.column for f in fields.values())
+        with connection.cursor() as cursor:
+            for i in range(0, len(params), BOOK_LEVELS_BATCH):
+                batch = params[i:i + BOOK_LEVELS_BATCH]
+                rows = ', '.join([f"({', '.join(['%s'] * len(fields))})"] * len(batch))
+                cursor.execute(
+                    f"INSERT INTO {table} ({columns}) VALUES {rows} "
+                    f"ON CONFLICT (stock_id, type, price) DO UPDATE SET "
+                    f"quantity = {table}.quantity + EXCLUDED.quantity, "
+                    f"orders = {table}.orders + EXCLUDED.orders, "
+                    f"modified = EXCLUDED.modified",
+                    [v for row in batch for v in row])
+
+        BookLevel.objects.filter(
+            Q(quantity__lte=0) | Q(orders__lte=0),
+            stock_id__in={stock_id for stock_id, _, _ in deltas}).delete()
+
+    @staticmethod
+    def get_book_levels(
+            stock: Stock,
+            type,
+            depth
+    ):
+        """
+        Get the top book levels of the stock side, best price first.
+
+        :param stock:
+        :param type:
+        :param depth:
+        :return QuerySet:
+        """
+        ordering = '-price' if type == Transaction.Type.BUY else 'price'
+        return BookLevel.objects.filter(
+            stock=stock,
+            type=type,
+            quantity__gt=0).order_by(ordering)[:depth]
+
+
+class StockReferences:
+    """
+    StockReferences keeps the stock metadata of the process, by id and by code.
+
+    The stocks are reloaded when the shared stock version changes, checked
+    at most every `check_interval` seconds, or after `max_age` seconds.
+    A stock missing from the references is queried and added.
+
+    When the cache is not shared the version is not seen by the other
+    processes, the count, the last created and the versions of the stocks
+    are checked instead, the trades setting the stock prices do not change them.
+    """
+
+    def __init__(
+            self,
+            check_interval=1,
+            max_age=300
+    ):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.by_pk = {}
+        self.by_code = {}
+        self.version = None
+        self.checked = None
+        self.loaded = None
+
+    def clear(self):
+        self.version = self.checked = self.loaded = None
+
+    def refresh(self):
+        now = monotonic()
+        if self.checked is not None and now - self.checked < self.check_interval:
+            return
+        self.checked = now
+        if settings.CACHE_SHARED:
+            version = cache.get(STOCK_VERSION_KEY, 0)
+        else:
+            version = tuple(Stock.objects.aggregate(
+                Count('id'), Max('created'), Sum('version')).values())
+        if version == self.version and now - self.loaded < self.max_age:
+            return
+
+        stocks = list(Stock.objects.only('id', 'code', 'name'))
+        self.by_pk, self.by_code = {s.pk: s for s in stocks}, {s.code: s for s in stocks}
+        self.version, self.loaded = version, now
+
+    def get(
+            self,
+            pk=None,
+            code=None
+    ):
+        """
+        Get a copy of the stock reference, with its id, code and name only.
+
+        :param pk:
+        :param code:
+        :return Stock: None when the stock does not exist
+        """
+        self.refresh()
+        stock = self.by_pk.get(pk) if code is None else self.by_code.get(code)
+        if stock is None:
+            lookup = {'pk': pk} if code is None else {'code': code}
+            stock = Stock.objects.only('id', 'code', 'name').filter(**lookup).first()
+            if stock is None:
+                return None
+            self.by_pk[stock.pk] = self.by_code[stock.code] = stock
+        return copy.copy(stock)
+
+    def get_codes(
+            self,
+            codes
+    ):
+        """
+        Get copies of the stock references by code, the stocks missing
+        from the references are queried in one query.
+
+        :param codes:
+        :return dict: code to Stock, without the stocks that do not exist
+        """
+        self.refresh()
+        codes = set(codes)
+        missing = codes - self.by_code.keys()
+        if missing:
+            for stock in Stock.objects.only('id', 'code', 'name').filter(code__in=missing):
+                self.by_pk[stock.pk] = self.by_code[stock.code] = stock
+        return {
+            code: copy.copy(self.by_code[code])
+            for code in codes if code in self.by_code}
+
+
+# stock references of the process
+stock_references = StockReferences()
+
+
+class StockService:
+    """
+    StockService process the business logic regarding the stock.
+    """
+
+    @staticmethod
+    def get_stock(
+            pk=None,
+            code=None
+    ):
+        """
+        Get the stock reference by id or code, without querying the cached stocks.
+
+        :param pk:
+        :param code:
+        :return Stock: id, code and name only, None when the stock does not exist
+        """
+        return stock_references.get(pk=pk, code=code)
+
+    @staticmethod
+    def get_stocks(
+            codes
+    ):
+        """
+        Get the stock references by code, the uncached stocks in one query.
+
+        :param codes:
+        :return dict: code to Stock, without the stocks that do not exist
+        """
+        return stock_references.get_codes(codes)
+
+    @staticmethod
+    def bump_version():
+        """
+        Invalidate the stock references of the process now, and of every
+        process once the current database transaction commits.
+
+        :return:
+        """
+        def bump():
+            try:
+                cache.incr(STOCK_VERSION_KEY)
+            except ValueError:
+                cache.set(STOCK_VERSION_KEY, 1, None)
+
+        stock_references.clear()
+        # the other processes check the stocks table without a shared cache
+        if settings.CACHE_SHARED:
+            on_commit(bump)
+
+    @staticmethod
+    def update_prices(
+            prices,
+            time=None
+    ):
+        """
+        Set the last trade price of the stocks, one update per stock.
+
+        :param prices: dict of stock id to price
+        :param time:
+        :return:
+        """
+        now = time or timezone.now()
+        for pk, price in prices.items():
+            Stock.objects.filter(pk=pk).update(price=price, modified=now)
+
+    @staticmethod
+    def notify_trades(
+            stock: Stock,
+            fills,
+            time
+    ):
+        """
+        Stream the trade prints and the new stock price to the subscribers,
+        once the current database transaction commits.
+
+        :param stock:
+        :param fills:
+        :param time:
+        :return:
+        """
+        for i in range(0, len(fills), STREAM_PRINTS):
+            chunk = fills[i:i + STREAM_PRINTS]
+            payload = json.dumps({
+                'event': 'trades',
+                'stock': stock.code,
+                'price': str(Decimal(chunk[-1].price).quantize(CENTS)),
+                'time': time.isoformat(),
+                'trades': [[f.quantity, str(Decimal(f.price).quantize(CENTS))] for f in chunk],
+            })
+            on_commit(partial(notify, TRADE_CHANNEL, payload))
+
+    @staticmethod
+    def get_price_event(
+            stock: Stock
+    ):
+        """
+        Get the price event payload of the stock.
+
+        :param stock:
+        :return str:
+        """
+        return json.dumps({
+            'event': 'price',
+            'stock': stock.code,
+            'price': str(Decimal(stock.price).quantize(CENTS)),
+            'time': stock.modified.isoformat(),
+        })
+
+    @staticmethod
+    def notify_price(
+            stock: Stock
+    ):
+        """
+        Stream the stock price to the subscribers, once the current database
+        transaction commits.
+
+        :param stock:
+        :return:
+        """
+        on_commit(partial(notify, TRADE_CHANNEL, StockService.get_price_event(stock)))
+
+
+class CandleService:
+    """
+    CandleService process the business logic regarding the candle.
+    """
+
+    @staticmethod
+    def get_start(
+            time,
+            interval
+    ):
+        """
+        Get the start of the candle of the interval holding the time.
+
+        :param time:
+        :param interval:
+        :return datetime:
+        """
+        duration = CANDLE_INTERVALS[interval]
+        return EPOCH + (time - EPOCH) // duration * duration
+
+    @staticmethod
+    def update_candles(
+            stock: Stock,
+            fills,
+            time
+    ):
+        """
+        Merge the fills of a matching pass into the minute candle of the time.
+
+        :param stock:
+        :param fills:
+        :param time:
+        :return:
+        """
+        if not fills:
+            return
+        prices = [f.price for f in fills]
+        CandleService.upsert_candles([(
+            stock.pk,
+            Candle.Interval.MINUTE,
+            CandleService.get_start(time, Candle.Interval.MINUTE),
+            prices[0],
+            max(prices),
+            min(prices),
+            prices[-1],
+            sum(f.quantity for f in fills),
+            len(fills))], merge=True)
+
+    @staticmethod
+    def upsert_candles(
+            candles,
+            merge=False
+    ):
+        """
+        Insert or update the candles in one upsert.
+
+        Merged candles keep their open, extend their high and low, take the
+        new close and add the volume and trades, other candles are replaced.
+
+        :param candles: (stock_id, interval, start, open, high, low, close, volume, trades)
+        :param merge:
+        :return:
+        """
+        if not candles:
+            return
+
+        now = timezone.now()
+        fields = [
+            'id', 'created', 'modified', 'stock', 'interval', 'start',
+            'open', 'high', 'low', 'close', 'volume', 'trades']
+        fields = [Candle._meta.get_field(f) for f in fields]
+        params = []
+        # sorted to lock the candles of concurrent updates in the same order
+        for candle in sorted(candles, key=lambda c: c[:3]):
+            values = [uuid.uuid4(), now, now, *candle]
+            params.extend(
+                f.get_db_prep_save(v, connection) for f, v in zip(fields, values))
+
+        table = Candle._meta.db_table
+        qn = connection.ops.quote_name
+        if merge:
+            greatest, least = ('GREATEST', 'LEAST') if connection.vendor == 'postgresql' \
+                else ('MAX', 'MIN')
+            updates = (
+                f"high = {greatest}({table}.high, EXCLUDED.high), "
+                f"low = {least}({table}.low, EXCLUDED.low), "
+                f"close = EXCLUDED.close, "
+                f"volume = {table}.volume + EXCLUDED.volume, "
+                f"trades = {table}.trades + EXCLUDED.trades, ")
+        else:
+            updates = ''.join(
+                f"{qn(c)} = EXCLUDED.{qn(c)}, "
+                for c in ('open', 'high', 'low', 'close', 'volume', 'trades'))
+
+        columns = ', '.join(qn(f.column) for f in fields)
+        rows = ', '.join([f"({', '.join(['%s'] * len(fields))})"] * len(candles))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {rows} "
+                f"ON CONFLICT (stock_id, {qn('interval')}, start) DO UPDATE SET "
+                f"{updates}modified = EXCLUDED.modified",
+                params)
+
+    @staticmethod
+    def rollup_candles(
+            since
+    ):
+        """
+        Derive the coarser candles from the finer candles updated since the time.
+
+        Each coarser candle holding an updated finer candle is computed again
+        from all its finer candles, so overlapping rollups are idempotent.
+
+        :param since:
+        :return int: rolled up candles
+        """
+        count = 0
+        for finer, coarser in CANDLE_ROLLUPS:
+            updated = Candle.objects.filter(
+                interval=finer,
+                modified__gte=since
+            ).values_list('stock_id', 'start').order_by()
+            buckets = {
+                (stock_id, CandleService.get_start(start, coarser))
+                for stock_id, start in updated}
+            if not buckets:
+                continue
+
+            rows = Candle.objects.filter(
+                interval=finer,
+                stock_id__in={stock_id for stock_id, _ in buckets},
+                start__gte=min(start for _, start in buckets),
+                start__lt=max(start for _, start in buckets) + CANDLE_INTERVALS[coarser]
+            ).order_by('stock_id', 'start').values_list(
+                'stock_id', 'start', 'open', 'high', 'low', 'close', 'volume', 'trades')
+
+            candles = {}
+            for stock_id, start, open, high, low, close, volume, trades in rows:
+                key = (stock_id, CandleService.get_start(start, coarser))
+                if key not in buckets:
+                    continue
+                candle = candles.get(key)
+                if candle is None:
+                    candles[key] = [open, high, low, close, volume, trades]
+                else:
+                    candle[1] = max(candle[1], high)
+                    candle[2] = min(candle[2], low)
+                    candle[3] = close
+                    candle[4] += volume
+                    candle[5] += trades
+
+            CandleService.upsert_candles([
+                (stock_id, coarser, start, *candle)
+                for (stock_id, start), candle in candles.items()])
+            count += len(candles)
+
+        logger.info(f"rollup_candles: {count} candles since {since}")
+        return count
+
+    @staticmethod
+    def backfill_candles(
+            batch_size=1000
+    ):
+        """
+        Rebuild the minute candles from the trades, each fill counted by its buy trade.
+
+        :param batch_size: candles per upsert
+        :return int: minute candles
+        """
+        trades = Trade.objects.filter(
+            type=Transaction.Type.BUY
+        ).order_by('stock_id', 'created').values_list(
+            'stock_id', 'created', 'price', 'quantity').iterator(chunk_size=10000)
+
+        count = 0
+        candles = []
+        key = None
+        for stock_id, created, price, quantity in trades:
+            start = CandleService.get_start(created, Candle.Interval.MINUTE)
+            if (stock_id, start) != key:
+                if len(candles) >= batch_size:
+                    CandleService.upsert_candles(candles)
+                    count += len(candles)
+                    candles = []
+                key = (stock_id, start)
+                candles.append([stock_id, Candle.Interval.MINUTE, start, price, price, price, price, 0, 0])
+            candle = candles[-1]
+            candle[4] = max(candle[4], price)
+            candle[5] = min(candle[5], price)
+            candle[6] = price
+            candle[7] += quantity
+            candle[8] += 1
+
+        CandleService.upsert_candles(candles)
+        count += len(candles)
+        logger.info(f"backfill_candles: {count} candles")
+        return count
+
+    @staticmethod
+    def get_candles(
+            stock: Stock,
+            interval,
+            start=None,
+            end=None,
+            limit=None
+    ):
+        """
+        Get the latest candles of the stock within the range, in time order.
+
+        :param stock:
+        :param interval:
+        :param start: inclusive
+        :param end: exclusive
+        :param limit:
+        :return list:
+        """
+        candles = Candle.objects.filter(stock=stock, interval=interval)
+        if start is not None:
+            candles = candles.filter(start__gte=start)
+        if end is not None:
+            candles = candles.filter(start__lt=end)
+        return list(candles.order_by('-start')[:limit])[::-1]
+
+
+class TickService:
+    """
+    TickService process the business logic regarding the tick.
+    """
+
+    @staticmethod
+    def append_ticks(
+            stock: Stock,
+            fills,
+            time
+    ):
+        """
+        Append a tick for each fill of a matching pass, in one insert.
+
+        :param stock:
+        :param fills:
+        :param time:
+        :return list: ticks
+        """
+        return Tick.objects.bulk_create([
+            Tick(stock_id=stock.pk, time=time, price=fill.price, quantity=fill.quantity)
+            for fill in fills])
+
+    @staticmethod
+    def get_ticks(
+            stock: Stock,
+            start=None,
+            end=None
+    ):
+        """
+        Get the ticks of the stock within the range, in time order.
+
+        :param stock:
+        :param start: inclusive
+        :param end: exclusive
+        :return QuerySet:
+        """
+        ticks = Tick.objects.filter(stock=stock)
+        if start is not None:
+            ticks = ticks.filter(time__gte=start)
+        if end is not None:
+            ticks = ticks.filter(time__lt=end)
+        return ticks.order_by('time', 'id')
+
+    @staticmethod
+    def get_partitions():
+        """
+        Get the day partitions of the ticks.
+
+        :return dict: day to partition name
+        """
+        if connection.vendor != 'postgresql':
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = %s",
+                [Tick._meta.db_table])
+            names = [row[0] for row in cursor.fetchall()]
+        prefix = TICK_PARTITION.split('{')[0]
+        return {
+            datetime.strptime(name[len(prefix):], '%Y%m%d').date(): name
+            for name in names if name.startswith(prefix)}
+
+    @staticmethod
+    def create_partitions(
+            start: date,
+            days
+    ):
+        """
+        Create the missing day partitions of the ticks from the start day.
+
+        Ticks of the day already in the default partition are moved to the
+        new partition before it is attached.
+
+        :param start:
+        :param days:
+        :return list: created partitions
+        """
+        if connection.vendor != 'postgresql':
+            return []
+
+        table = Tick._meta.db_table
+        existing = TickService.get_partitions()
+        created = []
+        for day in (start + timedelta(days=i) for i in range(days)):
+            if day in existing:
+                continue
+            name = TICK_PARTITION.format(day)
+            lower = datetime.combine(day, datetime.min.time(), dt_timezone.utc)
+            bounds = [lower, lower + timedelta(days=1)]
+            with atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM "{table}_default" '
+                    f'WHERE "time" >= %s AND "time" < %s RETURNING *) '
+                    f'INSERT INTO "{name}" SELECT * FROM moved',
+                    bounds)
+                cursor.execute(
+                    f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    bounds)
+            created.append(name)
+
+        logger.info(f"create_partitions: {created}")
+        return created
+
+    @staticmethod
+    def detach_partitions(
+            before: date,
+            drop=False
+    ):
+        """
+        Detach the day partitions of the ticks before the day, and drop them.
+
+        :param before:
+        :param drop:
+        :return list: detached partitions
+        """
+        table = Tick._meta.db_table
+        detached = []
+        for day, name in sorted(TickService.get_partitions().items()):
+            if day >= before:
+                continue
+            with atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                if drop:
+                    cursor.execute(f'DROP TABLE "{name}"')
+            detached.append(name)
+
+        logger.info(f"detach_partitions: {detached}")
+        return detached
@@ -1,11 +1,11 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-17
 
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 
-from core.models import Transaction, Order
-from core.services import TransactionService, PortfolioService
+from core.models import Stock, Transaction, Order
+from core.services import TransactionService, PortfolioService, BookLevelService, StockService
 
 
 @receiver(pre_save, sender=Order)
@@ -19,3 +19,63 @@ def post_save_transaction(sender, instance, **kwargs):
     PortfolioService.update_portfolio(
         transaction=instance,
     )
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Transaction)
+def post_save_order(sender, instance, **kwargs):
+    if instance.is_order and instance.status == Transaction.Status.PENDING:
+        TransactionService.notify_orders([instance.stock.code])
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=Transaction)
+def pre_save_book_level(sender, instance, **kwargs):
+    # new and trade transactions were not in the book, the previous
+    # level may be set by the service before changing the order
+    if instance._state.adding or not instance.is_order or hasattr(instance, '_book_level'):
+        return
+    instance._book_level = BookLevelService.get_order_level(
+        Transaction.objects.filter(pk=instance.pk).first())
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Transaction)
+def post_save_book_level(sender, instance, **kwargs):
+    BookLevelService.update_order_level(
+        instance.__dict__.pop('_book_level', None),
+        BookLevelService.get_order_level(instance))
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Transaction)
+def post_delete_book_level(sender, instance, **kwargs):
+    BookLevelService.update_order_level(
+        BookLevelService.get_order_level(instance), None)
+
+
+@receiver(pre_save, sender=Stock)
+def pre_save_stock(sender, instance, **kwargs):
+    # the stock references change with the code and name only
+    if instance._state.adding:
+        instance._references_changed = True
+        return
+    previous = Stock.objects.filter(pk=instance.pk).values_list('code', 'name', 'version').first()
+    if previous is not None and previous[:2] == (instance.code, instance.name):
+        return
+    if previous is not None:
+        instance.version = previous[2] + 1
+    instance._references_changed = True
+
+
+@receiver(post_save, sender=Stock)
+def post_save_stock(sender, instance, created, **kwargs):
+    if instance.__dict__.pop('_references_changed', False):
+        StockService.bump_version()
+    if not created:
+        StockService.notify_price(instance)
+
+
+@receiver(post_delete, sender=Stock)
+def post_delete_stock(sender, instance, **kwargs):
+    StockService.bump_version()
@@ -55,6 +55,9 @@ class StockTestHelper:
     # API URL names
     API_NAME_STOCK_LIST = 'core-api-stock-list'
     API_NAME_STOCK_DETAIL = 'core-api-stock-detail'
+    API_NAME_STOCK_BOOK = 'core-api-stock-book'
+    API_NAME_STOCK_STREAM = 'core-api-stock-stream'
+    API_NAME_STOCK_CANDLES = 'core-api-stock-candles'
 
     STOCK_DATA_1 = {
         'code': 'APP',
@@ -86,6 +89,8 @@ class OrderTestHelper:
     # API URL names
     API_NAME_ORDER_LIST = 'core-api-order-list'
     API_NAME_ORDER_DETAIL = 'core-api-order-detail'
+    API_NAME_ORDER_BULK = 'core-api-order-bulk'
+    API_NAME_ORDER_BULK_JOB = 'core-api-order-bulk-job'
 
     ORDER_DATA_1 = {
         'type': Transaction.Type.BUY,
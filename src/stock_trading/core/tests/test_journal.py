@@ -0,0 +1,317 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import os
+import random
+import tempfile
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from core.engine import BookOrder, OrderBook
+from core.journal import (
+    Journal,
+    NewOrder,
+    CancelOrder,
+    FillOrder,
+    encode,
+    read_records,
+)
+from core.matcher import JournalPersister, ResidentMatcher
+from core.models import *
+from core.services import TransactionService
+from core.tests.helpers import (
+    UserTestHelper,
+    StockTestHelper,
+    OrderTestHelper,
+)
+
+
+class JournalTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.users = [
+            UserTestHelper.create_test_user(username=f"testuser{i:02}")
+            for i in range(4)]
+        self.stock_book = StockTestHelper.create_test_stock()
+        self.stock_resident = StockTestHelper.create_test_stock(
+            **StockTestHelper.STOCK_DATA_2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_test_flow(self, matcher, count=60, seed=7):
+        """
+        Create the same order flow for both stocks, matching after each order.
+
+        :param matcher:
+        :param count:
+        :param seed:
+        :return:
+        """
+        rand = random.Random(seed)
+        for i in range(count):
+            data = {
+                'user': rand.choice(self.users),
+                'type': rand.choice([Transaction.Type.BUY, Transaction.Type.SELL]),
+                'quantity': rand.randint(1, 10) * 10,
+                'price': Decimal(rand.randint(95, 105)),
+            }
+            OrderTestHelper.create_test_order(stock=self.stock_book, **data)
+            OrderTestHelper.create_test_order(stock=self.stock_resident, **data)
+            TransactionService.process_stock_order_transaction(
+                self.stock_book.code, TransactionService.Engine.BOOK, full=True)
+            matcher.sync(self.stock_resident.code)
+
+    @staticmethod
+    def get_results(stock):
+        trades = sorted(
+            Trade.objects.filter(stock=stock).values_list(
+                'user__username', 'type', 'quantity', 'price', 'amount'))
+        orders = sorted(
+            (t.user.username, t.type, t.quantity, t.price, t.status, t.remainder_quantity())
+            for t in Transaction.objects.filter(stock=stock, is_order=True))
+        portfolios = sorted(
+            Portfolio.objects.filter(stock=stock).values_list(
+                'user__username', 'total_share', 'total_value', 'average_price'))
+        stock.refresh_from_db()
+        return trades, orders, portfolios, stock.price
+
+    @staticmethod
+    def get_books(books):
+        return {
+            stock_id: [
+                (order.pk, order.remaining)
+                for type in sorted(book.levels)
+                for price in book.prices[type]
+                for order in book.levels[type][price]]
+            for stock_id, book in books.items() if len(book)}
+
+    def create_matcher(self):
+        return ResidentMatcher(
+            Journal(self.directory.name, fsync=False),
+            JournalPersister(),
+            snapshot_interval=10 ** 6)
+
+    def test_encode_decode(self):
+        """
+        Journal records should decode to the encoded events.
+
+        :return:
+        """
+        stock_id = uuid.uuid4()
+        order = BookOrder(
+            uuid.uuid4(), 7, Transaction.Type.SELL, Decimal('101.25'),
+            timezone.now(), 30)
+        events = [
+            NewOrder(1, stock_id, order),
+            CancelOrder(2, stock_id, order.pk),
+            FillOrder(3, stock_id, order.pk, uuid.uuid4(), 10, Decimal('99.50'), 20, 0),
+        ]
+        data = b''.join(encode(e) for e in events)
+
+        decoded, length = read_records(data)
+        self.assertEqual(length, len(data))
+        self.assertEqual(decoded[1:], events[1:])
+        self.assertEqual(decoded[0][:2], events[0][:2])
+        self.assertEqual(
+            [getattr(decoded[0].order, f) for f in BookOrder.__slots__],
+            [getattr(order, f) for f in BookOrder.__slots__])
+
+        # a torn or corrupted record ends the journal
+        decoded, length = read_records(data[:-1])
+        self.assertEqual(decoded[1:], events[1:2])
+        corrupted = bytearray(data)
+        corrupted[length + 20] ^= 0xFF
+        self.assertEqual(read_records(bytes(corrupted))[1], length)
+
+    def test_resident_matcher_same_trades(self):
+        """
+        Resident matcher should produce the same trades as the order book engine
+        matching each order as it is placed.
+
+        :return:
+        """
+        matcher = self.create_matcher()
+        matcher.start()
+        self.create_test_flow(matcher, count=40, seed=51)
+        matcher.persister.flush()
+
+        Order.objects.filter(stock=self.stock_book).order_by('created').first().delete()
+        Order.objects.filter(stock=self.stock_resident).order_by('created').first().delete()
+        self.create_test_flow(matcher, count=40, seed=52)
+        matcher.persister.flush()
+        matcher.stop()
+
+        trades, orders, portfolios, price = self.get_results(self.stock_book)
+        self.assertTrue(trades, "Order flow should produce trades.")
+        self.assertEqual(
+            (trades, orders, portfolios, price),
+            self.get_results(self.stock_resident))
+        self.assertEqual(
+            MatchingWatermark.objects.get(stock=self.stock_resident).journal_sequence,
+            max(f.sequence for f in Journal(self.directory.name).recover()[1]))
+
+    def test_recover_snapshot(self):
+        """
+        Recovery should rebuild the books from the snapshot and the journal after it.
+
+        :return:
+        """
+        matcher = self.create_matcher()
+        matcher.start()
+        self.create_test_flow(matcher, count=30, seed=61)
+        matcher.journal.snapshot(matcher.books, matcher.persister.persisted)
+
+        self.create_test_flow(matcher, count=30, seed=62)
+        matcher.journal.close()
+        files = sorted(os.listdir(self.directory.name))
+
+        recovered = Journal(self.directory.name)
+        books, fills = recovered.recover()
+        self.assertEqual(len([f for f in files if f.startswith('snapshot-')]), 1)
+        self.assertEqual(self.get_books(books), self.get_books(matcher.books))
+        self.assertEqual(recovered.sequence, matcher.journal.sequence)
+        self.assertEqual(
+            [f.sequence for f in fills],
+            [f.sequence for f in list(matcher.persister.queue.queue)])
+
+        # unpersisted fills are persisted at start
+        restarted = ResidentMatcher(recovered, JournalPersister())
+        restarted.start()
+        self.assertEqual(
+            Trade.objects.filter(stock=self.stock_resident).count(), 2 * len(fills))
+        self.assertEqual(restarted.persister.persisted, matcher.journal.sequence)
+
+    def test_match_crossing_orders(self):
+        """
+        Only the new orders and the resting orders they can cross should be matched.
+
+        :return:
+        """
+        now = timezone.now()
+        book = OrderBook()
+        book.load(
+            BookOrder(uuid.uuid4(), 1, type, Decimal(price), now, 10)
+            for type, price in (
+                (Transaction.Type.BUY, 98),
+                (Transaction.Type.BUY, 99),
+                (Transaction.Type.SELL, 101),
+                (Transaction.Type.SELL, 102)))
+        ask = BookOrder(uuid.uuid4(), 2, Transaction.Type.SELL, Decimal(99), now, 10)
+        bid = BookOrder(uuid.uuid4(), 2, Transaction.Type.BUY, Decimal(101), now, 10)
+
+        self.assertEqual(
+            sorted(o.price for o in book.crossing([ask])),
+            [Decimal(99), Decimal(99)])
+        self.assertEqual(
+            sorted(o.price for o in book.crossing([ask, bid])),
+            [Decimal(99), Decimal(99), Decimal(101), Decimal(101)])
+
+    def test_dropped_fill_restored(self):
+        """
+        The counterparty of a fill dropped with its deleted order should be
+        matched again with the dropped quantity.
+
+        :return:
+        """
+        matcher = self.create_matcher()
+        matcher.start()
+        data = {'stock': self.stock_resident, 'price': Decimal(100)}
+        bid = OrderTestHelper.create_test_order(
+            user=self.users[0], type=Transaction.Type.BUY, quantity=20, **data)
+        matcher.sync(self.stock_resident.code)
+
+        asks = []
+        for i in range(2):
+            asks.append(OrderTestHelper.create_test_order(
+                user=self.users[i + 1], type=Transaction.Type.SELL, quantity=10, **data))
+            matcher.sync(self.stock_resident.code)
+        self.assertNotIn(bid.pk, matcher.books[self.stock_resident.pk])
+
+        # deleted before its fill is persisted
+        Order.objects.filter(pk=asks[0].pk).delete()
+        with self.assertLogs('core.matcher', 'ERROR'):
+            matcher.persister.flush()
+        bid.refresh_from_db()
+        self.assertEqual(
+            (bid.status, bid.filled_quantity), (Transaction.Status.PENDING, 10))
+
+        OrderTestHelper.create_test_order(
+            user=self.users[3], type=Transaction.Type.SELL, quantity=10, **data)
+        matcher.sync(self.stock_resident.code)
+        matcher.stop()
+
+        bid.refresh_from_db()
+        self.assertEqual(
+            (bid.status, bid.filled_quantity), (Transaction.Status.CLEARED, 20))
+        self.assertFalse(Transaction.objects.filter(
+            stock=self.stock_resident, is_order=True,
+            status=Transaction.Status.PENDING).exists())
+        self.assertEqual(len(matcher.books[self.stock_resident.pk]), 0)
+
+    def test_restart_filled_by_database(self):
+        """
+        An order of the recovered book filled by another engine while the
+        resident matcher was stopped should not be filled again.
+
+        :return:
+        """
+        matcher = self.create_matcher()
+        matcher.start()
+        data = {'stock': self.stock_resident, 'price': Decimal(100)}
+        bid = OrderTestHelper.create_test_order(
+            user=self.users[0], type=Transaction.Type.BUY, quantity=20, **data)
+        matcher.sync(self.stock_resident.code)
+        matcher.stop()
+
+        OrderTestHelper.create_test_order(
+            user=self.users[1], type=Transaction.Type.SELL, quantity=15, **data)
+        TransactionService.process_stock_order_transaction(
+            self.stock_resident.code, TransactionService.Engine.QUERY)
+        bid.refresh_from_db()
+        self.assertEqual(bid.filled_quantity, 15)
+
+        matcher = self.create_matcher()
+        matcher.start()
+        self.assertEqual(matcher.books[self.stock_resident.pk].orders[bid.pk].remaining, 20)
+        ask = OrderTestHelper.create_test_order(
+            user=self.users[2], type=Transaction.Type.SELL, quantity=10, **data)
+        matcher.sync(self.stock_resident.code)
+        matcher.persister.flush()
+        matcher.stop()
+
+        bid.refresh_from_db()
+        ask.refresh_from_db()
+        self.assertEqual(
+            (bid.status, bid.filled_quantity), (Transaction.Status.CLEARED, 20))
+        self.assertEqual(
+            (ask.status, ask.filled_quantity), (Transaction.Status.PENDING, 5))
+        self.assertEqual(
+            Trade.objects.filter(stock=self.stock_resident, type=Transaction.Type.BUY
+                                 ).aggregate(Sum('quantity'))['quantity__sum'], 20)
+
+    def test_persister_keeps_running(self):
+        """
+        Journal persister should retry a failed batch and keep persisting.
+
+        :return:
+        """
+        persister = JournalPersister(interval=0.01)
+        fill = FillOrder(
+            1, self.stock_resident.pk, uuid.uuid4(), uuid.uuid4(), 10, Decimal(100), 0, 0)
+        with mock.patch.object(
+                JournalPersister, 'persist', side_effect=[RuntimeError('persist'), 1]) as persist, \
+                self.assertLogs('core.matcher', 'ERROR'):
+            persister.start()
+            persister.put([fill])
+            persister.wait()
+            self.assertTrue(persister.is_alive())
+            persister.stop()
+
+        self.assertEqual(persist.call_count, 2)
+        self.assertEqual(persister.persisted, 1)
@@ -0,0 +1,682 @@
+# Stock Trading
+# Created by Maximillian M. Estrada on 2026-10-18
+
+import io
+import queue
+import random
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import partial
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.engine import BookOrder, Fill, clearing_price
+from core.events import ORDER_CHANNEL, Listener, notify
+from core.locks import get_lock_key
+from core.models import *
+from core.services import TransactionService, CandleService, TickService, MATCHING_LOCK
+from core.tests.helpers import (
+    UserTestHelper,
+    StockTestHelper,
+    OrderTestHelper,
+)
+
+
+class MatchingTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            UserTestHelper.create_test_user(username=f"testuser{i:02}")
+            for i in range(4)]
+        self.stock_query = StockTestHelper.create_test_stock()
+        self.stock_book = StockTestHelper.create_test_stock(
+            **StockTestHelper.STOCK_DATA_2)
+
+    def create_test_flow(self, count=60, seed=7):
+        """
+        Create the same order flow for both stocks.
+
+        :param count:
+        :param seed:
+        :return:
+        """
+        rand = random.Random(seed)
+        for i in range(count):
+            data = {
+                'user': rand.choice(self.users),
+                'type': rand.choice([Transaction.Type.BUY, Transaction.Type.SELL]),
+                'quantity': rand.randint(1, 10) * 10,
+                'price': Decimal(rand.randint(95, 105)),
+            }
+            OrderTestHelper.create_test_order(stock=self.stock_query, **data)
+            OrderTestHelper.create_test_order(stock=self.stock_book, **data)
+
+    @staticmethod
+    def get_results(stock):
+        trades = sorted(
+            Trade.objects.filter(stock=stock).values_list(
+                'user__username', 'type', 'quantity', 'price', 'amount'))
+        orders = sorted(
+            (t.user.username, t.type, t.quantity, t.price, t.status, t.remainder_quantity())
+            for t in Transaction.objects.filter(stock=stock, is_order=True))
+        portfolios = sorted(
+            Portfolio.objects.filter(stock=stock).values_list(
+                'user__username', 'total_share', 'total_value', 'average_price'))
+        stock.refresh_from_db()
+        return trades, orders, portfolios, stock.price
+
+    def test_book_engine_same_trades(self):
+        """
+        Order book engine should produce the same trades as the query engine.
+
+        :return:
+        """
+        self.create_test_flow()
+
+        TransactionService.process_order_transaction(
+            self.stock_query.code, engine=TransactionService.Engine.QUERY)
+        TransactionService.process_order_transaction(
+            self.stock_book.code, engine=TransactionService.Engine.BOOK)
+
+        trades, orders, portfolios, price = self.get_results(self.stock_query)
+        self.assertTrue(trades, "Order flow should produce trades.")
+        self.assertEqual(
+            (trades, orders, portfolios, price),
+            self.get_results(self.stock_book))
+
+    def test_book_engine_resumes_partial_fills(self):
+        """
+        Order book engine should continue from partially filled orders.
+
+        :return:
+        """
+        self.create_test_flow(count=30, seed=11)
+        TransactionService.process_order_transaction(
+            self.stock_query.code, engine=TransactionService.Engine.QUERY)
+        TransactionService.process_order_transaction(
+            self.stock_book.code, engine=TransactionService.Engine.BOOK)
+
+        self.create_test_flow(count=30, seed=12)
+        TransactionService.process_order_transaction(
+            self.stock_query.code, engine=TransactionService.Engine.QUERY, full=True)
+        TransactionService.process_order_transaction(
+            self.stock_book.code, engine=TransactionService.Engine.BOOK, full=True)
+
+        self.assertEqual(
+            self.get_results(self.stock_query),
+            self.get_results(self.stock_book))
+
+    def test_book_engine_no_self_trade(self):
+        """
+        Order book engine should not match orders of the same user.
+
+        :return:
+        """
+        user = self.users[0]
+        OrderTestHelper.create_test_order(
+            user=user, stock=self.stock_book, type=Transaction.Type.BUY, price=100)
+        OrderTestHelper.create_test_order(
+            user=user, stock=self.stock_book, type=Transaction.Type.SELL, price=100)
+
+        fills = TransactionService.process_order_book(self.stock_book)
+        self.assertEqual(fills, [])
+        self.assertEqual(Order.objects.filter(stock=self.stock_book).count(), 2)
+
+    def test_filled_quantity(self):
+        """
+        Matching should keep the filled quantity of the orders.
+
+        :return:
+        """
+        buy = OrderTestHelper.create_test_order(
+            user=self.users[0], stock=self.stock_query,
+            type=Transaction.Type.BUY, quantity=50, price=100)
+        sell = OrderTestHelper.create_test_order(
+            user=self.users[1], stock=self.stock_query,
+            type=Transaction.Type.SELL, quantity=20, price=100)
+
+        TransactionService.process_order_transaction(self.stock_query.code)
+
+        buy.refresh_from_db()
+        sell.refresh_from_db()
+        self.assertEqual(buy.filled_quantity, 20)
+        self.assertEqual(buy.remainder_quantity(), 30)
+        self.assertEqual(buy.status, Transaction.Status.PENDING)
+        self.assertEqual(sell.filled_quantity, 20)
+        self.assertEqual(sell.status, Transaction.Status.CLEARED)
+        self.assertEqual(
+            buy.trades.aggregate(Sum('quantity'))['quantity__sum'],
+            buy.filled_quantity)
+        self.assertEqual(
+            list(Order.objects.filter(
+                stock=self.stock_query, filled_quantity__gt=0)),
+            [buy])
+
+    @skipUnless(connection.vendor == 'postgresql', "Query counts are of PostgreSQL.")
+    def test_book_engine_batched_queries(self):
+        """
+        Order book engine should persist a matching pass with a fixed number of queries.
+
+        :return:
+        """
+        self.create_test_flow(count=100, seed=5)
+
+        # the savepoints of the pass and of the fills (4), the locked orders,
+        # and the fills persisted in one query each: trades, trade links,
+        # orders, stock price, portfolios read and insert, book levels
+        # upsert and delete, minute candle and ticks, and the orders marked
+        # matched, the stock row is not locked under the matching lock
+        with self.assertNumQueries(16):
+            fills = TransactionService.process_order_book(self.stock_book)
+
+        self.assertGreater(len(fills), 20)
+
+    @skipUnless(connection.vendor == 'postgresql', "Benchmark requires PostgreSQL.")
+    def test_benchmark_transaction_indexes(self):
+        """
+        Index benchmark should insert its rows with the current transactions schema,
+        and roll them back.
+
+        :return:
+        """
+        stdout = io.StringIO()
+        call_command(
+            'benchmark_transaction_indexes', rows=100, stocks=2, users=3, stdout=stdout)
+
+        for name in ('match_bids', 'match_asks', 'pending_orders', 'trade_list_user'):
+            self.assertIn(name, stdout.getvalue())
+        self.assertFalse(Stock.objects.filter(code__startswith='Z').exists())
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_query_engine_coalesced_price(self):
+        """
+        Query engine should set the stock price once per matching pass.
+
+        :return:
+        """
+        self.create_test_flow(count=40, seed=9)
+
+        with CaptureQueriesContext(connection) as queries:
+            fills = TransactionService.process_order_query(self.stock_query)
+
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "core_stocks"')]
+        self.assertGreater(len(fills), 1)
+        self.assertEqual(len(updates), 1)
+        self.stock_query.refresh_from_db()
+        self.assertEqual(self.stock_query.price, fills[-1].price)
+
+    @staticmethod
+    def create_test_fill(quantity, price):
+        price = Decimal(price)
+        return Fill(
+            BookOrder(uuid.uuid4(), 1, Transaction.Type.BUY, price, None, 0),
+            BookOrder(uuid.uuid4(), 2, Transaction.Type.SELL, price, None, 0),
+            quantity, price)
+
+    def test_candles(self):
+        """
+        Matching passes should merge into the minute candles, rolled up to the coarser candles.
+
+        :return:
+        """
+        self.create_test_flow(count=40, seed=11)
+        fills = TransactionService.process_order_book(self.stock_book)
+        candle = Candle.objects.get(stock=self.stock_book, interval=Candle.Interval.MINUTE)
+        prices = [f.price for f in fills]
+        self.assertEqual(
+            (candle.open, candle.high, candle.low, candle.close, candle.volume, candle.trades),
+            (prices[0], max(prices), min(prices), prices[-1],
+             sum(f.quantity for f in fills), len(fills)))
+
+        start = datetime(2026, 10, 16, 23, 58, tzinfo=dt_timezone.utc)
+        passes = [
+            (start, [(10, 100), (20, 102)]),
+            (start + timedelta(seconds=30), [(5, 99)]),
+            (start + timedelta(seconds=90), [(10, 101)]),
+            (start + timedelta(minutes=3), [(30, 104), (10, 103)]),
+        ]
+        for time, prints in passes:
+            CandleService.update_candles(
+                self.stock_query, [self.create_test_fill(*p) for p in prints], time)
+
+        since = start.replace(year=2000)
+        expected = {
+            Candle.Interval.MINUTE: [
+                (start, 100, 102, 99, 99, 35, 3),
+                (start + timedelta(minutes=1), 101, 101, 101, 101, 10, 1),
+                (start + timedelta(minutes=3), 104, 104, 103, 103, 40, 2)],
+            Candle.Interval.FIVE_MINUTES: [
+                (start - timedelta(minutes=3), 100, 102, 99, 101, 45, 4),
+                (start + timedelta(minutes=2), 104, 104, 103, 103, 40, 2)],
+            Candle.Interval.HOUR: [
+                (start - timedelta(minutes=58), 100, 102, 99, 101, 45, 4),
+                (start + timedelta(minutes=2), 104, 104, 103, 103, 40, 2)],
+            Candle.Interval.DAY: [
+                (start.replace(hour=0, minute=0), 100, 102, 99, 101, 45, 4),
+                (start + timedelta(minutes=2), 104, 104, 103, 103, 40, 2)],
+        }
+        # rollups are idempotent
+        for i in range(2):
+            CandleService.rollup_candles(since)
+            for interval, candles in expected.items():
+                self.assertEqual([
+                    (c.start, c.open, c.high, c.low, c.close, c.volume, c.trades)
+                    for c in CandleService.get_candles(self.stock_query, interval)
+                ], candles, interval)
+
+    def test_ticks(self):
+        """
+        Matching passes should append a tick for each fill, in fill order.
+
+        :return:
+        """
+        self.create_test_flow(count=40, seed=13)
+        fills = TransactionService.process_order_book(self.stock_book)
+
+        ticks = list(TickService.get_ticks(self.stock_book))
+        self.assertEqual(
+            [(t.price, t.quantity) for t in ticks],
+            [(f.price, f.quantity) for f in fills])
+        self.assertFalse(TickService.get_ticks(self.stock_book, start=ticks[-1].time + timedelta(seconds=1)))
+
+    @skipUnless(connection.vendor == 'postgresql', "Ticks are partitioned on PostgreSQL only.")
+    def test_tick_partitions(self):
+        """
+        Ticks should be stored in their day partition, old partitions detached.
+
+        :return:
+        """
+        day = datetime(2026, 1, 10, tzinfo=dt_timezone.utc)
+        fill = self.create_test_fill(10, 100)
+        TickService.append_ticks(self.stock_query, [fill], day + timedelta(hours=12))
+
+        def get_partitions():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT tableoid::regclass::text FROM core_ticks ORDER BY id')
+                return [row[0] for row in cursor.fetchall()]
+
+        self.assertEqual(get_partitions(), ['core_ticks_default'])
+        self.assertEqual(
+            TickService.create_partitions(day.date(), 2),
+            ['core_ticks_p20260110', 'core_ticks_p20260111'])
+        self.assertEqual(TickService.create_partitions(day.date(), 2), [])
+        TickService.append_ticks(self.stock_query, [fill], day + timedelta(hours=36))
+        self.assertEqual(get_partitions(), ['core_ticks_p20260110', 'core_ticks_p20260111'])
+
+        self.assertEqual(
+            TickService.detach_partitions(day.date() + timedelta(days=1), drop=True),
+            ['core_ticks_p20260110'])
+        self.assertEqual(get_partitions(), ['core_ticks_p20260111'])
+
+    def test_incremental_same_trades(self):
+        """
+        Incremental matching should produce the same trades with both engines.
+
+        :return:
+        """
+        self.create_test_flow(count=40, seed=21)
+        TransactionService.process_order_transaction(
+            self.stock_query.code, engine=TransactionService.Engine.QUERY)
+        TransactionService.process_order_transaction(
+            self.stock_book.code, engine=TransactionService.Engine.BOOK)
+
+        self.create_test_flow(count=40, seed=22)
+        TransactionService.process_order_transaction(
+            self.stock_query.code, engine=TransactionService.Engine.QUERY)
+        TransactionService.process_order_transaction(
+            self.stock_book.code, engine=TransactionService.Engine.BOOK)
+
+        self.assertEqual(
+            self.get_results(self.stock_query),
+            self.get_results(self.stock_book))
+        watermark = MatchingWatermark.objects.get(stock=self.stock_book)
+        self.assertEqual(
+            (watermark.best_bid, watermark.best_ask),
+            TransactionService.get_best_prices(self.stock_book))
+
+    def test_incremental_same_as_full(self):
+        """
+        Incremental matching should produce the trades and prices of full matching.
+
+        :return:
+        """
+        # the older order of a crossing pair is the aggressor, as in a full pass
+        for stock, engine in (
+                (self.stock_query, TransactionService.Engine.QUERY),
+                (self.stock_book, TransactionService.Engine.BOOK)):
+            OrderTestHelper.create_test_order(
+                user=self.users[0], stock=stock,
+                type=Transaction.Type.BUY, quantity=10, price=Decimal(100))
+            TransactionService.process_stock_order_transaction(stock.code, engine)
+            OrderTestHelper.create_test_order(
+                user=self.users[1], stock=stock,
+                type=Transaction.Type.SELL, quantity=10, price=Decimal(99))
+            TransactionService.process_stock_order_transaction(stock.code, engine)
+            self.assertEqual(
+                list(Trade.objects.filter(stock=stock).values_list('price', flat=True)),
+                [Decimal(99), Decimal(99)])
+
+        rand = random.Random(24)
+        for i in range(60):
+            data = {
+                'user': rand.choice(self.users),
+                'type': rand.choice([Transaction.Type.BUY, Transaction.Type.SELL]),
+                'quantity': rand.randint(1, 10) * 10,
+                'price': Decimal(rand.randint(95, 105)),
+            }
+            OrderTestHelper.create_test_order(stock=self.stock_query, **data)
+            OrderTestHelper.create_test_order(stock=self.stock_book, **data)
+            TransactionService.process_stock_order_transaction(
+                self.stock_query.code, TransactionService.Engine.QUERY)
+            TransactionService.process_stock_order_transaction(
+                self.stock_book.code, TransactionService.Engine.BOOK, full=True)
+
+        self.assertEqual(
+            self.get_results(self.stock_query),
+            self.get_results(self.stock_book))
+
+    def test_incremental_late_commit(self):
+        """
+        Incremental matching should match an order committed long after its
+        `modified` time, as bulk copied orders with client timestamps.
+
+        :return:
+        """
+        for stock, engine in (
+                (self.stock_query, TransactionService.Engine.QUERY),
+                (self.stock_book, TransactionService.Engine.BOOK)):
+            OrderTestHelper.create_test_order(
+                user=self.users[0], stock=stock,
+                type=Transaction.Type.BUY, quantity=10, price=Decimal(100))
+            TransactionService.process_stock_order_transaction(stock.code, engine)
+
+            sell = OrderTestHelper.create_test_order(
+                user=self.users[1], stock=stock,
+                type=Transaction.Type.SELL, quantity=10, price=Decimal(100))
+            Transaction.objects.filter(pk=sell.pk).update(
+                modified=timezone.now() - timedelta(hours=1))
+            TransactionService.process_stock_order_transaction(stock.code, engine)
+
+            self.assertEqual(Trade.objects.filter(stock=stock).count(), 2)
+            self.assertFalse(Order.objects.filter(stock=stock).exists())
+
+    def test_incremental_matched(self):
+        """
+        Matched orders should be matched again once changed.
+
+        :return:
+        """
+        buy = OrderTestHelper.create_test_order(
+            user=self.users[0], stock=self.stock_book,
+            type=Transaction.Type.BUY, quantity=10, price=Decimal(99))
+        OrderTestHelper.create_test_order(
+            user=self.users[1], stock=self.stock_book,
+            type=Transaction.Type.SELL, quantity=10, price=Decimal(100))
+        TransactionService.process_stock_order_transaction(
+            self.stock_book.code, TransactionService.Engine.BOOK)
+        self.assertFalse(Order.objects.filter(stock=self.stock_book, matched=False).exists())
+
+        buy.price = Decimal(100)
+        buy.save()
+        self.assertEqual(
+            list(Order.objects.filter(stock=self.stock_book, matched=False)), [buy])
+        TransactionService.process_stock_order_transaction(
+            self.stock_book.code, TransactionService.Engine.BOOK)
+        self.assertEqual(Trade.objects.filter(stock=self.stock_book).count(), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', "Query counts are of PostgreSQL.")
+    def test_incremental_skip_no_cross(self):
+        """
+        Incremental matching should not load the book when new orders can not cross.
+
+        :return:
+        """
+        self.create_test_flow(count=40, seed=23)
+        TransactionService.process_stock_order_transaction(
+            self.stock_book.code, TransactionService.Engine.BOOK)
+        watermark = MatchingWatermark.objects.get(stock=self.stock_book)
+
+        OrderTestHelper.create_test_order(
+            user=self.users[0], stock=self.stock_book,
+            type=Transaction.Type.BUY, price=watermark.best_ask - 1)
+
+        # the stock lock, stock, watermark and its stock, the unmatched order
+        # locked and marked matched in a savepoint, the best prices and the
+        # watermark, without loading the book
+        with self.assertNumQueries(12):
+            fills = TransactionService.process_stock_order_transaction(
+                self.stock_book.code, TransactionService.Engine.BOOK)
+
+        self.assertEqual(fills, 0)
+        self.assertFalse(Order.objects.filter(stock=self.stock_book, matched=False).exists())
+        watermark.refresh_from_db()
+        self.assertEqual(watermark.best_ask, TransactionService.get_best_prices(self.stock_book)[1])
+
+    def test_book_levels(self):
+        """
+        Matching should keep the book levels equal to the pending orders by price level.
+
+        :return:
+        """
+        self.create_test_flow(count=60, seed=41)
+        TransactionService.process_order_transaction(
+            self.stock_query.code, engine=TransactionService.Engine.QUERY)
+        TransactionService.process_order_transaction(
+            self.stock_book.code, engine=TransactionService.Engine.BOOK)
+
+        for stock in (self.stock_query, self.stock_book):
+            expected = {}
+            for order in Order.objects.filter(stock=stock):
+                quantity, orders = expected.get((order.type, order.price), (0, 0))
+                expected[(order.type, order.price)] = (
+                    quantity + order.remainder_quantity(), orders + 1)
+            self.assertEqual(
+                {(level.type, level.price): (level.quantity, level.orders)
+                 for level in BookLevel.objects.filter(stock=stock)},
+                expected)
+
+    def test_book_levels_save(self):
+        """
+        Saving transactions should move the orders in the book levels, without
+        reading the previous order of the trades and cleared orders.
+
+        :return:
+        """
+        order = Order.objects.create(
+            user=self.users[0], stock=self.stock_book, type=Transaction.Type.BUY, quantity=10, price=Decimal('100.00'))
+        trade = Transaction.objects.create(
+            user=self.users[0], stock=self.stock_book, type=Transaction.Type.BUY, quantity=10,
+            price=Decimal('100.00'), is_order=False, status=Transaction.Status.CLEARED)
+        self.assertEqual(
+            list(BookLevel.objects.filter(stock=self.stock_book).values_list('quantity', 'orders')),
+            [(10, 1)])
+
+        order = Transaction.objects.get(pk=order.pk)
+        with CaptureQueriesContext(connection) as queries:
+            trade.save()
+            TransactionService.clear_transaction(order)
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'core_transactions' in q['sql']])
+        self.assertFalse(BookLevel.objects.filter(stock=self.stock_book).exists())
+
+    def test_auction_clearing_price(self):
+        """
+        Auction clearing price should execute the most volume.
+
+        :return:
+        """
+        book = [
+            (Transaction.Type.BUY, 101, 30),
+            (Transaction.Type.BUY, 100, 20),
+            (Transaction.Type.BUY, 99, 50),
+            (Transaction.Type.SELL, 98, 20),
+            (Transaction.Type.SELL, 100, 30),
+            (Transaction.Type.SELL, 102, 40),
+        ]
+        orders = [
+            BookOrder(i, i, type, Decimal(price), i, quantity)
+            for i, (type, price, quantity) in enumerate(book)]
+
+        self.assertEqual(clearing_price(orders), (Decimal('100.00'), 50))
+        self.assertEqual(clearing_price(orders[:3]), (None, 0))
+
+    def test_auction_engine(self):
+        """
+        Auction engine should clear every crossing order at a single price.
+
+        :return:
+        """
+        self.create_test_flow(count=60, seed=31)
+
+        fills = TransactionService.process_stock_order_transaction(
+            self.stock_book.code, TransactionService.Engine.AUCTION)
+
+        trades = Trade.objects.filter(stock=self.stock_book)
+        prices = set(trades.values_list('price', flat=True))
+        self.assertGreater(fills, 0)
+        self.assertEqual(len(prices), 1)
+        self.stock_book.refresh_from_db()
+        self.assertEqual(self.stock_book.price, prices.pop())
+        self.assertEqual(
+            trades.filter(type=Transaction.Type.BUY).aggregate(Sum('quantity')),
+            trades.filter(type=Transaction.Type.SELL).aggregate(Sum('quantity')))
+        for order in Order.objects.filter(stock=self.stock_book):
+            self.assertLessEqual(order.filled_quantity, order.quantity)
+            self.assertEqual(
+                order.trades.aggregate(Sum('quantity'))['quantity__sum'] or 0,
+                order.filled_quantity)
+
+    @skipUnless(connection.vendor == 'postgresql', "Advisory locks require PostgreSQL.")
+    def test_skip_locked_stock(self):
+        """
+        Matching should skip the stock locked by another process.
+
+        :return:
+        """
+        self.create_test_flow(count=20)
+        other = connection.copy()
+        try:
+            with other.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_lock(%s)",
+                    [get_lock_key(MATCHING_LOCK, self.stock_book.code)])
+
+            TransactionService.process_order_transaction(None)
+        finally:
+            other.close()
+
+        self.assertTrue(Trade.objects.filter(stock=self.stock_query).exists())
+        self.assertFalse(Trade.objects.filter(stock=self.stock_book).exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', "Row locks require PostgreSQL.")
+class ConcurrentMatchingTestCase(TransactionTestCase):
+    WORKERS = 6
+
+    def setUp(self):
+        users = [
+            UserTestHelper.create_test_user(username=f"testuser{i:02}")
+            for i in range(4)]
+        self.stock = StockTestHelper.create_test_stock()
+
+        rand = random.Random(3)
+        for i in range(200):
+            OrderTestHelper.create_test_order(
+                user=rand.choice(users),
+                stock=self.stock,
+                type=rand.choice([Transaction.Type.BUY, Transaction.Type.SELL]),
+                quantity=rand.randint(1, 10) * 10,
+                price=Decimal(rand.randint(95, 105)))
+
+    def run_worker(self, engine, barrier, errors):
+        try:
+            barrier.wait()
+            if engine == TransactionService.Engine.BOOK:
+                TransactionService.process_order_book(self.stock)
+            else:
+                TransactionService.process_order_query(self.stock)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_concurrent_workers_no_over_fill(self):
+        """
+        Matchers running concurrently on the same stock should not over-fill orders.
+
+        :return:
+        """
+        barrier = threading.Barrier(self.WORKERS)
+        errors = []
+        engines = [TransactionService.Engine.QUERY, TransactionService.Engine.BOOK]
+        workers = [
+            threading.Thread(
+                target=self.run_worker,
+                args=(engines[i % len(engines)], barrier, errors))
+            for i in range(self.WORKERS)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        trades = Trade.objects.filter(stock=self.stock)
+        self.assertTrue(trades.exists(), "Order flow should produce trades.")
+        self.assertEqual(
+            trades.filter(type=Transaction.Type.BUY).aggregate(Sum('quantity')),
+            trades.filter(type=Transaction.Type.SELL).aggregate(Sum('quantity')))
+
+        for order in Order.objects.filter(stock=self.stock):
+            self.assertLessEqual(order.filled_quantity, order.quantity)
+            self.assertEqual(
+                order.trades.aggregate(Sum('quantity'))['quantity__sum'] or 0,
+                order.filled_quantity)
+            self.assertEqual(
+                order.status == Transaction.Status.CLEARED,
+                order.filled_quantity == order.quantity)
+
+        for portfolio in Portfolio.objects.filter(stock=self.stock):
+            self.assertEqual(
+                portfolio.total_share,
+                trades.filter(user=portfolio.user).aggregate(Sum('quantity'))['quantity__sum'])
+
+
+class OrderEventTestCase(TransactionTestCase):
+    def test_notify_order(self):
+        """
+        Placing an order should notify the order matcher of its stock.
+
+        :return:
+        """
+        listener = Listener(ORDER_CHANNEL)
+        listener.listen()
+        stock = StockTestHelper.create_test_stock()
+        OrderTestHelper.create_test_order(
+            user=UserTestHelper.create_test_user(), stock=stock)
+
+        payloads = listener.wait(timeout=1)
+        self.assertEqual(payloads[ORDER_CHANNEL], {stock.code})
+
+    def test_notify_local_bounded(self):
+        """
+        Notifying without LISTEN/NOTIFY should keep the latest payloads of
+        a channel nothing drains.
+
+        :return:
+        """
+        channels = defaultdict(partial(queue.Queue, 3))
+        with mock.patch.object(connections['default'], 'vendor', 'sqlite'), \
+                mock.patch('core.events.local_channels', channels):
+            for i in range(5):
+                notify(ORDER_CHANNEL, f"STOCK{i}")
+            self.assertEqual(channels[ORDER_CHANNEL].qsize(), 3)
+            self.assertEqual(
+                Listener(ORDER_CHANNEL).receive(timeout=0),
+                [(ORDER_CHANNEL, f"STOCK{i}") for i in range(2, 5)])
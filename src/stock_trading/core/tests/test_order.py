@@ -1,12 +1,38 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-15
 
+import io
+import json
+import os
+import tempfile
 import uuid
-
+from datetime import timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from unittest import skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework.test import APITestCase
 
+from core.models import Stock, Order, Transaction, BookLevel, BulkOrderJob, BULK_ORDER_JOBS_DIR
+from core.services import (
+    TransactionService,
+    BulkOrderJobService,
+    StockService,
+    BULK_ORDER_JOB_TIMEOUT,
+    generate_uuid,
+    get_checksum,
+    stock_references,
+)
 from core.tests.mixins import APITestCaseMixin
 from core.tests.helpers import (
     UserTestHelper,
@@ -42,6 +68,70 @@ class OrderAPITestCase(APITestCaseMixin, APITestCase):
         self.client.force_login(UserTestHelper.create_test_super_user())
         self.assertUserCanView(reverse(OrderTestHelper.API_NAME_ORDER_LIST))
 
+    def test_list_order_stock_references(self):
+        """
+        Listing and creating orders should resolve the stocks from the stock references.
+
+        :return:
+        """
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+        for i in range(3):
+            OrderTestHelper.create_test_order(user, stock)
+        url = reverse(OrderTestHelper.API_NAME_ORDER_LIST)
+        self.client.force_login(user)
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            self.client.post(url, {**OrderTestHelper.ORDER_DATA_1, 'stock': stock.pk})
+        self.assertFalse([q for q in queries if 'FROM "core_stocks"' in q['sql']])
+        self.assertEqual(
+            response.data['results'][0]['stock'],
+            {'id': str(stock.pk), 'code': stock.code, 'name': stock.name})
+
+        # saved stocks invalidate the references
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.name = 'Apple Inc.'
+            stock.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['stock']['name'], 'Apple Inc.')
+
+        response = self.client.post(url, {**OrderTestHelper.ORDER_DATA_1, 'stock': uuid.uuid4()})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {**OrderTestHelper.ORDER_DATA_1, 'stock': 'APP'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stock_references_local_cache(self):
+        """
+        Stock references with a process-local cache should reload the stocks
+        changed by another process, from the stocks table.
+
+        :return:
+        """
+        stock = StockTestHelper.create_test_stock()
+        self.assertEqual(StockService.get_stock(pk=stock.pk).name, stock.name)
+
+        # trades set the stock prices without reloading the stocks
+        StockService.update_prices({stock.pk: Decimal('101.00')})
+        stock_references.checked -= stock_references.check_interval
+        with self.assertNumQueries(1):
+            StockService.get_stock(pk=stock.pk)
+
+        # saved by another process, without the signals of this process
+        Stock.objects.filter(pk=stock.pk).update(name='Apple Inc.', version=F('version') + 1)
+        self.assertEqual(StockService.get_stock(pk=stock.pk).name, stock.name)
+        stock_references.checked -= stock_references.check_interval
+        self.assertEqual(StockService.get_stock(pk=stock.pk).name, 'Apple Inc.')
+
+        # a shared cache is checked for the stock version instead
+        with self.settings(CACHE_SHARED=True):
+            stock_references.clear()
+            StockService.get_stock(pk=stock.pk)
+            Stock.objects.filter(pk=stock.pk).update(name='Apple', version=F('version') + 1)
+            stock_references.checked -= stock_references.check_interval
+            self.assertEqual(StockService.get_stock(pk=stock.pk).name, 'Apple Inc.')
+
     def test_create_order(self):
         """
         Creating order without authenticated user, should not be allow.
@@ -107,6 +197,353 @@ class OrderAPITestCase(APITestCaseMixin, APITestCase):
         self.assertEqual(
             float(response.data.get('amount', 0.00)),
             order_data.get('quantity') * order_data.get('price'))
+        self.assertNotIn('matched', response.data)
+
+    def test_create_bulk_order(self):
+        """
+        Creating bulk orders should skip the invalid lines, and insert the
+        orders and their book levels without a query per line.
+
+        :return:
+        """
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+        lines = ["TYPE,STOCK,QUANTITY,PRICE"] + [
+            f"{'Buy' if i % 2 else 'Sell'},{stock.code},{i + 1},{100 + i % 2}.25"
+            for i in range(200)] + [
+            "Buy,ZZZZ,10,100",
+            "Hold,APP,10,100",
+            f"Buy,{stock.code},-10,100",
+            f"Buy,{stock.code},1.5,100",
+            f"Sell,{stock.code},10,0",
+        ]
+        file = SimpleUploadedFile("orders.csv", "\n".join(lines).encode(), "text/csv")
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse(OrderTestHelper.API_NAME_ORDER_BULK, args=["orders.csv"]),
+                {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(len(queries), 20)
+        self.assertEqual(response.data, {
+            'filename': "orders.csv",
+            'rows_processed': 205,
+            'rows_rejected': 5,
+            'rows_duplicated': 0,
+            'orders_created': 200,
+            'job': None,
+        })
+
+        orders = Order.objects.filter(user=user)
+        self.assertEqual(orders.count(), 200)
+        for order in orders:
+            self.assertEqual(order.amount, order.quantity * order.price)
+        self.assertEqual(
+            sorted(BookLevel.objects.filter(stock=stock).values_list('type', 'price', 'quantity', 'orders')),
+            [
+                (Transaction.Type.BUY, Decimal('101.25'), sum(range(2, 201, 2)), 100),
+                (Transaction.Type.SELL, Decimal('100.25'), sum(range(1, 200, 2)), 100),
+            ])
+
+    def test_stream_bulk_order(self):
+        """
+        Streaming bulk orders should commit the file chunk by chunk, and keep
+        the chunks read before a malformed line.
+
+        :return:
+        """
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+        lines = ["TYPE,STOCK,QUANTITY,PRICE"] + [
+            f"Buy,{stock.code},{i + 1},100" for i in range(5)] + [
+            f"Buy,\"{stock.code},1,100"]
+        file = io.BytesIO("\n".join(lines).encode())
+
+        chunks = list(TransactionService.stream_bulk_orders(user, "orders.csv", file, chunksize=2))
+        self.assertEqual([(rows, len(pks)) for rows, pks, _ in chunks], [(2, 2), (2, 2)])
+        self.assertEqual(
+            sorted(Order.objects.filter(user=user).values_list('quantity', flat=True)),
+            [1, 2, 3, 4])
+
+    @skipUnless(connection.vendor == 'postgresql', "COPY requires PostgreSQL.")
+    def test_copy_bulk_order(self):
+        """
+        Copying bulk orders should create the same orders as `bulk_create`,
+        in the order of the lines.
+
+        :return:
+        """
+        users = [
+            UserTestHelper.create_test_user(username=f"testuser{i:02}")
+            for i in range(2)]
+        stock = StockTestHelper.create_test_stock()
+        lines = ["TYPE,STOCK,QUANTITY,PRICE"] + [
+            f"{'Buy' if i % 3 else 'Sell'},{stock.code},{i + 1},{90 + i}.{i:02}"
+            for i in range(30)] + [
+            f"Buy,{stock.code},0,100"]
+
+        results = []
+        for user, ingest in zip(users, [c[0] for c in TransactionService.Ingest.CHOICES]):
+            TransactionService.bulk_orders(
+                user, "orders.csv", io.BytesIO("\n".join(lines).encode()), ingest=ingest)
+            results.append(list(Order.objects.filter(user=user).order_by('created').values_list(
+                'is_order', 'status', 'type', 'stock', 'quantity', 'price', 'amount', 'filled_quantity')))
+        self.assertEqual(len(results[0]), 30)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(
+            [r[4] for r in results[1]],
+            list(range(1, 31)))
+        self.assertEqual(
+            BookLevel.objects.get(stock=stock, price=Decimal('119.29')).quantity, 2 * 30)
+
+    def test_create_bulk_order_job(self):
+        """
+        Creating bulk orders as a job should return the job, processed by the
+        bulk order worker, and report its progress to the owner only.
+
+        :return:
+        """
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+        lines = ["TYPE,STOCK,QUANTITY,PRICE"] + [
+            f"Buy,{stock.code},{i + 1},100" for i in range(5)] + [
+            "Buy,ZZZZ,10,100"]
+        file = SimpleUploadedFile("orders.csv", "\n".join(lines).encode(), "text/csv")
+        self.client.force_login(user)
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            response = self.client.post(
+                reverse(OrderTestHelper.API_NAME_ORDER_BULK, args=["orders.csv"]),
+                {'file': file, 'to_job': True}, format='multipart')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['status'], BulkOrderJob.Status.PENDING)
+            self.assertFalse(Order.objects.filter(user=user).exists())
+
+            url = reverse(OrderTestHelper.API_NAME_ORDER_BULK_JOB, args=[response.data['id']])
+            self.assertEqual(response['Location'], url)
+            self.assertEqual(BulkOrderJobService.process_jobs(chunksize=2), 1)
+            self.assertEqual(BulkOrderJobService.process_jobs(), 0)
+            self.assertFalse(os.listdir(os.path.join(media, BULK_ORDER_JOBS_DIR, response.data['id'])))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], BulkOrderJob.Status.COMPLETED)
+        self.assertEqual(response.data['rows_processed'], 6)
+        self.assertEqual(response.data['rows_rejected'], 1)
+        self.assertEqual(response.data['orders_created'], 5)
+        self.assertIsNotNone(response.data['throughput'])
+        self.assertEqual(Order.objects.filter(user=user).count(), 5)
+
+        self.client.force_login(UserTestHelper.create_test_user(username='testuser2'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_process_stored_bulk_order(self):
+        """
+        Processing the stored bulk order files should create a job per file,
+        claim each job once, and resume a timed out job after its processed lines.
+
+        :return:
+        """
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+
+        def content(price):
+            return "\n".join(["TYPE,STOCK,QUANTITY,PRICE"] + [
+                f"Buy,{stock.code},{i + 1},{price}" for i in range(6)]).encode()
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            default_storage.save(f"{user.pk}/orders.csv", ContentFile(content(100)))
+            call_command('process_bulk_order_file', workers=1, stdout=io.StringIO())
+            self.assertFalse(default_storage.exists(f"{user.pk}/orders.csv"))
+            job = BulkOrderJob.objects.get(user=user)
+            self.assertEqual(job.status, BulkOrderJob.Status.COMPLETED)
+            self.assertEqual(job.rows_processed, 6)
+
+            jobs = [BulkOrderJobService.create_job(user, f"orders{i}.csv", ContentFile(content(101 + i)))
+                    for i in range(2)]
+            claimed = [BulkOrderJobService.claim_job() for i in range(3)]
+            self.assertEqual([j and j.pk for j in claimed], [jobs[0].pk, jobs[1].pk, None])
+
+            # the worker of the first job died after committing 4 lines
+            BulkOrderJob.objects.filter(pk=jobs[0].pk).update(
+                rows_processed=4,
+                modified=timezone.now() - BULK_ORDER_JOB_TIMEOUT - timedelta(seconds=1))
+            self.assertEqual(BulkOrderJobService.claim_job().pk, jobs[0].pk)
+            BulkOrderJobService.run_job(BulkOrderJob.objects.get(pk=jobs[0].pk))
+
+        self.assertEqual(
+            sorted(Order.objects.filter(user=user).values_list('quantity', flat=True)),
+            [1, 2, 3, 4, 5, 5, 6, 6])
+
+    def test_create_bulk_order_once(self):
+        """
+        Creating bulk orders of the same file again should return the same
+        job, without inserting the orders or book levels again, and report
+        the lines as already inserted.
+
+        :return:
+        """
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+        content = "\n".join(["TYPE,STOCK,QUANTITY,PRICE"] + [
+            f"Buy,{stock.code},{i + 1},100" for i in range(5)] + [
+            "Buy,ZZZZ,10,100"]).encode()
+        url = reverse(OrderTestHelper.API_NAME_ORDER_BULK, args=["orders.csv"])
+        self.client.force_login(user)
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            streams = []
+            for i in range(2):
+                response = self.client.post(
+                    url, {'file': SimpleUploadedFile("orders.csv", content, "text/csv")},
+                    format='multipart', HTTP_ACCEPT='application/x-ndjson')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                streams.append([json.loads(line) for line in b"".join(response.streaming_content).splitlines()])
+            self.assertEqual(
+                [line['id'] for line in streams[0][:-1]],
+                [str(pk) for pk in Order.objects.filter(user=user).order_by('quantity').values_list('pk', flat=True)])
+            self.assertEqual(len(streams[1]), 1)
+            self.assertEqual(streams[1][0], {
+                'filename': "orders.csv",
+                'rows_processed': 6,
+                'rows_rejected': 1,
+                'rows_duplicated': 5,
+                'orders_created': 0,
+                'job': None,
+            })
+
+            # bulk_create skip the orders copied before
+            file = SimpleUploadedFile("orders.csv", content, "text/csv")
+            chunks = list(TransactionService.stream_bulk_orders(
+                user, "orders.csv", file, ingest=TransactionService.Ingest.ORM, checksum=get_checksum(file)))
+            self.assertEqual(
+                [(rows, pks, sorted(existing)) for rows, pks, existing in chunks],
+                [(6, [], sorted(Order.objects.filter(user=user).values_list('pk', flat=True)))])
+            self.assertEqual(Order.objects.filter(user=user).count(), 5)
+            self.assertEqual(
+                list(BookLevel.objects.filter(stock=stock).values_list('quantity', 'orders')),
+                [(15, 5)])
+
+            # a changed file is ingested as a new file, once
+            summaries = [
+                self.client.post(
+                    url, {'file': SimpleUploadedFile("orders.csv", content.replace(b",1,", b",7,"), "text/csv")},
+                    format='multipart').data
+                for i in range(2)]
+            self.assertEqual(
+                [(s['rows_processed'], s['rows_rejected'], s['rows_duplicated'], s['orders_created'])
+                 for s in summaries],
+                [(6, 1, 0, 5), (6, 1, 5, 0)])
+
+            jobs = [
+                self.client.post(
+                    url, {'file': SimpleUploadedFile(f"orders{i}.csv", content, "text/csv"), 'to_job': True},
+                    format='multipart').data['id']
+                for i in range(2)]
+            self.assertEqual(jobs[0], jobs[1])
+            self.assertEqual(BulkOrderJobService.process_jobs(), 1)
+
+        job = BulkOrderJob.objects.get(user=user)
+        self.assertEqual(job.status, BulkOrderJob.Status.COMPLETED)
+        self.assertEqual((job.rows_rejected, job.rows_duplicated, job.get_orders_created()), (1, 5, 0))
+        self.assertEqual(Order.objects.filter(user=user).count(), 10)
+
+    @skipUnless(connection.vendor == 'postgresql', "Returning the inserted ids requires PostgreSQL.")
+    def test_insert_bulk_order_conflict(self):
+        """
+        Inserting bulk orders with `bulk_create` should report the lines
+        inserted by a concurrent ingest as already inserted, not created.
+
+        :return:
+        """
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+        content = "\n".join(["TYPE,STOCK,QUANTITY,PRICE"] + [
+            f"Buy,{stock.code},{i + 1},100" for i in range(5)]).encode()
+
+        # the first two lines committed by another ingest of the file
+        for line in range(2):
+            order = OrderTestHelper.create_test_order(user, stock, quantity=line + 1)
+            Transaction.objects.filter(pk=order.pk).update(
+                id=generate_uuid(f"{user.pk}:checksum:{line}"))
+
+        chunks = list(TransactionService.stream_bulk_orders(
+            user, "orders.csv", io.BytesIO(content), ingest=TransactionService.Ingest.ORM, checksum="checksum"))
+        self.assertEqual(
+            [(rows, sorted(pks), sorted(existing)) for rows, pks, existing in chunks],
+            [(5,
+              sorted(generate_uuid(f"{user.pk}:checksum:{line}") for line in range(2, 5)),
+              sorted(generate_uuid(f"{user.pk}:checksum:{line}") for line in range(2)))])
+        self.assertEqual(
+            sorted(Order.objects.filter(user=user).values_list('quantity', flat=True)),
+            [1, 2, 3, 4, 5])
+
+    @skipUnless(find_spec('pyarrow'), "Columnar files require pyarrow.")
+    def test_create_columnar_bulk_order(self):
+        """
+        Creating bulk orders from Parquet and Arrow IPC files should read the
+        typed columns by chunks of rows, detected by extension or content.
+
+        :return:
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        user = UserTestHelper.create_test_user()
+        stock = StockTestHelper.create_test_stock()
+        table = pa.table({
+            'TYPE': pa.array(["Buy", "Sell", "Buy", "Sell", "Buy", "Buy"]).dictionary_encode(),
+            'STOCK': [stock.code] * 6,
+            'QUANTITY': pa.array([1, 2, 3, 4, 5, 0], pa.int64()),
+            'PRICE': pa.array([Decimal(f"100.{i:02}") for i in range(6)], pa.decimal128(12, 2)),
+        })
+        self.client.force_login(user)
+
+        parquet = io.BytesIO()
+        pq.write_table(table, parquet, row_group_size=2)
+        response = self.client.post(
+            reverse(OrderTestHelper.API_NAME_ORDER_BULK, args=["orders.parquet"]),
+            {'file': SimpleUploadedFile("orders.parquet", parquet.getvalue())}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            (response.data['rows_processed'], response.data['rows_rejected']), (6, 1))
+        self.assertEqual(
+            sorted(Order.objects.filter(user=user).values_list('type', 'quantity', 'price')),
+            [
+                (Transaction.Type.BUY, 1, Decimal('100.00')),
+                (Transaction.Type.BUY, 3, Decimal('100.02')),
+                (Transaction.Type.BUY, 5, Decimal('100.04')),
+                (Transaction.Type.SELL, 2, Decimal('100.01')),
+                (Transaction.Type.SELL, 4, Decimal('100.03')),
+            ])
+
+        # Arrow IPC stream without extension
+        stream = io.BytesIO()
+        with pa.ipc.new_stream(stream, table.schema) as writer:
+            writer.write_table(table, max_chunksize=4)
+        stream.seek(0)
+        chunks = list(TransactionService.stream_bulk_orders(user, "orders", stream, chunksize=3))
+        self.assertEqual([(rows, len(pks)) for rows, pks, _ in chunks], [(3, 3), (3, 2)])
+
+        # Arrow IPC file resumed after the processed rows
+        ipc = io.BytesIO()
+        with pa.ipc.new_file(ipc, table.schema) as writer:
+            writer.write_table(table, max_chunksize=2)
+        ipc.seek(0)
+        self.assertEqual(TransactionService.get_bulk_format("orders.bin", ipc), TransactionService.Format.ARROW)
+        frames = list(TransactionService.read_bulk_orders(
+            ipc, chunksize=2, skip=3, format=TransactionService.Format.ARROW))
+        self.assertEqual([list(df.index) for df in frames], [[3, 4], [5]])
+        self.assertEqual(list(frames[0]["TYPE"]), ["Sell", "Buy"])
+
+        # truncated Parquet file
+        with self.assertLogs('core.services', level='ERROR') as logs:
+            chunks = list(TransactionService.stream_bulk_orders(
+                user, "broken.parquet", io.BytesIO(parquet.getvalue()[:-16])))
+        self.assertEqual(chunks, [])
+        self.assertIn("Failed to read the bulk order file broken.parquet", logs.output[0])
 
     def test_detail_order(self):
         """
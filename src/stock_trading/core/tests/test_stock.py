@@ -1,16 +1,25 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-15
 
+import json
 import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
 
+from asgiref.sync import sync_to_async
 from django.urls import reverse
 
 from rest_framework.test import APITestCase
 
+from core.events import TRADE_CHANNEL, Broadcaster, local_channels, notify
+from core.models import Stock, Transaction, Portfolio, Candle
+from core.services import TransactionService, CandleService, StockService
 from core.tests.mixins import APITestCaseMixin
 from core.tests.helpers import (
     UserTestHelper,
-    StockTestHelper
+    StockTestHelper,
+    OrderTestHelper
 )
 
 
@@ -129,6 +138,22 @@ class StockAPITestCase(APITestCaseMixin, APITestCase):
             reverse(StockTestHelper.API_NAME_STOCK_DETAIL, kwargs={'pk': stock.id})
         )
 
+    def test_detail_stock_last_price(self):
+        """
+        Getting stock should read the last trade price of the stock row.
+
+        :return:
+        """
+        stock = StockTestHelper.create_test_stock()
+        url = reverse(StockTestHelper.API_NAME_STOCK_DETAIL, kwargs={'pk': stock.id})
+        self.client.force_login(UserTestHelper.create_test_user())
+        self.assertEqual(self.client.get(url).data['price'], '100.00')
+
+        StockService.update_prices({stock.pk: Decimal('102.25')})
+        self.assertEqual(self.client.get(url).data['price'], '102.25')
+        portfolio = Portfolio(stock=Stock.objects.get(pk=stock.pk), total_share=10)
+        self.assertEqual(portfolio.get_market_value(), Decimal('1022.50'))
+
     def test_detail_stock_with_super_user(self):
         """
         Getting stock with authenticated super user, should be allow.
@@ -264,3 +289,174 @@ class StockAPITestCase(APITestCaseMixin, APITestCase):
         self.assertUserCanDelete(reverse(
             StockTestHelper.API_NAME_STOCK_DETAIL, kwargs={'pk': stock.pk})
         )
+
+    def test_book_stock(self):
+        """
+        Viewing stock order book without authenticated user, should not be allow.
+
+        :return:
+        """
+        stock = StockTestHelper.create_test_stock()
+        self.assertUnauthorizedView(reverse(
+            StockTestHelper.API_NAME_STOCK_BOOK, kwargs={'pk': stock.pk})
+        )
+
+    def test_book_stock_with_user(self):
+        """
+        Viewing stock order book with authenticated user, should be allow
+        and aggregate the pending orders by price level.
+
+        :return:
+        """
+        stock = StockTestHelper.create_test_stock()
+        user_1 = UserTestHelper.create_test_user(username='testuser01')
+        user_2 = UserTestHelper.create_test_user(username='testuser02')
+        OrderTestHelper.create_test_order(user_1, stock, Transaction.Type.BUY, 20, 99)
+        OrderTestHelper.create_test_order(user_2, stock, Transaction.Type.BUY, 30, 99)
+        OrderTestHelper.create_test_order(user_1, stock, Transaction.Type.BUY, 10, 98)
+        cancelled = OrderTestHelper.create_test_order(user_1, stock, Transaction.Type.BUY, 10, 97)
+        changed = OrderTestHelper.create_test_order(user_2, stock, Transaction.Type.SELL, 40, 102)
+        OrderTestHelper.create_test_order(user_1, stock, Transaction.Type.SELL, 15, 101)
+
+        cancelled.delete()
+        changed.price = 103
+        changed.save()
+
+        url = reverse(StockTestHelper.API_NAME_STOCK_BOOK, kwargs={'pk': stock.pk})
+        self.client.force_login(user_1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(level['price'], level['quantity'], level['orders']) for level in response.data['bids']],
+            [('99.00', 50, 2), ('98.00', 10, 1)])
+        self.assertEqual(
+            [(level['price'], level['quantity'], level['orders']) for level in response.data['asks']],
+            [('101.00', 15, 1), ('103.00', 40, 1)])
+
+        response = self.client.get(url, {'depth': 1})
+        self.assertEqual(len(response.data['bids']), 1)
+        self.assertEqual(len(response.data['asks']), 1)
+
+        response = self.client.get(url, {'depth': 'top'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_stock(self):
+        """
+        Streaming stock trades without authenticated user, should not be allow.
+
+        :return:
+        """
+        stock = StockTestHelper.create_test_stock()
+        self.assertUnauthorizedView(reverse(
+            StockTestHelper.API_NAME_STOCK_STREAM, kwargs={'pk': stock.pk})
+        )
+
+    def create_test_trades(self, stock):
+        """
+        Match two orders of the stock, return the trade notifications.
+
+        :param stock:
+        :return list: payloads
+        """
+        user_1 = UserTestHelper.create_test_user(username='testuser02')
+        user_2 = UserTestHelper.create_test_user(username='testuser03')
+        buy = OrderTestHelper.create_test_order(user_1, stock, Transaction.Type.BUY, 30, Decimal(101))
+        sell = OrderTestHelper.create_test_order(user_2, stock, Transaction.Type.SELL, 20, Decimal(100))
+        with self.captureOnCommitCallbacks() as callbacks:
+            TransactionService.match_order_transactions(sell, buy)
+        return [
+            c.args[1] for c in callbacks
+            if getattr(c, 'func', None) is notify and c.args[0] == TRADE_CHANNEL]
+
+    async def test_stream_stock_with_user(self):
+        """
+        Streaming stock trades with authenticated user, should be allow
+        and push the stock price then the trade prints of the stock.
+
+        :return:
+        """
+        stock = await sync_to_async(StockTestHelper.create_test_stock)()
+        user = await sync_to_async(UserTestHelper.create_test_user)()
+        url = reverse(StockTestHelper.API_NAME_STOCK_STREAM, kwargs={'pk': stock.pk})
+
+        # WSGI workers do not stream
+        await sync_to_async(self.client.force_login)(user)
+        response = await sync_to_async(self.client.get)(url)
+        self.assertEqual(response.status_code, 501)
+
+        # notifications of the previous tests, on vendors without LISTEN/NOTIFY
+        local_channels.pop(TRADE_CHANNEL, None)
+        broadcaster = Broadcaster(TRADE_CHANNEL, timeout=0.1, keepalive=0.2, duration=1)
+        with mock.patch('core.views.v1.stock.trade_broadcaster', broadcaster):
+            await sync_to_async(self.async_client.force_login)(user)
+            response = await self.async_client.get(url, HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+            stream = response.streaming_content
+            self.assertEqual(await anext(stream), b'retry: 1000\n\n')
+            event, data = (await anext(stream)).decode().split('\n')[:2]
+            self.assertEqual(event, 'event: price')
+            self.assertEqual(json.loads(data[len('data: '):])['price'], '100.00')
+            thread = broadcaster.thread
+
+            # other stocks are not streamed
+            broadcaster.publish(json.dumps({'event': 'price', 'stock': 'XXXX', 'price': '1.00'}))
+            for payload in await sync_to_async(self.create_test_trades)(stock):
+                self.assertEqual(broadcaster.publish(payload), 1)
+            event, data = (await anext(stream)).decode().split('\n')[:2]
+            self.assertEqual(event, 'event: trades')
+            data = json.loads(data[len('data: '):])
+            self.assertEqual((data['stock'], data['price']), (stock.code, '100.00'))
+            self.assertEqual(data['trades'], [[20, '100.00']])
+
+            # idle streams are kept alive until the client reconnects
+            self.assertEqual(set([part async for part in stream]), {b': keepalive\n\n'})
+
+        await sync_to_async(thread.join)()
+        self.assertEqual(broadcaster.subscribers, {})
+
+    def test_candles_stock(self):
+        """
+        Listing stock candles without authenticated user, should not be allow.
+
+        :return:
+        """
+        stock = StockTestHelper.create_test_stock()
+        self.assertUnauthorizedView(reverse(
+            StockTestHelper.API_NAME_STOCK_CANDLES, kwargs={'pk': stock.pk})
+        )
+
+    def test_candles_stock_with_user(self):
+        """
+        Listing stock candles with authenticated user, should be allow
+        and list the latest candles of the interval within the range.
+
+        :return:
+        """
+        stock = StockTestHelper.create_test_stock()
+        start = datetime(2026, 10, 16, 9, 0, tzinfo=timezone.utc)
+        CandleService.upsert_candles(
+            [(stock.pk, Candle.Interval.MINUTE, start + timedelta(minutes=i),
+              100 + i, 101 + i, 99 + i, 100 + i, 10, 1) for i in range(5)] +
+            [(stock.pk, Candle.Interval.FIVE_MINUTES, start, 100, 105, 99, 104, 50, 5)])
+
+        url = reverse(StockTestHelper.API_NAME_STOCK_CANDLES, kwargs={'pk': stock.pk})
+        self.client.force_login(UserTestHelper.create_test_user())
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['open'] for c in response.data], [
+            '100.00', '101.00', '102.00', '103.00', '104.00'])
+
+        response = self.client.get(url, {
+            'start': '2026-10-16T09:01:00Z', 'end': '2026-10-16T09:04:00', 'limit': 2})
+        self.assertEqual([c['open'] for c in response.data], ['102.00', '103.00'])
+
+        response = self.client.get(url, {'interval': Candle.Interval.FIVE_MINUTES})
+        self.assertEqual(
+            [(c['high'], c['low'], c['volume']) for c in response.data], [('105.00', '99.00', 50)])
+
+        self.assertEqual(self.client.get(url, {'interval': '2m'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'today'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse(
+            StockTestHelper.API_NAME_STOCK_CANDLES, kwargs={'pk': uuid.uuid4()})).status_code, 404)
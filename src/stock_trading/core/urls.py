@@ -22,6 +22,18 @@ urlpatterns = [
         'stocks/<uuid:pk>/',
         stock.StockDetailView.as_view(),
         name='core-api-stock-detail'),
+    path(
+        'stocks/<uuid:pk>/book/',
+        stock.StockBookView.as_view(),
+        name='core-api-stock-book'),
+    path(
+        'stocks/<uuid:pk>/stream/',
+        stock.StockStreamView.as_view(),
+        name='core-api-stock-stream'),
+    path(
+        'stocks/<uuid:pk>/candles/',
+        stock.StockCandleView.as_view(),
+        name='core-api-stock-candles'),
     # orders
     path(
         'orders/',
@@ -31,6 +43,10 @@ urlpatterns = [
         'orders/<uuid:pk>/',
         order.OrderDetailView.as_view(),
         name='core-api-order-detail'),
+    path(
+        'orders/bulk/jobs/<uuid:pk>/',
+        order.OrderBulkJobView.as_view(),
+        name='core-api-order-bulk-job'),
     path(
         'orders/bulk/<str:filename>',
         order.OrderBulkView.as_view(),
@@ -1,14 +1,27 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-16
 
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 
-from core.models import Order
-from core.serializers import OrderSerializer, OrderBulkSerializer
+from core.models import Order, BulkOrderJob
+from core.renderers import NDJSONRenderer
+from core.serializers import (
+    OrderSerializer,
+    OrderBulkSerializer,
+    OrderBulkSummarySerializer,
+    BulkOrderJobSerializer,
+)
 from core.permissions import IsOwner
-from core.services import TransactionService
+from core.services import TransactionService, BulkOrderJobService, BulkOrderSummary, get_checksum
 
 
 class OrderListView(generics.ListCreateAPIView):
@@ -29,31 +42,57 @@ class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 class OrderBulkView(generics.CreateAPIView):
+    """
+    Create the orders of the bulk order file, and return the summary of
+    the rows. NDJSON clients are streamed the created order ids as each
+    chunk of lines is committed, followed by the summary.
+    """
     serializer_class = OrderBulkSerializer
     permission_classes = [IsAdminUser | IsOwner]
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer]
+
+    def stream_orders(self, user, filename, file, checksum):
+        summary = BulkOrderSummary(filename)
+        for rows, pks, existing in TransactionService.stream_bulk_orders(
+                user, filename, file, checksum=checksum):
+            summary.add(rows, pks, existing)
+            yield "".join(json.dumps({'id': str(pk)}) + "\n" for pk in pks)
+
+        yield json.dumps(OrderBulkSummarySerializer(summary.as_dict()).data) + "\n"
 
     def post(self, request, filename, format="text/csv"):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        if serializer.validated_data['to_stored']:
-            is_stored = TransactionService.store_bulk_order_file(
+        file = serializer.validated_data['file']
+        if serializer.validated_data['to_job'] or serializer.validated_data['to_stored'] \
+                or file.size > settings.BULK_ORDER_SYNC_MAX_SIZE:
+            job = BulkOrderJobService.create_job(
                 user=request.user,
                 filename=filename,
-                file=serializer.validated_data['file'],
+                file=file,
             )
-            if is_stored:
-                return Response(
-                    {"message": f"Bulk order file {filename} was stored."},
-                    status=status.HTTP_201_CREATED)
             return Response(
-                {"message": "Unable to store bulk order file."},
-                status=status.HTTP_400_BAD_REQUEST)
+                BulkOrderJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': reverse('core-api-order-bulk-job', args=[job.pk])})
 
-        transactions = TransactionService.bulk_orders(
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                self.stream_orders(request.user, filename, file, get_checksum(file)),
+                status=status.HTTP_201_CREATED,
+                content_type=NDJSONRenderer.media_type)
+
+        summary = TransactionService.bulk_orders(
             user=request.user,
             filename=filename,
-            file=serializer.validated_data['file'],
+            file=file,
+            checksum=get_checksum(file),
         )
-        serializer = OrderSerializer(transactions, many=True)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(OrderBulkSummarySerializer(summary).data, status=status.HTTP_201_CREATED)
+
+
+class OrderBulkJobView(generics.RetrieveAPIView):
+    queryset = BulkOrderJob.objects.all()
+    serializer_class = BulkOrderJobSerializer
+    permission_classes = [IsAdminUser | IsOwner]
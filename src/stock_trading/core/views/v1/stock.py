@@ -1,13 +1,33 @@
 # Stock Trading
 # Created by Maximillian M. Estrada on 2024-05-15
 
-from rest_framework import generics
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
-from core.models import Stock
-from core.serializers import StockSerializer
+from core.events import format_event, trade_broadcaster
+from core.models import Stock, Candle
+from core.renderers import EventStreamRenderer
+from core.serializers import StockSerializer, StockBookSerializer, CandleSerializer
+from core.services import StockService, CandleService
 from core.permissions import UserReadOnly
 
+# price levels per side of the order book
+BOOK_DEPTH = 10
+BOOK_MAX_DEPTH = 100
+
+# latest candles of a range
+CANDLES_LIMIT = 500
+CANDLES_MAX_LIMIT = 1000
+
 
 class StockListView(generics.ListCreateAPIView):
     queryset = Stock.objects.all()
@@ -19,3 +39,82 @@ class StockDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
     permission_classes = [IsAdminUser | UserReadOnly]
+
+
+class StockBookView(generics.RetrieveAPIView):
+    queryset = Stock.objects.all()
+    serializer_class = StockBookSerializer
+    permission_classes = [IsAdminUser | UserReadOnly]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        try:
+            depth = int(self.request.query_params.get('depth', BOOK_DEPTH))
+        except ValueError:
+            raise ValidationError({'depth': "A valid integer is required."})
+        context['depth'] = min(max(depth, 1), BOOK_MAX_DEPTH)
+        return context
+
+
+class StockStreamView(generics.RetrieveAPIView):
+    """
+    Stream the trade prints and the price changes of the stock as server-sent events.
+    """
+    queryset = Stock.objects.all()
+    permission_classes = [IsAdminUser | UserReadOnly]
+    renderer_classes = [EventStreamRenderer, JSONRenderer]
+
+    def retrieve(self, request, *args, **kwargs):
+        stock = self.get_object()
+        if not isinstance(request._request, ASGIRequest):
+            # a WSGI worker would be held by the endless stream
+            return Response(
+                {'detail': "Streaming is served by the ASGI application."},
+                status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        response = StreamingHttpResponse(
+            trade_broadcaster.stream(
+                stock.code,
+                format_event('price', StockService.get_price_event(stock))),
+            content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class StockCandleView(generics.ListAPIView):
+    """
+    List the candles of the stock, the latest `limit` candles of the
+    `interval` starting within the `start` and `end` range.
+    """
+    serializer_class = CandleSerializer
+    permission_classes = [IsAdminUser | UserReadOnly]
+    pagination_class = None
+
+    def get_datetime(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        time = parse_datetime(value)
+        if time is None:
+            raise ValidationError({name: "A valid ISO 8601 datetime is required."})
+        if timezone.is_naive(time):
+            time = timezone.make_aware(time)
+        return time
+
+    def get_queryset(self):
+        stock = get_object_or_404(Stock, pk=self.kwargs['pk'])
+        interval = self.request.query_params.get('interval', Candle.Interval.MINUTE)
+        if interval not in dict(Candle.Interval.CHOICES):
+            raise ValidationError({'interval': f"Choose from {', '.join(dict(Candle.Interval.CHOICES))}."})
+        try:
+            limit = int(self.request.query_params.get('limit', CANDLES_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': "A valid integer is required."})
+
+        return CandleService.get_candles(
+            stock,
+            interval,
+            start=self.get_datetime('start'),
+            end=self.get_datetime('end'),
+            limit=min(max(limit, 1), CANDLES_MAX_LIMIT))
@@ -172,9 +172,34 @@ REST_FRAMEWORK = {
 
 CORS_ALLOWED_ORIGINS = os.getenv('CORS', 'http://localhost').split(',')
 
+# The stock version is cached for the stock references, share the cache between
+# the application and the `run_order_matcher` service
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# A process-local cache is not shared by the services, the stock references
+# check the stocks table instead
+CACHE_SHARED = CACHE_BACKEND not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Orders are matched by the `run_order_matcher` service
+MATCHING_JOURNAL_ROOT = os.getenv('MATCHING_JOURNAL_ROOT', os.path.join(BASE_DIR, 'journal/'))
+
+# Bulk order uploads larger than the size in bytes are processed as jobs
+BULK_ORDER_SYNC_MAX_SIZE = int(os.getenv('BULK_ORDER_SYNC_MAX_SIZE', 1024 * 1024))
+# Processes running the bulk order jobs concurrently in the cron job
+BULK_ORDER_WORKERS = int(os.getenv('BULK_ORDER_WORKERS', 4))
+
 CRONJOBS = [
-    ('*/5 * * * *', 'core.cron.schedule_process_order_transaction'),
     ('*/5 * * * *', 'core.cron.schedule_process_bulk_order_file'),
+    ('* * * * *', 'core.cron.schedule_rollup_candles'),
+    ('0 0 * * *', 'core.cron.schedule_partition_ticks'),
 ]
 
 CRONTAB_COMMAND_SUFFIX = '>> /var/log/cron.log 2>&1'